@@ -5,10 +5,16 @@ Mainly includes:
 1. MCP (Memory-Context-Prompt): Lightweight "task brief" object passed throughout the task.
 2. Related data models for standardizing data within MCP, such as execution history records.
 """
-from typing import List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict, defaultdict
+from pydantic import BaseModel, Field, PrivateAttr
+import threading
 import uuid
 
+# 战略计划优先级的排序值，数值越小越先执行
+PRIORITY_RANKS = {"high": 0, "medium": 1, "low": 2}
+DEFAULT_PRIORITY_RANK = PRIORITY_RANKS["medium"]
+
 class CompletionRequirement(BaseModel):
     original_input: str = Field(description="User's original input.")
     supplementary_content: str = Field(description="Content supplemented by user based on questions.")
@@ -19,6 +25,12 @@ class StrategyPlan(BaseModel):
     description: dict[str, Any] = Field(description="Description of the strategy plan.")
     is_completed: bool = Field(default=False, description="Mark whether this strategy plan is completed.")
 
+    @property
+    def priority_rank(self) -> int:
+        """Sort rank of the plan's priority (High/Medium/Low); missing or unknown priorities count as Medium."""
+        priority = str(self.description.get("priority", "")).strip().lower() if isinstance(self.description, dict) else ""
+        return PRIORITY_RANKS.get(priority, DEFAULT_PRIORITY_RANK)
+
 class SubGoal(BaseModel):
     id: str = Field(default_factory=lambda: f"sg_{uuid.uuid4()}", description="Unique ID of the subgoal.")
     parent_strategy_plan_id: str = Field(description="ID of the parent strategy plan.")
@@ -30,6 +42,7 @@ class ExecutableCommand(BaseModel):
     parent_sub_goal_id: str = Field(description="ID of the parent subgoal.")
     tool: str = Field(description="Name of the tool to use.")
     params: Dict[str, Any] = Field(default_factory=dict, description="Parameters of the tool.")
+    depends_on: List[str] = Field(default_factory=list, description="IDs of the commands that must finish before this command can run.")
     is_completed: bool = Field(default=False, description="Mark whether this command has been executed.")
 
 
@@ -46,11 +59,35 @@ class WorkingMemory(BaseModel):
         ...
     }
     """
+    content_fingerprints: Dict[str, str] = Field(default_factory=dict, description="SimHash fingerprints (hex) of page content collected in this session, mapped to the source URL; used to drop near-duplicate pages.")
+    # Banded SimHash index over content_fingerprints, built and extended incrementally by NearDuplicateFilter
+    _duplicate_index: Any = PrivateAttr(default=None)
 
     class Config:
         """Pydantic model configuration."""
         validate_assignment = True
 
+class _MCPIndex:
+    """
+    Indexes maintained alongside the flat lists of an MCP, so that lookups, completion propagation
+    and next-command selection are O(1) instead of rescanning the lists.
+    """
+    def __init__(self):
+        self.plans: Dict[str, StrategyPlan] = {}
+        self.sub_goals: Dict[str, SubGoal] = {}
+        self.commands: Dict[str, ExecutableCommand] = {}
+        self.plan_sub_goals: Dict[str, List[SubGoal]] = defaultdict(list)
+        self.sub_goal_commands: Dict[str, List[ExecutableCommand]] = defaultdict(list)
+        # Number of unfinished commands per subgoal and unfinished subgoals per plan
+        self.pending_commands: Dict[str, int] = defaultdict(int)
+        self.pending_sub_goals: Dict[str, int] = defaultdict(int)
+        # Unfinished commands in list order; ready ones are bucketed by priority rank
+        self.pending: "OrderedDict[str, ExecutableCommand]" = OrderedDict()
+        self.ready: List["OrderedDict[str, ExecutableCommand]"] = [OrderedDict() for _ in range(len(PRIORITY_RANKS))]
+        self.waiting: Dict[str, set] = {}
+        self.dependents: Dict[str, List[str]] = defaultdict(list)
+        self.signature: Tuple = ()
+
 class MCP(BaseModel):
     """
     MCP (Memory-Context-Prompt) core data class.
@@ -66,7 +103,241 @@ class MCP(BaseModel):
     strategy_plans: List[StrategyPlan] = Field(default_factory=list, description="Flat list of all strategy plans.")
     sub_goals: List[SubGoal] = Field(default_factory=list, description="Flat list of all subgoals.")
     executable_commands: List[ExecutableCommand] = Field(default_factory=list, description="Flat list of all executable commands.")
+
+    _index: Optional[_MCPIndex] = PrivateAttr(default=None)
+    # Guards the indexes: the streaming planner adds items while executor threads read them
+    _index_lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
     
     class Config:
         """Pydantic model configuration."""
         validate_assignment = True
+
+    # ------------------------------------------------------------------
+    # Indexed access. The add_* methods keep the indexes up to date; if the lists are
+    # modified directly (appended to or reassigned), the indexes are rebuilt on next use.
+    # All index access holds _index_lock, so a rebuild is never observed half-filled and
+    # an item appended by add_* is never indexed twice by a concurrent rebuild.
+    # ------------------------------------------------------------------
+    def _signature(self) -> Tuple:
+        return (
+            id(self.strategy_plans), len(self.strategy_plans),
+            id(self.sub_goals), len(self.sub_goals),
+            id(self.executable_commands), len(self.executable_commands),
+        )
+
+    def _ensure_index(self) -> _MCPIndex:
+        with self._index_lock:
+            if self._index is None or self._index.signature != self._signature():
+                index = _MCPIndex()
+                self._index = index
+                for plan in self.strategy_plans:
+                    self._index_plan(plan)
+                for sub_goal in self.sub_goals:
+                    self._index_sub_goal(sub_goal)
+                for command in self.executable_commands:
+                    self._index_command(command)
+                index.signature = self._signature()
+            return self._index
+
+    def _index_plan(self, plan: StrategyPlan) -> None:
+        self._index.plans[plan.id] = plan
+
+    def _index_sub_goal(self, sub_goal: SubGoal) -> None:
+        index = self._index
+        index.sub_goals[sub_goal.id] = sub_goal
+        index.plan_sub_goals[sub_goal.parent_strategy_plan_id].append(sub_goal)
+        if not sub_goal.is_completed:
+            index.pending_sub_goals[sub_goal.parent_strategy_plan_id] += 1
+
+    def _index_command(self, command: ExecutableCommand) -> None:
+        index = self._index
+        index.commands[command.id] = command
+        index.sub_goal_commands[command.parent_sub_goal_id].append(command)
+        if command.is_completed:
+            return
+        index.pending_commands[command.parent_sub_goal_id] += 1
+        self._reopen_sub_goal(command.parent_sub_goal_id)
+        index.pending[command.id] = command
+        unmet = {
+            dep for dep in command.depends_on
+            if dep in index.commands and not index.commands[dep].is_completed
+        }
+        if unmet:
+            index.waiting[command.id] = unmet
+            for dep in unmet:
+                index.dependents[dep].append(command.id)
+        else:
+            index.ready[self._command_rank(command)][command.id] = command
+
+    def _reopen_sub_goal(self, sub_goal_id: str) -> None:
+        """
+        A command was added to a subgoal that had already completed (the streaming planner adds commands
+        while earlier ones are running): mark the subgoal, and its plan, unfinished again.
+        """
+        index = self._index
+        sub_goal = index.sub_goals.get(sub_goal_id)
+        if sub_goal is None or not sub_goal.is_completed:
+            return
+        sub_goal.is_completed = False
+        index.pending_sub_goals[sub_goal.parent_strategy_plan_id] += 1
+        plan = index.plans.get(sub_goal.parent_strategy_plan_id)
+        if plan and plan.is_completed:
+            plan.is_completed = False
+
+    def _complete_sub_goal(self, sub_goal: SubGoal) -> Optional[StrategyPlan]:
+        """
+        Mark a subgoal completed and return its plan if that plan became completed because of it.
+        """
+        index = self._index
+        sub_goal.is_completed = True
+        index.pending_sub_goals[sub_goal.parent_strategy_plan_id] -= 1
+        plan = index.plans.get(sub_goal.parent_strategy_plan_id)
+        if plan and not plan.is_completed and index.pending_sub_goals[plan.id] == 0:
+            plan.is_completed = True
+            return plan
+        return None
+
+    def add_strategy_plan(self, plan: StrategyPlan) -> None:
+        """Append a strategy plan and index it."""
+        with self._index_lock:
+            self._ensure_index()
+            self.strategy_plans.append(plan)
+            self._index_plan(plan)
+            self._index.signature = self._signature()
+
+    def add_sub_goal(self, sub_goal: SubGoal) -> None:
+        """Append a subgoal and index it."""
+        with self._index_lock:
+            self._ensure_index()
+            self.sub_goals.append(sub_goal)
+            self._index_sub_goal(sub_goal)
+            self._index.signature = self._signature()
+
+    def add_command(self, command: ExecutableCommand) -> None:
+        """Append an executable command and index it."""
+        with self._index_lock:
+            self._ensure_index()
+            self.executable_commands.append(command)
+            self._index_command(command)
+            self._index.signature = self._signature()
+
+    def set_sub_goal_parent(self, sub_goal: SubGoal, plan_id: str) -> None:
+        """
+        Move a subgoal to another strategy plan, e.g. when a streamed plan names the parent only after
+        the subgoal's first command. Its commands are re-ranked under the new plan's priority.
+        """
+        with self._index_lock:
+            index = self._ensure_index()
+            old_plan_id = sub_goal.parent_strategy_plan_id
+            if old_plan_id == plan_id:
+                return
+            sub_goal.parent_strategy_plan_id = plan_id
+            if sub_goal.id not in index.sub_goals:
+                return
+            index.plan_sub_goals[old_plan_id] = [sg for sg in index.plan_sub_goals[old_plan_id] if sg.id != sub_goal.id]
+            index.plan_sub_goals[plan_id].append(sub_goal)
+            if not sub_goal.is_completed:
+                index.pending_sub_goals[old_plan_id] -= 1
+                index.pending_sub_goals[plan_id] += 1
+                plan = index.plans.get(plan_id)
+                if plan and plan.is_completed:
+                    plan.is_completed = False
+            for command in index.sub_goal_commands.get(sub_goal.id, []):
+                for bucket in index.ready:
+                    if bucket.pop(command.id, None) is not None:
+                        index.ready[self._command_rank(command)][command.id] = command
+                        break
+
+    def get_strategy_plan(self, plan_id: str) -> Optional[StrategyPlan]:
+        with self._index_lock:
+            return self._ensure_index().plans.get(plan_id)
+
+    def get_sub_goal(self, sub_goal_id: str) -> Optional[SubGoal]:
+        with self._index_lock:
+            return self._ensure_index().sub_goals.get(sub_goal_id)
+
+    def get_command(self, command_id: str) -> Optional[ExecutableCommand]:
+        with self._index_lock:
+            return self._ensure_index().commands.get(command_id)
+
+    def sub_goals_for_plan(self, plan_id: str) -> List[SubGoal]:
+        with self._index_lock:
+            return list(self._ensure_index().plan_sub_goals.get(plan_id, []))
+
+    def commands_for_sub_goal(self, sub_goal_id: str) -> List[ExecutableCommand]:
+        with self._index_lock:
+            return list(self._ensure_index().sub_goal_commands.get(sub_goal_id, []))
+
+    def command_priority_rank(self, command: ExecutableCommand) -> int:
+        """Priority rank inherited from the command's parent strategy plan through its subgoal."""
+        with self._index_lock:
+            self._ensure_index()
+            return self._command_rank(command)
+
+    def _command_rank(self, command: ExecutableCommand) -> int:
+        index = self._index
+        sub_goal = index.sub_goals.get(command.parent_sub_goal_id)
+        plan = index.plans.get(sub_goal.parent_strategy_plan_id) if sub_goal else None
+        return plan.priority_rank if plan else DEFAULT_PRIORITY_RANK
+
+    def pending_command_count(self) -> int:
+        """Number of commands that have not been completed yet."""
+        with self._index_lock:
+            return len(self._ensure_index().pending)
+
+    def next_ready_command(self) -> Optional[ExecutableCommand]:
+        """
+        The next unfinished command whose dependencies are all completed, highest plan priority first.
+        If every unfinished command is waiting (e.g. a dependency cycle), the first unfinished command
+        is returned so that the workflow cannot stall.
+        """
+        with self._index_lock:
+            index = self._ensure_index()
+            for bucket in index.ready:
+                if bucket:
+                    return next(iter(bucket.values()))
+            return next(iter(index.pending.values()), None)
+
+    def mark_command_completed(self, command: ExecutableCommand) -> Tuple[Optional[SubGoal], Optional[StrategyPlan]]:
+        """
+        Mark a command completed and propagate completion upwards in O(1).
+        Returns the subgoal and strategy plan that became completed because of this command (or None).
+        """
+        with self._index_lock:
+            index = self._ensure_index()
+            if command.id not in index.pending:
+                command.is_completed = True
+                return None, None
+
+            command.is_completed = True
+            del index.pending[command.id]
+            for bucket in index.ready:
+                bucket.pop(command.id, None)
+            index.waiting.pop(command.id, None)
+            for dependent_id in index.dependents.pop(command.id, []):
+                unmet = index.waiting.get(dependent_id)
+                if unmet is None:
+                    continue
+                unmet.discard(command.id)
+                if not unmet:
+                    del index.waiting[dependent_id]
+                    dependent = index.commands[dependent_id]
+                    index.ready[self._command_rank(dependent)][dependent_id] = dependent
+
+            index.pending_commands[command.parent_sub_goal_id] -= 1
+            sub_goal = index.sub_goals.get(command.parent_sub_goal_id)
+            if sub_goal and not sub_goal.is_completed and index.pending_commands[sub_goal.id] == 0:
+                return sub_goal, self._complete_sub_goal(sub_goal)
+            return None, None
+
+    def seal_sub_goal(self, sub_goal: SubGoal) -> Tuple[Optional[SubGoal], Optional[StrategyPlan]]:
+        """
+        Called by the planner once all commands of a subgoal have been added.
+        A subgoal without unfinished commands (in particular one with no commands at all) completes here,
+        since no command completion would ever complete it. Returns what became completed, like mark_command_completed.
+        """
+        with self._index_lock:
+            index = self._ensure_index()
+            if sub_goal.id not in index.sub_goals or sub_goal.is_completed or index.pending_commands[sub_goal.id] > 0:
+                return None, None
+            return sub_goal, self._complete_sub_goal(sub_goal)
@@ -2,52 +2,171 @@
 """
 This file defines the abstract base class for all LLM entities.
 """
-import os
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Callable, Dict, Iterator, List, Optional
 import uuid
 
 from Data.mcp_models import MCP
-from Interfaces.llm_api_interface import LLMAPIInterface
+from Interfaces.llm_api_interface import LLMAPIInterface, LLMError
+from Interfaces.llm_hedging import hedging
 from Interfaces.database_interface import DatabaseInterface
+from Entities.utils.model_router import get_model_router
+from Entities.utils.prompt_budget import PromptBudget, prompt_budget_for
+from Entities.utils.prompt_registry import CompiledTemplate, prompt_registry
+
+EMPTY_TEMPLATE = CompiledTemplate("", "")
 
 class BaseLLMEntity(ABC):
     """
     Abstract base class for all LLM entities.
     It handles communication with LLM interfaces and prompt loading, and manages its own state.
     """
+    # 是否允许本实体的调用被对冲到备用提供商 (见 llm_hedging.py)。只适合短小、可重复的调用，默认关闭
+    hedge_requests: bool = False
+
     def __init__(self, llm_interface: LLMAPIInterface, db_interface: DatabaseInterface = None, entity_id: str = None):
         self.llm_interface = llm_interface
         self.db_interface = db_interface
         self.prompt_template = self._load_prompt()
         
         self.entity_id = entity_id or f"{self.__class__.__name__}_{uuid.uuid4()}"
+        # 可选的流式监听器 (例如 WorkflowLogger)，设置后 LLM 输出会以文本增量的形式实时转发
+        self.stream_listener = None
 
 
-    def _load_prompt(self) -> str:
+    def _load_prompt(self, prompt_name: str = None) -> CompiledTemplate:
         """
-        从 'prompts' 目录加载与类名对应的 prompt 文件。
+        从进程级的模板注册表获取与类名对应的 prompt 模板 (每个文件在进程内只读取和编译一次)。
         例如，LLMStrategyPlanner -> prompts/strategy_planner_prompt.txt
+        也可以通过 prompt_name 指定其他文件 (例如实体的第二个 prompt)。
         """
-        # 从类名推断文件名 (e.g., LLMStrategyPlanner -> strategy_planner)
-        class_name = self.__class__.__name__
-        if class_name.startswith("LLM"):
-            class_name = class_name[3:] # Remove "LLM"
-        
-        prompt_name_base = ''.join(['_' + i.lower() if i.isupper() else i for i in class_name]).lstrip('_')
-        prompt_name = f"{prompt_name_base}_prompt.txt"
+        if prompt_name is None:
+            # 从类名推断文件名 (e.g., LLMStrategyPlanner -> strategy_planner)
+            class_name = self.__class__.__name__
+            if class_name.startswith("LLM"):
+                class_name = class_name[3:] # Remove "LLM"
+            
+            prompt_name_base = ''.join(['_' + i.lower() if i.isupper() else i for i in class_name]).lstrip('_')
+            prompt_name = f"{prompt_name_base}_prompt.txt"
+
+        return prompt_registry.get(prompt_name) or EMPTY_TEMPLATE
+
+    @property
+    def prompt_hash(self) -> str:
+        """
+        主 prompt 模板的稳定哈希，可作为缓存键的一部分 (模板修改后旧的缓存条目自然失效)。
+        """
+        return self.prompt_template.hash
+
+    def _prompt_budget(self, model: str = None, max_output_tokens: int = 1024) -> PromptBudget:
+        """
+        返回实际将被调用的模型 (传入的 model > 环境变量 > 接口默认模型) 的 prompt 预算。
+        """
+        resolved_model = self.llm_interface._resolve_model(model) if self.llm_interface else model
+        return prompt_budget_for(resolved_model, max_output_tokens)
+
+    def _render_prompt(self, template: CompiledTemplate, slots: Dict[str, str], priorities: List[str] = None,
+                       model: str = None, max_output_tokens: int = 1024) -> str:
+        """
+        用 slots 填充模板的 {{name}} 占位符，按 token 预算和优先级截断，保证不超出模型的上下文窗口。
+        """
+        return self._prompt_budget(model, max_output_tokens).render(template, slots, priorities)
+
+    def _route_model(self, prompt: str) -> Optional[str]:
+        """
+        按路由表 (实体类名, 输入 token 数) 为本次调用选择模型，见 model_router.py。
+        返回 None 时由接口使用部署默认模型。
+        """
+        provider = self.llm_interface.provider if self.llm_interface else ""
+        return get_model_router().route(provider, self.__class__.__name__, self._prompt_budget().count(prompt))
 
+    @staticmethod
+    def _split_static_prefix(prompt: str, static_prefix: str, kwargs: dict) -> str:
+        """
+        如果 prompt 以模板的静态前缀开头，把前缀作为 system 指令单独发送 (kwargs['system'])，返回剩余的动态部分。
+        接口会把 system 映射为提供商的前缀缓存 (OpenAI system 消息 / Anthropic cache_control / Gemini 缓存内容)。
+        """
+        if static_prefix and prompt.startswith(static_prefix) and len(prompt) > len(static_prefix):
+            kwargs['system'] = static_prefix
+            return prompt[len(static_prefix):]
+        return prompt
+
+    def _complete(self, prompt: str, static_prefix: str = None, raise_errors: bool = False, **kwargs) -> str:
+        """
+        调用 LLM 获取完整响应。static_prefix 为模板的静态前缀 (CompiledTemplate.prefix)，会作为 system 指令单独发送。
+        如果配置了 stream_listener，则改用流式接口，并把每个文本增量转发给监听器：
+        stream_started(phase, stream_id) -> stream_delta(stream_id, delta) -> stream_finished(stream_id)。
+        接口已经对临时性错误做过重试，因此 LLMError 默认只记录并返回空字符串；
+        raise_errors=True 时抛出，调用方可以区分"模型没有输出"与"提供商不可用"。
+        没有显式指定 model 时按路由表选择模型。
+        """
+        if kwargs.get('model') is None:
+            kwargs['model'] = self._route_model(prompt)
         try:
-            # 构造相对于当前文件位置的路径
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            prompt_path = os.path.join(current_dir, '..', 'Prompts', prompt_name)
-            
-            with open(prompt_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            print(f"Warning: Prompt file not found for {self.__class__.__name__} at {prompt_path}")
+            if self.stream_listener is None:
+                prompt = self._split_static_prefix(prompt, static_prefix, kwargs)
+                with hedging(self.hedge_requests):
+                    return self.llm_interface.get_completion(prompt, **kwargs)
+            return "".join(self._stream(prompt, static_prefix, **kwargs))
+        except LLMError as e:
+            if raise_errors:
+                raise
+            print(f"{self.__class__.__name__} LLM Error: {e}")
             return ""
 
+    def _complete_many(self, prompts: List[str], static_prefix: str = None, max_concurrency: int = 8,
+                       on_result: Callable[[int, str], None] = None, **kwargs) -> List[str]:
+        """
+        一次性获取多个互不依赖的 prompt 的响应 (LLMAPIInterface.get_completions)，结果顺序与 prompts 一致。
+        路由到同一模型的 prompt 合并为一次批量调用；失败的条目记录错误并返回空字符串。
+        on_result(i, text) 在第 i 个 prompt 完成时立即调用 (可能在工作线程中)，不必等待整批结束。
+        批量调用不经过 stream_listener。
+        """
+        if not prompts:
+            return []
+        models = [kwargs.get('model') or self._route_model(prompt) for prompt in prompts]
+        results = [""] * len(prompts)
+        for model in dict.fromkeys(models):
+            indices = [i for i, m in enumerate(models) if m == model]
+            call_kwargs = {**kwargs, 'model': model}
+            batch = [prompts[i] for i in indices]
+            if static_prefix and all(prompt.startswith(static_prefix) and len(prompt) > len(static_prefix) for prompt in batch):
+                call_kwargs['system'] = static_prefix
+                batch = [prompt[len(static_prefix):] for prompt in batch]
+
+            def collect(j: int, result, indices=indices) -> None:
+                i = indices[j]
+                if result.ok:
+                    results[i] = result.text or ""
+                else:
+                    print(f"{self.__class__.__name__} LLM Error (batch item {i}): {result.error}")
+                if on_result is not None:
+                    on_result(i, results[i])
+
+            with hedging(self.hedge_requests):
+                self.llm_interface.get_completions(batch, max_concurrency=max_concurrency, on_result=collect, **call_kwargs)
+        return results
+
+    def _stream(self, prompt: str, static_prefix: str = None, **kwargs) -> Iterator[str]:
+        """
+        流式调用 LLM，逐个产出文本增量，同时转发给 stream_listener (如果有)。
+        """
+        if 'model' not in kwargs:
+            kwargs['model'] = self._route_model(prompt)
+        prompt = self._split_static_prefix(prompt, static_prefix, kwargs)
+        if self.stream_listener is None:
+            yield from self.llm_interface.get_completion_stream(prompt, **kwargs)
+            return
+
+        stream_id = f"{self.entity_id}:{uuid.uuid4().hex[:8]}"
+        self.stream_listener.stream_started(self.__class__.__name__, stream_id)
+        try:
+            for delta in self.llm_interface.get_completion_stream(prompt, **kwargs):
+                self.stream_listener.stream_delta(stream_id, delta)
+                yield delta
+        finally:
+            self.stream_listener.stream_finished(stream_id)
+
     def retrieve_from_db(self, key: str) -> Any:
         """
         从 RedisJSON 数据库中检索信息。
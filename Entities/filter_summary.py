@@ -1,22 +1,78 @@
 # -*- coding: utf-8 -*-
 """
 Filter and Summarizer - Converts "heavy" raw data into lightweight, high information density summaries.
+When a query is given, a BM25 pre-filter first keeps only the passages relevant to it.
+Large raw data is summarized in map-reduce fashion: it is split per document into chunks that fit the token budget,
+the chunks are summarized in parallel, and the partial summaries are merged by a reduce call.
 """
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
 from Data.mcp_models import MCP
 from Entities.base_llm_entity import BaseLLMEntity
+from Entities.utils.passage_ranker import BM25PassageRanker
+from Entities.utils.prompt_budget import PromptBudget
 from Interfaces.llm_api_interface import OpenAIInterface, GoogleCloudInterface
 from Interfaces.database_interface import RedisClient
 # from Interfaces.database_interface import RedisClient
 
+def _split_text(text: str, max_tokens: int, budget: PromptBudget) -> List[str]:
+    """
+    按段落把文本切分为不超过 max_tokens 的片段，过长的段落再按 token 硬切分。
+    """
+    pieces, current, current_tokens = [], "", 0
+    for paragraph in text.split("\n"):
+        tokens = budget.count(paragraph)
+        while tokens > max_tokens:
+            if current:
+                pieces.append(current)
+                current, current_tokens = "", 0
+            head = budget.truncate(paragraph, max_tokens) or paragraph[:1]
+            pieces.append(head)
+            paragraph = paragraph[len(head):]
+            tokens = budget.count(paragraph)
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append(current)
+            current, current_tokens = paragraph, tokens
+        else:
+            current = f"{current}\n{paragraph}" if current else paragraph
+            current_tokens += tokens
+    if current:
+        pieces.append(current)
+    return pieces
+
 class LLMFilterSummary(BaseLLMEntity):
     """
     Filter and Summarizer - Converts "heavy" raw data into lightweight, high information density summaries.
+    chunk_tokens: 单次总结调用处理的原始数据 token 数上限 (环境变量 SUMMARY_CHUNK_TOKENS)，同时受模型上下文窗口约束。
+    fan_out: map 阶段并行调用 LLM 的数量 (环境变量 SUMMARY_FAN_OUT)。
+    batch_concurrency: 批量总结时同时进行的 LLM 调用上限 (环境变量 SUMMARY_BATCH_CONCURRENCY)，
+        未设置时等于批量中的 prompt 数，实际并发由 LLM 接口的自适应并发限制器约束。
+    passage_top_k / passage_tokens: 相关性预筛选最多保留的段落数及其总 token 数 (SUMMARY_PASSAGE_TOP_K / SUMMARY_PASSAGE_TOKENS)。
+        预筛选只在原始数据超出一轮 map-reduce 的容量 (fan_out 个块) 时进行，默认保留到恰好填满这一容量，
+        因此筛选后的大输入仍然经过 map-reduce；两个环境变量可以设置更小的上限以降低成本。
+    摘要调用短小且可以重复，允许对冲到备用提供商。
     """
-    def process(self, mcp: MCP, raw_data: str) -> str:
+    hedge_requests = True
+
+    def __init__(self, llm_interface, db_interface=None, entity_id=None, chunk_tokens: int = None, fan_out: int = None):
+        super().__init__(llm_interface, db_interface, entity_id)
+        self.reduce_prompt_template = self._load_prompt("filter_summary_reduce_prompt.txt")
+        self.chunk_tokens = chunk_tokens or int(os.getenv('SUMMARY_CHUNK_TOKENS', '3000'))
+        self.fan_out = fan_out or int(os.getenv('SUMMARY_FAN_OUT', '4'))
+        self.batch_concurrency = int(os.getenv('SUMMARY_BATCH_CONCURRENCY') or 0)
+        self.passage_top_k = int(os.getenv('SUMMARY_PASSAGE_TOP_K') or 0)
+        self.passage_tokens = int(os.getenv('SUMMARY_PASSAGE_TOKENS') or 0)
+        self.passage_ranker = BM25PassageRanker()
+
+    def process(self, mcp: MCP, raw_data: str, query: str = None) -> str:
         """
         Process raw data and generate summary.
         :param mcp: MCP object for status updates.
         :param raw_data: Raw data string from tools.
+        :param query: Optional relevance query (e.g. command keywords and subgoal description); only passages relevant to it are summarized.
         :return: Returns the generated summary string.
         """
 
@@ -24,11 +80,213 @@ class LLMFilterSummary(BaseLLMEntity):
         if not self.prompt_template or not raw_data:
             print("Warning: No prompt or raw data for summary.")
             return ""
-        prompt = self.prompt_template.replace('{{raw_data}}', str(raw_data)[:8000])
-        summary = self.llm_interface.get_completion(prompt, model="gpt-3.5-turbo")
+
+        budget = self._prompt_budget()
+        raw_data = str(raw_data)
+        if query:
+            raw_data = self._select_passages(raw_data, query, budget)
+        chunks = self._chunk(raw_data, budget)
+        if len(chunks) == 1:
+            summary = self._summarize(chunks[0], budget)
+        else:
+            print(f"LLMFilterSummary: Raw data split into {len(chunks)} chunks, summarizing with fan-out {self.fan_out}.")
+            partial_summaries = [s for s in self._map(lambda chunk: self._summarize(chunk, budget), chunks) if s]
+            summary = self._reduce(partial_summaries, budget)
+
         if summary:
             print(f"LLMFilterSummary: Summary generated successfully.")
         else:
             print("LLMFilterSummary Error: No response.")
             summary = ""
         return summary
+
+    def process_batch(self, mcp: MCP, items: List[Tuple[str, Optional[str]]]) -> List[str]:
+        """
+        Summarize many raw data items at once.
+        The map-stage prompts of all items (every chunk of every item) are sent in one batched completion call;
+        items that were split into several chunks are then merged by the reduce stage as in process().
+        :param mcp: MCP object for status updates.
+        :param items: (raw_data, query) pairs; query may be None.
+        :return: One summary per item, in the same order ("" when an item has no data or its summary failed).
+        """
+        print(f"LLMFilterSummary: Summarizing {len(items)} raw data items in one batch.")
+        if not self.prompt_template or not items:
+            print("Warning: No prompt or raw data for summary.")
+            return [""] * len(items)
+
+        prompt_lists = [self.map_prompts(raw_data, query) for raw_data, query in items]
+        partials = self.complete_prompts([prompt for prompts in prompt_lists for prompt in prompts])
+
+        grouped, offset = [], 0
+        for prompts in prompt_lists:
+            grouped.append(partials[offset:offset + len(prompts)])
+            offset += len(prompts)
+        summaries = self._map(self.combine, grouped)
+
+        failed = sum(1 for prompts, summary in zip(prompt_lists, summaries) if prompts and not summary)
+        print(f"LLMFilterSummary: Batch of {len(partials)} chunk prompts done, {len(items) - failed}/{len(items)} items summarized.")
+        return summaries
+
+    def map_prompts(self, raw_data: str, query: str = None) -> List[str]:
+        """
+        批量总结的第一步：相关性预筛选并切块，返回每块对应的 map 阶段 prompt (没有数据时返回空列表)。
+        由每个请求方在自己的线程上调用，因此 BM25 排序和切块不会在批量提交者的线程上串行执行。
+        """
+        if not self.prompt_template or not raw_data:
+            return []
+        budget = self._prompt_budget()
+        raw_data = str(raw_data)
+        if query:
+            raw_data = self._select_passages(raw_data, query, budget)
+        return [budget.render(self.prompt_template, {"raw_data": chunk}) for chunk in self._chunk(raw_data, budget)]
+
+    def complete_prompts(self, prompts: List[str], on_result: Callable[[int, str], None] = None) -> List[str]:
+        """
+        批量总结的第二步：在一次批量调用中完成 map_prompts 产生的 prompt (可以来自多个条目)。
+        每个 prompt 完成时立即调用 on_result(i, summary)，失败的 prompt 结果为空字符串。
+        """
+        return self._complete_many(
+            prompts, static_prefix=self.prompt_template.prefix,
+            max_concurrency=self.batch_concurrency or len(prompts), on_result=on_result
+        )
+
+    def combine(self, partial_summaries: List[str]) -> str:
+        """
+        批量总结的第三步：合并同一条目各块的摘要。只有被切分为多块的条目需要 reduce，单块条目直接使用 map 阶段的结果。
+        """
+        parts = [s for s in partial_summaries if s]
+        if len(parts) <= 1:
+            return parts[0] if parts else ""
+        return self._reduce(parts, self._prompt_budget())
+
+    def _chunk_budget(self, budget: PromptBudget) -> int:
+        """
+        每块原始数据的 token 上限：配置值与 (输入预算 - 模板大小) 中的较小者。
+        """
+        template_tokens = max(budget.count(self.prompt_template.static_text), budget.count(self.reduce_prompt_template.static_text))
+        return max(min(self.chunk_tokens, budget.input_budget - template_tokens), 256)
+
+    def _passage_budget(self, budget: PromptBudget) -> int:
+        """
+        相关性预筛选保留的 token 数：一轮 map-reduce 能处理的数据量 (fan_out 个块)，
+        设置了 SUMMARY_PASSAGE_TOKENS 时取两者中的较小者。
+        """
+        capacity = self.fan_out * self._chunk_budget(budget)
+        return min(self.passage_tokens, capacity) if self.passage_tokens else capacity
+
+    def _select_passages(self, raw_data: str, query: str, budget: PromptBudget) -> str:
+        """
+        对 JSON 文档列表中的段落做 BM25 排序，只保留 token 预算内最相关的段落。
+        原始数据不是文档列表、本身已在预算内或没有任何段落与查询相关时，原样返回。
+        """
+        passage_budget = self._passage_budget(budget)
+        if budget.count(raw_data) <= passage_budget:
+            return raw_data
+        try:
+            documents = json.loads(raw_data)
+        except (TypeError, ValueError):
+            return raw_data
+        if not isinstance(documents, list) or not all(isinstance(d, dict) for d in documents):
+            return raw_data
+
+        selected = self.passage_ranker.select(
+            query, documents, top_k=self.passage_top_k or None, budget=passage_budget, length_fn=budget.count
+        )
+        if not selected:
+            return raw_data
+        filtered = json.dumps(selected, ensure_ascii=False, indent=2)
+        print(f"LLMFilterSummary: Relevance pre-filter kept {len(filtered)} of {len(raw_data)} characters.")
+        return filtered
+
+    def _summarize(self, chunk: str, budget: PromptBudget) -> str:
+        prompt = budget.render(self.prompt_template, {"raw_data": chunk})
+        return self._complete(prompt, static_prefix=self.prompt_template.prefix)
+
+    def _merge(self, summaries: str, budget: PromptBudget) -> str:
+        prompt = budget.render(self.reduce_prompt_template, {"summaries": summaries})
+        return self._complete(prompt, static_prefix=self.reduce_prompt_template.prefix)
+
+    def _map(self, fn, items: List[str]) -> List[str]:
+        """
+        以 fan_out 的并发度对每一项调用 fn，结果顺序与输入一致。
+        """
+        if len(items) == 1 or self.fan_out <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.fan_out, len(items))) as pool:
+            return list(pool.map(fn, items))
+
+    def _reduce(self, summaries: List[str], budget: PromptBudget) -> str:
+        """
+        合并部分摘要。合并输入超过块预算时先分组并行合并，再递归合并各组结果。
+        """
+        if not summaries:
+            return ""
+        if len(summaries) == 1 or not self.reduce_prompt_template:
+            return "\n\n".join(summaries)
+
+        groups = self._group(summaries, budget)
+        if len(groups) == 1:
+            return self._merge(groups[0], budget)
+        merged = self._map(lambda group: self._merge(group, budget), groups)
+        if len(groups) >= len(summaries):
+            # 每组只有一个摘要，继续递归不会缩小规模
+            return "\n\n".join(m for m in merged if m)
+        return self._reduce([m for m in merged if m], budget)
+
+    def _group(self, summaries: List[str], budget: PromptBudget) -> List[str]:
+        """
+        把编号后的部分摘要打包成不超过块预算的若干组。
+        """
+        limit = self._chunk_budget(budget)
+        groups, current, current_tokens = [], "", 0
+        for i, summary in enumerate(summaries, 1):
+            part = f"### Part {i}\n{summary}"
+            tokens = budget.count(part)
+            if current and current_tokens + tokens > limit:
+                groups.append(current)
+                current, current_tokens = part, tokens
+            else:
+                current = f"{current}\n\n{part}" if current else part
+                current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _chunk(self, raw_data: str, budget: PromptBudget) -> List[str]:
+        """
+        把原始数据切分为不超过块预算的块。
+        工具返回的 JSON 列表 (例如 [{"url", "content"}, ...]) 按文档切分：小文档打包到同一块，
+        大文档按段落拆分为多个带 part 标记的片段，因此一个巨大的页面不会挤掉其他页面。
+        """
+        limit = self._chunk_budget(budget)
+        if budget.count(raw_data) <= limit:
+            return [raw_data]
+        try:
+            documents = json.loads(raw_data)
+        except (TypeError, ValueError):
+            documents = None
+        if not isinstance(documents, list) or not all(isinstance(d, dict) for d in documents):
+            return _split_text(raw_data, limit, budget)
+
+        chunks, current, size = [], [], 0
+        for document in documents:
+            for piece in self._split_document(document, limit, budget):
+                piece_size = budget.count(json.dumps(piece, ensure_ascii=False, indent=2))
+                if current and size + piece_size > limit:
+                    chunks.append(current)
+                    current, size = [], 0
+                current.append(piece)
+                size += piece_size
+        if current:
+            chunks.append(current)
+        return [json.dumps(chunk, ensure_ascii=False, indent=2) for chunk in chunks]
+
+    def _split_document(self, document: dict, limit: int, budget: PromptBudget) -> List[dict]:
+        if budget.count(json.dumps(document, ensure_ascii=False, indent=2)) <= limit:
+            return [document]
+        content = str(document.get("content", ""))
+        metadata = {k: v for k, v in document.items() if k != "content"}
+        # 预留元数据和 JSON 转义 (换行、引号) 带来的额外 token
+        piece_limit = max(int((limit - budget.count(json.dumps(metadata, ensure_ascii=False)) - 32) * 0.9), 128)
+        pieces = _split_text(content, piece_limit, budget)
+        return [{**metadata, "part": f"{i}/{len(pieces)}", "content": piece} for i, piece in enumerate(pieces, 1)]
@@ -20,8 +20,8 @@ class ProfileDrawer(BaseLLMEntity):
             return mcp
 
         combined_input = f"Original requirement: {mcp.user_requirements}\n\nSupplementary information: {supplementary_info}"
-        prompt = self.prompt_template.replace('{{user_response}}', combined_input[:8000])
-        profile_summary = self.llm_interface.get_completion(prompt)
+        prompt = self._render_prompt(self.prompt_template, {"user_response": combined_input})
+        profile_summary = self._complete(prompt, static_prefix=self.prompt_template.prefix)
 
         if profile_summary:
             print(f"ProfileDrawer: Profile summary generated successfully.")
@@ -22,10 +22,10 @@ class QuestionnaireDesigner(BaseLLMEntity):
             print("Warning: No prompt or raw data for summary.")
             return ""
 
-        # 限制输入长度，防止超出模型限制
-        prompt = self.prompt_template.replace('{{user_requirement}}', str(mcp.user_requirements)[:8000])
+        # 按模型的 token 预算限制输入长度，防止超出模型限制
+        prompt = self._render_prompt(self.prompt_template, {"user_requirement": str(mcp.user_requirements)})
         
-        questionnaire_str = self.llm_interface.get_completion(prompt, response_format={"type": "json_object"})
+        questionnaire_str = self._complete(prompt, static_prefix=self.prompt_template.prefix, response_format={"type": "json_object"})
 
         questionnaire = json.loads(questionnaire_str)
         
@@ -21,12 +21,18 @@ class LLMStrategyPlanner(BaseLLMEntity):
         print("LLMStrategyPlanner: Decomposing user requirements into a high-level strategy.")
         
         # Integrate long-term strategic memory into prompt
+        # 预算不足时优先保留用户需求，截断战略记忆
         cognition_prompt = "\n".join(strategies.cognition)
-        prompt_input = f"User Request: {mcp.user_requirements}\n\nRelevant Strategic Memories:\n{cognition_prompt}"
-
-        prompt = self.prompt_template.replace('{{user_requirements}}', prompt_input)
+        template = self.prompt_template.expand(
+            user_requirements="User Request: {{user_request}}\n\nRelevant Strategic Memories:\n{{strategic_memories}}"
+        )
+        prompt = self._render_prompt(
+            template,
+            {"user_request": str(mcp.user_requirements), "strategic_memories": cognition_prompt},
+            priorities=["user_request", "strategic_memories"]
+        )
         
-        response = self.llm_interface.get_completion(prompt, response_format={"type": "json_object"})
+        response = self._complete(prompt, static_prefix=template.prefix, response_format={"type": "json_object"})
         if response:
             response_data = json.loads(response)
             task_type = response_data.get("task_type", "Unknown task type")
@@ -65,7 +71,7 @@ class LLMStrategyPlanner(BaseLLMEntity):
                         "type": "strategic_plan"
                     }
                 
-                mcp.strategy_plans.append(StrategyPlan(description=plan_dict))
+                mcp.add_strategy_plan(StrategyPlan(description=plan_dict))
             
             print(f"Generated {len(mcp.strategy_plans)} strategy plans for {task_type} task")
         else:
@@ -3,12 +3,12 @@
 Task Planner (How) - Performs detailed tactical planning.
 """
 import json
-import time
-from typing import Dict, List, Any
+from typing import Callable, Dict, List, Any, Optional
 from Data.mcp_models import MCP, SubGoal, ExecutableCommand, StrategyPlan
 from Data.strategies import StrategyData
 from Entities.base_llm_entity import BaseLLMEntity
-from Interfaces.llm_api_interface import OpenAIInterface
+from Entities.utils.incremental_json import IncrementalJSONParser
+from Interfaces.llm_api_interface import OpenAIInterface, LLMError
 from Interfaces.database_interface import RedisClient
 from Tools.tool_registry import ToolRegistry
 
@@ -21,9 +21,11 @@ class LLMTaskPlanner(BaseLLMEntity):
         self.tool_registry = ToolRegistry()
         self.max_retries = 3
 
-    def process(self, mcp: MCP, strategies: StrategyData) -> MCP:
+    def process(self, mcp: MCP, strategies: StrategyData, on_command: Optional[Callable[[ExecutableCommand], None]] = None) -> MCP:
         """
         Batch process all strategy plans, generate subgoals and commands for each plan, and populate into flattened lists.
+        If on_command is given, the response is streamed and parsed incrementally: each command is handed to
+        on_command as soon as its JSON object is complete, while the LLM is still generating the rest of the plan.
         """
 
         if not mcp.strategy_plans:
@@ -35,9 +37,13 @@ class LLMTaskPlanner(BaseLLMEntity):
         # Get tool registry information
         available_tools = self._get_available_tools_info()
         
+        if on_command is not None:
+            self._plan_streaming(lambda plans: self._build_batch_prompt(plans, strategies, available_tools), mcp, on_command)
+            return mcp
+
         # Build batch processing prompt
         batch_prompt = self._build_batch_prompt(mcp.strategy_plans, strategies, available_tools)
-        
+
         # Batch call LLM
         response = self._call_llm_with_retry(batch_prompt)
         
@@ -88,47 +94,194 @@ class LLMTaskPlanner(BaseLLMEntity):
         
         strategic_steps = "\n\n".join(formatted_plans)
         
-        # Replace placeholder in prompt template
-        prompt = self.prompt_template.replace('{{strategic_step}}', strategic_steps)
-        prompt = prompt.replace('{{execution_policy_info}}', policy_prompt)
-        
         # Add tool information
         tools_section = f"\n\n**Current available tools:**\n{tools_info}"
-        prompt = prompt + tools_section
         
-        return prompt
+        # Replace placeholder in prompt template; the execution policy is trimmed first when over budget
+        return self._render_prompt(
+            self.prompt_template.extend(tools_section),
+            {"strategic_step": strategic_steps, "execution_policy_info": policy_prompt},
+            priorities=["strategic_step", "execution_policy_info"],
+            max_output_tokens=4000
+        )
     
     def _call_llm_with_retry(self, prompt: str) -> str:
         """
-        LLM call with retry mechanism
+        LLM call that retries only when the model returns an empty response.
+        Provider failures are already retried with backoff inside the interface, so an LLMError ends the attempts immediately.
         """
         for attempt in range(self.max_retries):
+            print(f"LLM call attempt {attempt + 1}/{self.max_retries}")
             try:
-                print(f"LLM call attempt {attempt + 1}/{self.max_retries}")
-                
-                response = self.llm_interface.get_completion(
+                response = self._complete(
                     prompt,
+                    static_prefix=self.prompt_template.prefix,
+                    raise_errors=True,
                     response_format={"type": "json_object"},
                     temperature=0.3,
                     max_tokens=4000 
                 )
-                
-                if response and response.strip():
-                    return response
-                else:
-                    print(f"Attempt {attempt + 1}: Received empty response")
-                    
-            except Exception as e:
+            except LLMError as e:
                 print(f"Attempt {attempt + 1} failed: {e}")
-                
-            if attempt < self.max_retries - 1:
-                wait_time = 2 ** attempt  # Exponential backoff
-                print(f"Waiting {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
+                return None
+
+            if response and response.strip():
+                return response
+            print(f"Attempt {attempt + 1}: Received empty response")
         
         return None
     
-    def _process_batch_response(self, response: str, mcp: MCP) -> None:
+    def _plan_streaming(self, build_prompt: Callable[[List[StrategyPlan]], str], mcp: MCP,
+                        on_command: Callable[[ExecutableCommand], None]) -> None:
+        """
+        流式调用LLM并增量解析 sub_goals[].executable_commands[]，每个命令一闭合就创建并交给 on_command。
+        如果流正常结束但没有得到任何子目标 (例如输出不是合法JSON)，则退回到整体解析。
+        流在中途中断或被截断时，规划是不完整的：已交出的命令无法撤回，因此保留并封闭它们，
+        然后只为还没有得到完整子目标的战略计划 (没有子目标，或其子目标被截断) 重新规划。
+        build_prompt 根据战略计划列表构建提示词。
+        """
+        plans = list(mcp.strategy_plans)
+        partial = False
+        for attempt in range(self.max_retries):
+            print(f"LLM streaming attempt {attempt + 1}/{self.max_retries}")
+            parser = IncrementalJSONParser([
+                ("sub_goals", "*", "parent_strategy_plan_id"),
+                ("sub_goals", "*", "description"),
+                ("sub_goals", "*", "executable_commands", "*"),
+                ("sub_goals", "*"),
+            ])
+            sub_goals: Dict[int, SubGoal] = {}
+            sub_goal_fields: Dict[int, Dict[str, Any]] = {}
+            closed_sub_goals = set()
+            command_keys: Dict[str, str] = {}
+            first_command_index = len(mcp.executable_commands)
+            default_plan_id = plans[0].id
+            interrupted = False
+
+            try:
+                for delta in self._stream(build_prompt(plans), self.prompt_template.prefix,
+                                          response_format={"type": "json_object"}, temperature=0.3, max_tokens=4000):
+                    for path, value in parser.feed(delta):
+                        index = path[1]
+                        fields = sub_goal_fields.setdefault(index, {})
+                        if len(path) == 3:
+                            fields[path[2]] = value
+                            if index in sub_goals:
+                                # 子目标在其第一条命令处创建，之后才到达的字段在这里补上
+                                if path[2] == "description":
+                                    sub_goals[index].description = value
+                                elif path[2] == "parent_strategy_plan_id" and value:
+                                    mcp.set_sub_goal_parent(sub_goals[index], value)
+                        elif len(path) == 4:
+                            if index not in sub_goals:
+                                sub_goals[index] = self._create_sub_goal(fields, mcp, default_plan_id)
+                            command = self._create_command(value, sub_goals[index], mcp, command_keys)
+                            if command:
+                                on_command(command)
+                        else:
+                            closed_sub_goals.add(index)
+                            if index not in sub_goals and isinstance(value, dict):
+                                # 没有任何命令的子目标，在其对象闭合时创建
+                                sub_goals[index] = self._create_sub_goal(value, mcp, default_plan_id)
+                            if index in sub_goals:
+                                mcp.seal_sub_goal(sub_goals[index])
+            except LLMError as e:
+                # 接口内部已经重试过，提供商不可用时不再重复尝试
+                print(f"Attempt {attempt + 1} failed: {e}")
+                interrupted = True
+                if not sub_goals and not parser.text.strip():
+                    break
+            except Exception as e:
+                print(f"Attempt {attempt + 1} failed: {e}")
+                interrupted = True
+
+            if sub_goals:
+                print(f"Streamed {len(sub_goals)} subgoals and {len(mcp.executable_commands) - first_command_index} executable commands")
+            # 流正常结束但仍有未闭合的子目标，说明输出被截断 (例如达到 max_tokens)
+            truncated = [i for i in sub_goals if i not in closed_sub_goals]
+            if not interrupted and not truncated:
+                if sub_goals:
+                    return
+                if parser.text.strip():
+                    self._process_batch_response(parser.text, mcp, default_plan_id)
+                    for command in mcp.executable_commands[first_command_index:]:
+                        on_command(command)
+                    return
+                print(f"Attempt {attempt + 1}: Received empty response")
+                continue
+
+            if not sub_goals:
+                # 截断的JSON无法整体解析，直接重试
+                print(f"Attempt {attempt + 1}: Stream ended before any subgoal was planned, retrying")
+                continue
+
+            partial = True
+            print(f"Warning: Plan stream ended early, the plan is partial (truncated subgoals: {[sub_goals[i].id for i in truncated]})")
+            for i in truncated:
+                # 被截断的子目标不会再收到命令，封闭后即可随已交出的命令完成
+                mcp.seal_sub_goal(sub_goals[i])
+            incomplete = {sub_goals[i].parent_strategy_plan_id for i in truncated}
+            covered = {sub_goal.parent_strategy_plan_id for sub_goal in sub_goals.values()} - incomplete
+            plans = [plan for plan in plans if plan.id not in covered]
+            if not plans:
+                return
+            print(f"Re-planning {len(plans)} strategy plans without a complete subgoal: {[plan.id for plan in plans]}")
+
+        if partial:
+            print(f"Error: Plan is incomplete, no complete subgoals were planned for strategy plans {[plan.id for plan in plans]}")
+        else:
+            print("Error: Failed to get valid response from LLM after all retries.")
+
+    def _create_sub_goal(self, sg_data: Dict[str, Any], mcp: MCP, default_plan_id: str = None) -> SubGoal:
+        """
+        根据LLM输出的子目标数据创建 SubGoal 并加入 MCP。
+        default_plan_id 为本次规划的第一个战略计划，未指定时使用 MCP 中的第一个战略计划。
+        """
+        # 查找对应的strategy_plan_id
+        parent_plan_id = sg_data.get("parent_strategy_plan_id")
+        
+        # 如果没有指定parent_id，使用第一个可用的plan
+        if not parent_plan_id:
+            parent_plan_id = default_plan_id or (mcp.strategy_plans[0].id if mcp.strategy_plans else None)
+        
+        new_sub_goal = SubGoal(
+            parent_strategy_plan_id=parent_plan_id,
+            description=sg_data.get("description", "")
+        )
+        mcp.add_sub_goal(new_sub_goal)
+        return new_sub_goal
+
+    def _create_command(self, cmd_data: Dict[str, Any], sub_goal: SubGoal, mcp: MCP, command_keys: Dict[str, str]) -> Optional[ExecutableCommand]:
+        """
+        根据LLM输出的命令数据创建 ExecutableCommand 并加入 MCP，工具不在注册表中时跳过。
+        LLM 用 command_key 标识命令、用 depends_on 引用之前命令的 command_key；
+        command_keys 记录本次规划中 command_key -> 命令ID 的映射，用于把依赖解析为真实ID。
+        """
+        tool_name = cmd_data.get("tool")
+        
+        if tool_name not in self.tool_registry.list_tools():
+            print(f"Warning:'{tool_name}' is not in the registry, skipping this command")
+            return None
+
+        depends_on = []
+        for key in cmd_data.get("depends_on") or []:
+            if str(key) in command_keys:
+                depends_on.append(command_keys[str(key)])
+            else:
+                print(f"Warning: dependency '{key}' does not refer to an earlier command, ignoring it")
+
+        new_command = ExecutableCommand(
+            parent_sub_goal_id=sub_goal.id,
+            tool=tool_name,
+            params=cmd_data.get("params", {}),
+            depends_on=depends_on
+        )
+        if cmd_data.get("command_key") is not None:
+            command_keys[str(cmd_data["command_key"])] = new_command.id
+        mcp.add_command(new_command)
+        return new_command
+
+    def _process_batch_response(self, response: str, mcp: MCP, default_plan_id: str = None) -> None:
         """
         处理批量LLM响应
         """
@@ -136,32 +289,13 @@ class LLMTaskPlanner(BaseLLMEntity):
             task_json = json.loads(response)
             
             # 处理批量响应中的子目标
+            command_keys = {}
             for sg_data in task_json.get("sub_goals", []):
-                # 查找对应的strategy_plan_id
-                parent_plan_id = sg_data.get("parent_strategy_plan_id")
-                
-                # 如果没有指定parent_id，使用第一个可用的plan
-                if not parent_plan_id and mcp.strategy_plans:
-                    parent_plan_id = mcp.strategy_plans[0].id
-                
-                new_sub_goal = SubGoal(
-                    parent_strategy_plan_id=parent_plan_id,
-                    description=sg_data.get("description", "")
-                )
-                mcp.sub_goals.append(new_sub_goal)
+                new_sub_goal = self._create_sub_goal(sg_data, mcp, default_plan_id)
                 
                 for cmd_data in sg_data.get("executable_commands", []):
-                    tool_name = cmd_data.get("tool")
-                    
-                    if tool_name in self.tool_registry.list_tools():
-                        new_command = ExecutableCommand(
-                            parent_sub_goal_id=new_sub_goal.id,
-                            tool=tool_name,
-                            params=cmd_data.get("params", {})
-                        )
-                        mcp.executable_commands.append(new_command)
-                    else:
-                        print(f"Warning:'{tool_name}' is not in the registry, skipping this command")
+                    self._create_command(cmd_data, new_sub_goal, mcp, command_keys)
+                mcp.seal_sub_goal(new_sub_goal)
                 
             print(f"Batch generated {len(mcp.sub_goals)} subgoals and {len(mcp.executable_commands)} executable commands")
 
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+增量 JSON 解析器：在 LLM 仍在流式生成时，从不完整的 JSON 文本中提取已经完整的值。
+调用方声明关心的路径 (例如 ("sub_goals", "*", "executable_commands", "*"))，
+每次 feed() 新的文本增量后，返回在这次增量中刚刚闭合的、路径匹配的值。
+"""
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+Path = Tuple[Any, ...]
+
+class _Frame:
+    """
+    解析栈中的一个容器 (对象或数组)。
+    """
+    __slots__ = ("is_object", "start", "path", "key", "expect_key", "count")
+
+    def __init__(self, is_object: bool, start: int, path: Path):
+        self.is_object = is_object
+        self.start = start
+        self.path = path
+        self.key: Optional[str] = None
+        self.expect_key = is_object
+        self.count = 0
+
+class IncrementalJSONParser:
+    """
+    逐字符扫描的增量解析器。
+    只在值闭合时对其原文切片调用 json.loads，因此总开销与文档长度成线性关系。
+    第一个 '{' 或 '[' 之前的内容 (例如 ```json 围栏) 会被忽略，顶层值结束后的内容同样忽略。
+    路径模式中的 "*" 匹配任意数组下标。
+    """
+    def __init__(self, watch_paths: Sequence[Sequence[Any]]):
+        self.watch_paths = [tuple(p) for p in watch_paths]
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._done = False
+
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._primitive_start: Optional[int] = None
+        self._value_path: Path = ()
+
+    @property
+    def text(self) -> str:
+        """目前为止收到的全部文本。"""
+        return self._text
+
+    @property
+    def is_complete(self) -> bool:
+        """顶层 JSON 值是否已经闭合。"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """
+        输入一段新的文本增量，返回本次新闭合且路径匹配的 (path, value) 列表。
+        """
+        self._text += chunk
+        events: List[Tuple[Path, Any]] = []
+        while self._pos < len(self._text) and not self._done:
+            self._step(self._text[self._pos], events)
+            self._pos += 1
+        return events
+
+    def _matches(self, path: Path) -> bool:
+        for pattern in self.watch_paths:
+            if len(pattern) != len(path):
+                continue
+            if all(p == x or (p == "*" and isinstance(x, int)) for p, x in zip(pattern, path)):
+                return True
+        return False
+
+    def _emit(self, path: Path, raw: str, events: List[Tuple[Path, Any]]) -> None:
+        if not self._matches(path):
+            return
+        try:
+            events.append((path, json.loads(raw)))
+        except json.JSONDecodeError:
+            pass
+
+    def _begin_value(self) -> Path:
+        """
+        在当前容器中开始一个新值，返回该值的路径。
+        """
+        frame = self._stack[-1]
+        if frame.is_object:
+            return frame.path + (frame.key,)
+        index = frame.count
+        frame.count += 1
+        return frame.path + (index,)
+
+    def _step(self, ch: str, events: List[Tuple[Path, Any]]) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                raw = self._text[self._string_start:self._pos + 1]
+                if self._string_is_key:
+                    frame = self._stack[-1]
+                    try:
+                        frame.key = json.loads(raw)
+                    except json.JSONDecodeError:
+                        frame.key = raw.strip('"')
+                    frame.expect_key = False
+                else:
+                    self._emit(self._value_path, raw, events)
+            return
+
+        if self._primitive_start is not None:
+            if ch not in ',}] \t\r\n':
+                return
+            raw = self._text[self._primitive_start:self._pos]
+            self._primitive_start = None
+            self._emit(self._value_path, raw, events)
+
+        if not self._started:
+            if ch in '{[':
+                self._started = True
+                self._stack.append(_Frame(ch == '{', self._pos, ()))
+            return
+
+        if ch in ' \t\r\n:':
+            return
+        if ch in '{[':
+            path = self._begin_value()
+            self._stack.append(_Frame(ch == '{', self._pos, path))
+        elif ch in '}]':
+            frame = self._stack.pop()
+            self._emit(frame.path, self._text[frame.start:self._pos + 1], events)
+            if not self._stack:
+                self._done = True
+        elif ch == ',':
+            frame = self._stack[-1]
+            if frame.is_object:
+                frame.expect_key = True
+        elif ch == '"':
+            frame = self._stack[-1]
+            self._string_is_key = frame.is_object and frame.expect_key
+            if not self._string_is_key:
+                self._value_path = self._begin_value()
+            self._in_string = True
+            self._string_start = self._pos
+        else:
+            self._value_path = self._begin_value()
+            self._primitive_start = self._pos
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+按实体和输入规模选择模型的路由表。
+每个提供商有一张表：实体类名 -> 按 max_tokens 从小到大排列的档位，输入 token 数不超过某档 max_tokens 时使用该档模型
+(max_tokens 为 null 表示不设上限)。这样小的总结任务可以走最便宜、最快的模型，只有大输入或规划类 prompt 才升级到更强的模型。
+没有配置的实体 (或档位的 model 为 null) 不指定模型，由接口使用部署默认模型 (OPENAI_MODEL 等环境变量)。
+
+内置路由为空：不配置时所有调用都使用部署默认模型，通过 OPENAI_BASE_URL 接入的代理或兼容服务不会收到它不认识的模型名。
+需要按实体分配便宜/强模型时，用 MODEL_ROUTES_FILE 指向一个 JSON 路由文件 (示例见 0_Resources/model_routes.example.json)，
+文件中出现的 (提供商, 实体) 整体替换内置配置，例如:
+{"openai": {"LLMFilterSummary": [{"max_tokens": 6000, "model": "gpt-4o-mini"}, {"max_tokens": null, "model": null}]}}
+"""
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+# 内置路由：不为任何实体指定模型 (即部署默认模型)，便宜/强模型的划分由 MODEL_ROUTES_FILE 按部署开启
+DEFAULT_ROUTES: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+
+class ModelRouter:
+    """
+    路由表查询与路由计数 (实体 -> 模型 -> 次数)。
+    """
+    def __init__(self, routes: Dict[str, Dict[str, List[Dict[str, Any]]]] = None):
+        self.routes = routes if routes is not None else DEFAULT_ROUTES
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def tiers(self, provider: str, entity: str) -> List[Dict[str, Any]]:
+        tiers = self.routes.get(provider, {}).get(entity, [])
+        return sorted(tiers, key=lambda tier: float("inf") if tier.get("max_tokens") is None else tier["max_tokens"])
+
+    def route(self, provider: str, entity: str, input_tokens: int) -> Optional[str]:
+        """
+        返回该实体在此输入规模下应使用的模型，没有匹配的档位时返回 None (使用接口的默认模型)。
+        """
+        model = None
+        for tier in self.tiers(provider, entity):
+            if tier.get("max_tokens") is None or input_tokens <= tier["max_tokens"]:
+                model = tier.get("model")
+                break
+        with self._lock:
+            models = self._counts.setdefault(entity, {})
+            key = model or "default"
+            models[key] = models.get(key, 0) + 1
+        return model
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        返回每个实体被路由到各模型的次数 ("default" 表示使用接口的默认模型)。
+        """
+        with self._lock:
+            return {entity: dict(models) for entity, models in self._counts.items()}
+
+def load_routes(path: str = None) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """
+    读取 MODEL_ROUTES_FILE (或 path) 中的路由并合并到默认路由之上，文件不存在或无法解析时使用默认路由。
+    """
+    routes = {provider: dict(table) for provider, table in DEFAULT_ROUTES.items()}
+    path = path or os.getenv('MODEL_ROUTES_FILE')
+    if not path:
+        return routes
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"ModelRouter Warning: could not load routes from {path}, using defaults: {e}")
+        return routes
+    for provider, table in overrides.items():
+        routes.setdefault(provider, {}).update(table)
+    return routes
+
+_model_router: Optional[ModelRouter] = None
+_model_router_lock = threading.Lock()
+
+def get_model_router() -> ModelRouter:
+    """
+    返回进程级的模型路由器。MODEL_ROUTING=false 时路由表为空，所有实体都使用接口的默认模型。
+    """
+    global _model_router
+    with _model_router_lock:
+        if _model_router is None:
+            enabled = os.getenv('MODEL_ROUTING', 'true').lower() == 'true'
+            _model_router = ModelRouter(load_routes() if enabled else {})
+        return _model_router
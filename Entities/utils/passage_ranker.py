@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+抽取式相关性预筛选：在把网页正文交给 LLMFilterSummary 之前，用 BM25 对段落打分，
+只保留与命令关键词和子目标描述最相关的段落。打分完全向量化 (NumPy)，不依赖任何 embedding 服务。
+"""
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_LATIN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    拉丁字母/数字按词切分；中日韩文本没有空格，使用字符二元组 (单字的片段保留单字)。
+    """
+    text = text.casefold()
+    tokens = [t for t in _LATIN_PATTERN.findall(_CJK_PATTERN.sub(" ", text))]
+    for run in _CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def split_passages(text: str, min_chars: int = 80) -> List[str]:
+    """
+    按段落切分正文，过短的行 (标题、列表项等) 与后续内容合并为一个段落。
+    """
+    passages, current = [], ""
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        current = f"{current}\n{line}" if current else line
+        if len(current) >= min_chars:
+            passages.append(current)
+            current = ""
+    if current:
+        passages.append(current)
+    return passages
+
+class BM25PassageRanker:
+    """
+    Okapi BM25 段落排序器。
+    词表只包含查询词，因此词频矩阵的大小为 (段落数 x 查询词数)，IDF 在本次参与排序的段落集合上计算。
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query: str, passages: Sequence[str]) -> np.ndarray:
+        """
+        返回每个段落相对查询的 BM25 分数。
+        """
+        if not passages:
+            return np.zeros(0)
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return np.zeros(len(passages))
+        term_index = {term: j for j, term in enumerate(query_terms)}
+
+        tf = np.zeros((len(passages), len(query_terms)), dtype=np.float64)
+        lengths = np.zeros(len(passages), dtype=np.float64)
+        for i, passage in enumerate(passages):
+            tokens = tokenize(passage)
+            lengths[i] = len(tokens)
+            for token in tokens:
+                j = term_index.get(token)
+                if j is not None:
+                    tf[i, j] += 1
+
+        n = len(passages)
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avg_length = lengths.mean() or 1.0
+        norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        return (idf * tf * (self.k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+    def select(self, query: str, documents: List[Dict], top_k: Optional[int] = 12, budget: int = 6000,
+               length_fn: Callable[[str], int] = len) -> List[Dict]:
+        """
+        对所有文档的段落统一打分，按分数从高到低选取最多 top_k 个 (None 表示不限个数)、总长度 (由 length_fn 计量) 不超过 budget 的段落。
+        返回的文档保持原顺序，文档内的段落也保持原文顺序；没有段落入选的文档被省略。
+        与查询完全无关 (分数为 0) 的段落不会入选。
+        """
+        passages: List[Tuple[int, int, str]] = []
+        for d, document in enumerate(documents):
+            for p, passage in enumerate(split_passages(str(document.get("content", "")))):
+                passages.append((d, p, passage))
+        if not passages:
+            return []
+
+        scores = self.score(query, [passage for _, _, passage in passages])
+        chosen, used = [], 0
+        for i in np.argsort(-scores, kind="stable"):
+            if (top_k is not None and len(chosen) >= top_k) or scores[i] <= 0:
+                break
+            size = length_fn(passages[i][2])
+            if used + size > budget:
+                continue
+            chosen.append(i)
+            used += size
+
+        selected: Dict[int, List[Tuple[int, str]]] = {}
+        for i in sorted(chosen):
+            d, p, passage = passages[i]
+            selected.setdefault(d, []).append((p, passage))
+        return [
+            {**documents[d], "content": "\n".join(passage for _, passage in selected[d])}
+            for d in sorted(selected)
+        ]
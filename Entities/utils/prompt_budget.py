@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Token 感知的 prompt 预算管理。
+根据模型的上下文窗口、预留的输出长度和模板本身的大小，计算可用于插入内容的 token 预算，
+并按优先级把预算分配给模板中的各个占位符 ({{name}})：高优先级的内容先完整放入，低优先级的内容先被截断。
+只有在确实超出预算时才截断，因此既不会溢出上下文窗口，也不会无谓地把 prompt 截得过短。
+
+Token 计数离线进行：安装了 tiktoken 时 OpenAI 模型使用其精确计数，否则按模型家族使用启发式估算
+(中日韩字符约每字一个 token，其他文本约每 4 个字符一个 token)。
+"""
+import os
+import re
+from typing import Dict, List, Optional, Union
+
+from Entities.utils.prompt_registry import CompiledTemplate
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# 模型名前缀 -> 上下文窗口 (token)，按最长前缀匹配
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4": 8192,
+    "o1": 200000,
+    "o3": 200000,
+    "o4": 200000,
+    "claude": 200000,
+    "gemini-1.5-pro": 2097152,
+    "gemini-1.5-flash": 1048576,
+    "gemini-2": 1048576,
+    "gemini": 32768,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# 模型家族 -> (每个中日韩字符的 token 数, 其他文本每个 token 的字符数)
+TOKEN_RATIOS = {
+    "openai": (1.0, 4.0),
+    "anthropic": (1.3, 3.5),
+    "google": (0.8, 4.0),
+}
+
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯　-〿]")
+
+def model_family(model: Optional[str]) -> str:
+    name = (model or "").lower()
+    if name.startswith("claude"):
+        return "anthropic"
+    if name.startswith("gemini"):
+        return "google"
+    return "openai"
+
+def context_window(model: Optional[str]) -> int:
+    name = (model or "").lower()
+    matches = [prefix for prefix in CONTEXT_WINDOWS if name.startswith(prefix)]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+def _tiktoken_encoding(model: str):
+    if tiktoken is None or model_family(model) != "openai":
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+class PromptBudget:
+    """
+    为某个模型的一次调用计算并分配 prompt 预算。
+    input_budget = (上下文窗口 - 预留输出) * (1 - safety_margin)，并且不超过 max_input_tokens (如果设置)。
+    """
+    def __init__(self, model: str = None, max_output_tokens: int = 1024, max_input_tokens: int = None,
+                 safety_margin: float = 0.05):
+        self.model = model or ""
+        self.family = model_family(self.model)
+        self.context_window = context_window(self.model)
+        limit = int((self.context_window - max_output_tokens) * (1 - safety_margin))
+        self.input_budget = min(limit, max_input_tokens) if max_input_tokens else limit
+        self._encoding = _tiktoken_encoding(self.model)
+
+    def count(self, text: str) -> int:
+        """
+        计算文本的 token 数 (精确或估算)。
+        """
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        cjk_ratio, chars_per_token = TOKEN_RATIOS[self.family]
+        cjk = len(_CJK_PATTERN.findall(text))
+        return int(cjk * cjk_ratio + (len(text) - cjk) / chars_per_token) + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        保留文本开头不超过 max_tokens 的部分。
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max_tokens])
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
+
+    def render(self, template: Union[str, CompiledTemplate], slots: Dict[str, str], priorities: List[str] = None,
+               budget: int = None) -> str:
+        """
+        用 slots 填充模板中的 {{name}} 占位符，保证结果不超过预算。
+        template 可以是注册表中编译好的模板 (推荐，字面量部分的 token 数会被缓存)，也可以是普通字符串。
+        priorities 按优先级从高到低列出占位符 (默认为 slots 的顺序)；预算不足时从最低优先级开始截断。
+        """
+        if not isinstance(template, CompiledTemplate):
+            template = CompiledTemplate("", str(template))
+        budget = budget or self.input_budget
+        slots = {name: str(value) for name, value in slots.items()}
+        order = [name for name in (priorities or []) if name in slots]
+        order += [name for name in slots if name not in order]
+
+        counter_key = (self.family, self._encoding.name if self._encoding is not None else None)
+        fixed = template.static_tokens(counter_key, self.count)
+        fixed += sum(self.count(f"{{{{{slot}}}}}") for slot in template.slots if slot not in slots)
+        remaining = budget - fixed
+        if remaining < 0:
+            print(f"PromptBudget Warning: template alone ({fixed} tokens) exceeds the budget of {budget} tokens.")
+            remaining = 0
+
+        # 同一占位符可能在模板中出现多次，按出现次数分摊预算
+        occurrences = {name: max(template.slots.count(name), 1) for name in order}
+        allocated = {}
+        for name in order:
+            allocated[name] = min(self.count(slots[name]), remaining // occurrences[name])
+            remaining -= allocated[name] * occurrences[name]
+
+        # 分段计数与整体计数之间存在边界误差，超出时继续收紧最低优先级的内容
+        for _ in range(8):
+            values = {name: self.truncate(slots[name], allocated[name]) for name in order}
+            prompt = template.render(values)
+            overflow = self.count(prompt) - budget
+            if overflow <= 0:
+                break
+            for name in reversed(order):
+                if allocated[name] > 0:
+                    allocated[name] = max(allocated[name] - overflow - 1, 0)
+                    break
+            else:
+                break
+
+        trimmed = [name for name in order if len(values[name]) < len(slots[name])]
+        if trimmed:
+            print(f"PromptBudget: Trimmed {trimmed} to fit {budget} tokens for model '{self.model or 'default'}'.")
+        return prompt
+
+def prompt_budget_for(model: str = None, max_output_tokens: int = 1024) -> PromptBudget:
+    """
+    创建预算管理器，PROMPT_MAX_INPUT_TOKENS 环境变量可以进一步限制输入预算 (例如出于成本考虑)。
+    """
+    max_input = os.getenv('PROMPT_MAX_INPUT_TOKENS')
+    return PromptBudget(model, max_output_tokens, int(max_input) if max_input else None)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+进程级的 prompt 模板注册表。
+Prompts/ 下的每个文件在进程内只读取并编译一次：模板被预先切分为字面量片段和占位符槽位 ({{name}})，
+渲染时只需一次拼接，而不是对 5-8 KB 的模板反复执行 str.replace。
+每个模板还提供稳定的内容哈希，缓存可以把它作为键的一部分，模板修改后旧的缓存条目自然失效。
+"""
+import os
+import re
+import hashlib
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Prompts')
+
+_PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+class CompiledTemplate:
+    """
+    编译后的模板：parts 为字面量片段，slots 为位于片段之间的占位符名称 (len(parts) == len(slots) + 1)。
+    派生模板 (expand / extend) 会被缓存，因此在每次调用中重复派生也不会重新编译。
+    """
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text
+        pieces = _PLACEHOLDER_PATTERN.split(text)
+        self.parts: List[str] = pieces[0::2]
+        self.slots: List[str] = pieces[1::2]
+        self.placeholders: FrozenSet[str] = frozenset(self.slots)
+        self.static_text = "".join(self.parts)
+        self.hash = hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+        self._derived: Dict[Tuple, "CompiledTemplate"] = {}
+        self._static_tokens: Dict[Tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.text)
+
+    def __str__(self) -> str:
+        return self.text
+
+    @property
+    def prefix(self) -> str:
+        """
+        第一个占位符之前的静态前缀，对同一模板的所有调用都相同，可以交给提供商的前缀缓存。
+        """
+        return self.parts[0]
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        填充占位符，未提供值的占位符原样保留。
+        """
+        out = [self.parts[0]]
+        for slot, part in zip(self.slots, self.parts[1:]):
+            value = values.get(slot)
+            out.append(f"{{{{{slot}}}}}" if value is None else value)
+            out.append(part)
+        return "".join(out)
+
+    def expand(self, **sub_templates: str) -> "CompiledTemplate":
+        """
+        把某些占位符替换为子模板文本 (子模板可以包含新的占位符)，返回派生模板。
+        """
+        key = ("expand",) + tuple(sorted(sub_templates.items()))
+        return self._derive(key, lambda: self.render(sub_templates))
+
+    def extend(self, suffix: str) -> "CompiledTemplate":
+        """
+        在模板末尾追加文本，返回派生模板。
+        """
+        return self._derive(("extend", suffix), lambda: self.text + suffix)
+
+    def _derive(self, key: Tuple, build) -> "CompiledTemplate":
+        with self._lock:
+            derived = self._derived.get(key)
+            if derived is None:
+                derived = CompiledTemplate(self.name, build())
+                self._derived[key] = derived
+            return derived
+
+    def static_tokens(self, counter_key: Tuple, count) -> int:
+        """
+        模板字面量部分的 token 数，按计数方式 (counter_key) 缓存。
+        """
+        tokens = self._static_tokens.get(counter_key)
+        if tokens is None:
+            tokens = count(self.static_text)
+            self._static_tokens[counter_key] = tokens
+        return tokens
+
+class PromptRegistry:
+    """
+    线程安全的模板注册表，按文件名缓存编译后的模板。
+    """
+    def __init__(self, prompts_dir: str = PROMPTS_DIR):
+        self.prompts_dir = prompts_dir
+        self._templates: Dict[str, Optional[CompiledTemplate]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[CompiledTemplate]:
+        """
+        返回编译后的模板，文件不存在时返回 None (只告警一次)。
+        """
+        with self._lock:
+            if name not in self._templates:
+                self._templates[name] = self._load(name)
+            return self._templates[name]
+
+    def _load(self, name: str) -> Optional[CompiledTemplate]:
+        prompt_path = os.path.join(self.prompts_dir, name)
+        try:
+            with open(prompt_path, 'r', encoding='utf-8') as f:
+                return CompiledTemplate(name, f.read())
+        except FileNotFoundError:
+            print(f"Warning: Prompt file not found at {prompt_path}")
+            return None
+
+    def render(self, name: str, values: Dict[str, str]) -> str:
+        template = self.get(name)
+        return template.render(values) if template else ""
+
+    def hash(self, name: str) -> Optional[str]:
+        """
+        模板内容的稳定哈希 (sha256 前 16 位)，模板不存在时返回 None。
+        """
+        template = self.get(name)
+        return template.hash if template else None
+
+prompt_registry = PromptRegistry()
@@ -6,7 +6,8 @@
 from abc import ABC, abstractmethod
 import uuid
 from Data.mcp_models import MCP, WorkingMemory
-from Entities.base_llm_entity import BaseLLMEntity
+from Entities.base_llm_entity import BaseLLMEntity, EMPTY_TEMPLATE
+from Entities.utils.prompt_registry import CompiledTemplate
 from Interfaces.llm_api_interface import LLMAPIInterface
 
 class BaseVerificationEntity(BaseLLMEntity):
@@ -17,9 +18,9 @@ class BaseVerificationEntity(BaseLLMEntity):
         # 验证类可能不需要LLM，所以允许接口为None
         super().__init__(llm_interface, db_interface, entity_id)
 
-    def _load_prompt(self) -> str:
-        # 验证类通常没有自己的prompt文件，返回空字符串
-        return ""
+    def _load_prompt(self, prompt_name: str = None) -> CompiledTemplate:
+        # 验证类通常没有自己的prompt文件，返回空模板
+        return EMPTY_TEMPLATE
 
     @abstractmethod
     def verify(self, mcp: MCP, working_memory: WorkingMemory = None) -> bool:
@@ -269,6 +269,9 @@ def render_logs_section(workflow_manager):
                     timestamp = time.strftime("%H:%M:%S", time.localtime(log["timestamp"]))
                     phase = log.get("phase", "unknown")
                     message = log['message']
+                    if log["type"] == "stream":
+                        # LLM output still streaming in
+                        message = f"⏳ {message}"
                     
                     full_message = f"[{timestamp}] [{phase}] {message}"
                     
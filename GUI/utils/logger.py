@@ -1,5 +1,6 @@
 import time
 import json
+import threading
 from typing import Dict, List, Any
 
 class WorkflowLogger:
@@ -8,6 +9,9 @@ class WorkflowLogger:
         self.current_phase = ""
         self.status = "idle"
         self.start_time = None
+        # 正在进行的流式输出: stream_id -> 对应的日志条目
+        self._streams: Dict[str, Dict] = {}
+        self._stream_lock = threading.Lock()
     
     def start_workflow(self):
         self.start_time = time.time()
@@ -29,6 +33,38 @@ class WorkflowLogger:
         }
         self.logs.append(log_entry)
     
+    def stream_started(self, phase: str, stream_id: str):
+        """Create a live log entry that accumulates the deltas of one LLM stream."""
+        log_entry = {
+            "timestamp": time.time(),
+            "phase": phase,
+            "message": "",
+            "type": "stream",
+            "data": {"stream_id": stream_id, "time_to_first_token": None, "duration": None}
+        }
+        with self._stream_lock:
+            self._streams[stream_id] = log_entry
+            self.logs.append(log_entry)
+    
+    def stream_delta(self, stream_id: str, delta: str):
+        """Append a text delta to the live entry, recording time-to-first-token on the first one."""
+        with self._stream_lock:
+            log_entry = self._streams.get(stream_id)
+            if log_entry is None:
+                return
+            if log_entry["data"]["time_to_first_token"] is None:
+                log_entry["data"]["time_to_first_token"] = time.time() - log_entry["timestamp"]
+            log_entry["message"] += delta
+    
+    def stream_finished(self, stream_id: str):
+        """Close the live entry and record the total stream duration."""
+        with self._stream_lock:
+            log_entry = self._streams.pop(stream_id, None)
+            if log_entry is None:
+                return
+            log_entry["data"]["duration"] = time.time() - log_entry["timestamp"]
+            log_entry["type"] = "info"
+    
     def get_logs_by_phase(self, phase: str) -> List[Dict]:
         return [log for log in self.logs if log["phase"] == phase]
     
@@ -55,6 +91,8 @@ class WorkflowLogger:
         return ""
 
     def clear_logs(self):
+        with self._stream_lock:
+            self._streams = {}
         self.logs = []
         self.current_phase = ""
         self.status = "idle"
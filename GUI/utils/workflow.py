@@ -1,6 +1,7 @@
 """
 Asynchronous workflow manager - supports real-time control and state management
 """
+import os
 import asyncio
 import threading
 import time
@@ -10,16 +11,49 @@ from GUI.utils.config import LLMConfig
 
 from Data.mcp_models import MCP, WorkingMemory, StrategyPlan, SubGoal, ExecutableCommand
 from Data.strategies import StrategyData
-from Interfaces.llm_api_interface import OpenAIInterface, GoogleCloudInterface, AnthropicInterface
+from Interfaces.llm_api_interface import (
+    LLMAPIInterface, OpenAIInterface, GoogleCloudInterface, AnthropicInterface, circuit_breaker_stats
+)
+from Interfaces.async_llm_api_interface import (
+    SyncLLMAdapter, AsyncOpenAIInterface, AsyncGoogleCloudInterface, AsyncAnthropicInterface
+)
+from Interfaces.llm_cache import CachedLLMAPIInterface
+from Interfaces.llm_singleflight import SingleFlightLLMAPIInterface
+from Interfaces.llm_hedging import HedgedLLMAPIInterface
+from Interfaces.llm_concurrency import concurrency_stats
+from Interfaces.cache_interface import create_cache
+from Tools.utils.http_fetcher import get_page_fetcher
 from Interfaces.database_interface import RedisClient
 from Entities.strategy_planner import LLMStrategyPlanner
 from Entities.task_planner import LLMTaskPlanner
 from Entities.questionnaire_designer import QuestionnaireDesigner
 from Entities.profile_drawer import ProfileDrawer
 from Entities.filter_summary import LLMFilterSummary
+from Entities.utils.model_router import get_model_router
 from Tools.executor import ToolExecutor
 from Tools.tool_registry import ToolRegistry
 
+PROVIDER_INTERFACES = {
+    "OpenAI": OpenAIInterface,
+    "Google": GoogleCloudInterface,
+    "Anthropic": AnthropicInterface,
+}
+
+# LLM_ASYNC=true 时使用的异步实现：请求在共享的后台事件循环中并发执行，等待响应不再占用线程
+ASYNC_PROVIDER_INTERFACES = {
+    "OpenAI": AsyncOpenAIInterface,
+    "Google": AsyncGoogleCloudInterface,
+    "Anthropic": AsyncAnthropicInterface,
+}
+
+def create_provider_interface(name: str) -> LLMAPIInterface:
+    """
+    按提供商名称创建 LLM 接口。LLM_ASYNC=true 时返回包装了异步实现的 SyncLLMAdapter，对调用方而言接口不变。
+    """
+    if os.getenv('LLM_ASYNC', 'false').lower() == 'true':
+        return SyncLLMAdapter(ASYNC_PROVIDER_INTERFACES[name]())
+    return PROVIDER_INTERFACES[name]()
+
 class AsyncWorkflowManager:
     
     def __init__(self):
@@ -39,7 +73,9 @@ class AsyncWorkflowManager:
         self.supplementary_info = None
         
         # 初始化接口和实体（延迟初始化）
-        self.llm_interface: Optional[OpenAIInterface | GoogleCloudInterface | AnthropicInterface] = None
+        self.llm_interface: Optional[LLMAPIInterface] = None
+        self.llm_cache: Optional[CachedLLMAPIInterface] = None
+        self.llm_hedging: Optional[HedgedLLMAPIInterface] = None
         self.db_interface: Optional[RedisClient] = None
         self.questionnaire_designer: Optional[QuestionnaireDesigner] = None
         self.profile_drawer: Optional[ProfileDrawer] = None
@@ -83,6 +119,8 @@ class AsyncWorkflowManager:
             self.workflow_thread.join(timeout=5)
         
         # 清理资源
+        if self.executor:
+            self.executor.shutdown(wait=False)
         if self.db_interface:
             try:
                 self.db_interface.disconnect()
@@ -105,14 +143,34 @@ class AsyncWorkflowManager:
 
             selected_provider = LLMConfig.get_general_config()['selected_provider']
             
-            if selected_provider == "OpenAI":
-                self.llm_interface = OpenAIInterface()
-            elif selected_provider == "Google":
-                self.llm_interface = GoogleCloudInterface()
-            elif selected_provider == "Anthropic":
-                self.llm_interface = AnthropicInterface()
+            if selected_provider in PROVIDER_INTERFACES:
+                self.llm_interface = create_provider_interface(selected_provider)
+                if isinstance(self.llm_interface, SyncLLMAdapter):
+                    self.logger.add_log("Initialization", "Async LLM interfaces enabled (shared event loop)", "info")
+            
+            # 备用提供商：主提供商响应过慢时发出对冲请求，熔断时故障转移
+            fallbacks = []
+            for name in os.getenv('LLM_FALLBACK_PROVIDERS', '').split(','):
+                name = name.strip()
+                if name and name != selected_provider and name in PROVIDER_INTERFACES:
+                    try:
+                        fallbacks.append(create_provider_interface(name))
+                    except ValueError as e:
+                        self.logger.add_log("Initialization", f"Fallback provider {name} unavailable: {e}", "warning")
+            if fallbacks:
+                self.llm_hedging = self.llm_interface = HedgedLLMAPIInterface(self.llm_interface, fallbacks)
+                self.logger.add_log("Initialization", f"LLM hedging enabled with fallbacks: {[f.provider for f in fallbacks]}", "info")
             
             self.db_interface = RedisClient()
+            if os.getenv('LLM_CACHE_ENABLED', 'false').lower() == 'true':
+                self.llm_cache = self.llm_interface = CachedLLMAPIInterface(
+                    self.llm_interface,
+                    create_cache("llm_responses", db_interface=self.db_interface)
+                )
+                self.logger.add_log("Initialization", "LLM response cache enabled", "info")
+            if os.getenv('LLM_SINGLE_FLIGHT', 'true').lower() == 'true':
+                # 放在缓存外层：同时到达的相同请求只调用一次上游 (以及缓存)
+                self.llm_interface = SingleFlightLLMAPIInterface(self.llm_interface)
             self.logger.add_log("Initialization", "✅ LLM interface and database interface initialization completed", "success")
             
             # 1.3: 初始化数据类
@@ -133,6 +191,9 @@ class AsyncWorkflowManager:
             self.strategy_planner = LLMStrategyPlanner(self.llm_interface, self.db_interface)
             self.task_planner = LLMTaskPlanner(self.llm_interface, self.db_interface)
             self.filter_summary = LLMFilterSummary(self.llm_interface, self.db_interface)
+            # 将规划与摘要的流式输出实时转发到日志，首个token到达即可在界面上看到
+            for entity in (self.strategy_planner, self.task_planner, self.filter_summary):
+                entity.stream_listener = self.logger
             self.logger.add_log("Initialization", "✅ All LLM entities initialization completed", "success")
             
             # 1.5: 初始化工具注册表
@@ -193,15 +254,17 @@ class AsyncWorkflowManager:
             if not self._check_stop_and_log("Task Planner", "7: task_planner generating sub-goals and execution commands..."):
                 return False
             
-            self.mcp = self.task_planner.process(self.mcp, self.strategies)
+            # 规划结果流式解析，每个命令一生成就交给执行器，规划与执行重叠进行
+            mcp = self.mcp
+            self.mcp = self.task_planner.process(mcp, self.strategies, on_command=lambda cmd: self.executor.submit(mcp, cmd, self.working_memory))
 
             self.logger.add_log("Task Planner", f"✅ Sub-goals and execution commands generation completed ({len(self.mcp.sub_goals)} sub-goals, {len(self.mcp.executable_commands)} commands)", "success")
             
             # ==================== 第8条：执行命令 ====================
-            if not self._check_stop_and_log("Execution", "8: executing commands..."):
+            if not self._check_stop_and_log("Execution", "8: waiting for commands started during planning..."):
                 return False
             
-            is_executed = self.executor.execute(self.mcp, self.working_memory)
+            is_executed = self.executor.collect(self.working_memory)
             if not is_executed:
                 self.logger.add_log("Execution", "❌ Command execution failed", "error")
                 return False
@@ -210,6 +273,22 @@ class AsyncWorkflowManager:
             self.logger.add_log("Execution", f"Command execution result: {self.working_memory.data}", "info")
             
             # ==================== 第9条：总结 ====================
+            if self.llm_cache is not None:
+                self.logger.add_log("Summary", f"LLM cache stats: {self.llm_cache.stats()}", "info", data=self.llm_cache.stats())
+            if isinstance(self.llm_interface, SingleFlightLLMAPIInterface):
+                coalesce_stats = self.llm_interface.stats()
+                self.logger.add_log("Summary", f"LLM request coalescing stats: {coalesce_stats}", "info", data=coalesce_stats)
+            llm_concurrency = concurrency_stats()
+            self.logger.add_log("Summary", f"LLM adaptive concurrency stats: {llm_concurrency}", "info", data=llm_concurrency)
+            if self.llm_hedging is not None:
+                hedging_stats = self.llm_hedging.stats()
+                self.logger.add_log("Summary", f"LLM hedging stats: {hedging_stats}", "info", data=hedging_stats)
+            routing_stats = get_model_router().stats()
+            self.logger.add_log("Summary", f"LLM model routing: {routing_stats}", "info", data=routing_stats)
+            breaker_stats = circuit_breaker_stats()
+            self.logger.add_log("Summary", f"LLM circuit breaker stats: {breaker_stats}", "info", data=breaker_stats)
+            fetch_stats = get_page_fetcher().rate_limiter.stats()
+            self.logger.add_log("Summary", f"Web fetch rate limiter stats: {fetch_stats}", "info", data=fetch_stats)
             self.logger.add_log("MCP", f"✅ Final MCP: {self.mcp}", "info")
             self.logger.add_log("Summary", "✅ Workflow execution completed", "success")
             return True
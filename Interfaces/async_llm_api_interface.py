@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines asyncio-native interfaces for interacting with Large Language Model (LLM) APIs.
+They mirror the providers in llm_api_interface.py but use the async SDK clients, so many in-flight
+requests can share one event loop instead of occupying one OS thread each.
+A sync adapter is provided so that existing entities, which call the blocking get_completion, keep working.
+"""
+import os
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List
+from openai import AsyncOpenAI
+import google.generativeai as genai
+from dotenv import load_dotenv
+from anthropic import AsyncAnthropic
+
+from Interfaces.llm_api_interface import (
+    LLMAPIInterface, LLMError, CompletionResult, RetryPolicy, google_generation_config, openai_messages, anthropic_system,
+    gemini_context_cache, classify_error, default_retry_policy, get_circuit_breaker
+)
+from Interfaces.llm_concurrency import get_concurrency_limiter
+
+class AsyncLLMAPIInterface(ABC):
+    """
+    An abstract base class that defines standards for interacting with any LLM API asynchronously.
+    All specific async LLM API implementations should inherit from this class and implement its methods.
+    """
+    provider: str = ""
+    model_env_var: str = None
+    default_model: str = None
+    # 为 None 时使用 default_retry_policy()
+    retry_policy: RetryPolicy = None
+
+    def _resolve_model(self, model: str) -> str:
+        """
+        显式传入的模型 (例如模型路由的结果) 优先，其次是环境变量中的部署默认模型，都没有时使用实现声明的 default_model。
+        """
+        env_model = os.getenv(self.model_env_var) if self.model_env_var else None
+        return model or env_model or self.default_model
+
+    @abstractmethod
+    async def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        """
+        Get text completion from LLM without blocking the event loop.
+
+        Args:
+            prompt (str): Prompt sent to LLM.
+            model (str, optional): Specify the model to use. Defaults to None.
+            **kwargs: Other API-specific parameters (e.g., temperature, max_tokens).
+
+        Returns:
+            str: Text response generated by LLM.
+
+        Raises:
+            LLMError: The provider call failed (after retries for transient errors), or the circuit is open.
+        """
+        pass
+
+    async def _acall_with_retry(self, call: Callable[[], Awaitable[str]]) -> str:
+        """
+        与 LLMAPIInterface._call_with_retry 相同的重试与熔断逻辑，退避时不阻塞事件循环。
+        """
+        policy = self.retry_policy or default_retry_policy()
+        breaker = get_circuit_breaker(self.provider)
+        for attempt in range(policy.max_attempts):
+            breaker.before_call()
+            try:
+                result = await call()
+            except Exception as e:
+                error = classify_error(self.provider, e)
+                breaker.record_failure(error)
+                if not policy.should_retry(error, attempt) or breaker.state == "open":
+                    raise error from e
+                await self._wait_before_retry(policy, attempt, error)
+                continue
+            breaker.record_success()
+            return result
+
+    async def _astream_with_retry(self, stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        _acall_with_retry 的流式版本。已经产出文本后出错不再重试，直接抛出。
+        """
+        policy = self.retry_policy or default_retry_policy()
+        breaker = get_circuit_breaker(self.provider)
+        for attempt in range(policy.max_attempts):
+            breaker.before_call()
+            started = False
+            try:
+                async for delta in stream():
+                    started = True
+                    yield delta
+            except Exception as e:
+                error = classify_error(self.provider, e)
+                breaker.record_failure(error)
+                if started or not policy.should_retry(error, attempt) or breaker.state == "open":
+                    raise error from e
+                await self._wait_before_retry(policy, attempt, error)
+                continue
+            breaker.record_success()
+            return
+
+    async def _wait_before_retry(self, policy: RetryPolicy, attempt: int, error: LLMError) -> None:
+        delay = policy.delay(attempt, error)
+        print(f"{error} -- retrying in {delay:.1f}s (attempt {attempt + 2}/{policy.max_attempts})")
+        await asyncio.sleep(delay)
+
+    async def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Get text completion from LLM as an async stream of text deltas.
+        The default implementation yields the whole completion at once.
+        """
+        if model is not None:
+            kwargs['model'] = model
+        response = await self.get_completion(prompt, **kwargs)
+        if response:
+            yield response
+
+class AsyncOpenAIInterface(AsyncLLMAPIInterface):
+    """
+    使用 AsyncOpenAI 客户端与 OpenAI API 交互的异步实现。
+    """
+    provider = "openai"
+    model_env_var = "OPENAI_MODEL"
+    default_model = "gpt-4o-mini"
+
+    def __init__(self):
+        """
+        初始化OpenAI异步接口，从环境变量获取API密钥和可选的Base URL
+        """
+        load_dotenv()
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is required")
+
+        base_url = os.getenv('OPENAI_BASE_URL') # 可选，用于代理或非官方端点
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+
+    async def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        """
+        使用 OpenAI API 异步获取文本补全。
+        """
+        model = self._resolve_model(model)
+        system = kwargs.pop('system', None)
+
+        async def call():
+            async with get_concurrency_limiter(self.provider).async_slot():
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=openai_messages(prompt, system),
+                    **kwargs
+                )
+                return response.choices[0].message.content
+
+        return await self._acall_with_retry(call)
+
+    async def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> AsyncIterator[str]:
+        """
+        使用 OpenAI API 异步流式获取文本补全。
+        """
+        model = self._resolve_model(model)
+        system = kwargs.pop('system', None)
+
+        async def stream():
+            async with get_concurrency_limiter(self.provider).async_slot(track_latency=False):
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=openai_messages(prompt, system),
+                    stream=True,
+                    **kwargs
+                )
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+        async for delta in self._astream_with_retry(stream):
+            yield delta
+
+class AsyncGoogleCloudInterface(AsyncLLMAPIInterface):
+    """
+    使用 generate_content_async 与 Google AI (Gemini) API 交互的异步实现。
+    """
+    provider = "google"
+    model_env_var = "GOOGLE_MODEL"
+    default_model = "gemini-1.5-flash"
+
+    def __init__(self):
+        """
+        初始化Google AI异步接口，从环境变量获取API密钥
+        """
+        load_dotenv()
+        api_key = os.getenv('GOOGLE_CLOUD_API_KEY')
+        if not api_key:
+            raise ValueError("GOOGLE_CLOUD_API_KEY environment variable is required")
+        genai.configure(api_key=api_key)
+
+    async def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        """
+        使用 Google AI API 异步获取文本补全。
+        """
+        model = self._resolve_model(model)
+        system = kwargs.pop('system', None)
+
+        async def call():
+            async with get_concurrency_limiter(self.provider).async_slot():
+                # 首次创建 CachedContent 是阻塞的网络调用，放到线程中执行
+                model_instance = await asyncio.to_thread(gemini_context_cache.model_for, model, system)
+                response = await model_instance.generate_content_async(
+                    prompt,
+                    generation_config=google_generation_config(kwargs)
+                )
+                return response.text
+
+        return await self._acall_with_retry(call)
+
+    async def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> AsyncIterator[str]:
+        """
+        使用 Google AI API 异步流式获取文本补全。
+        """
+        model = self._resolve_model(model)
+        system = kwargs.pop('system', None)
+
+        async def stream():
+            async with get_concurrency_limiter(self.provider).async_slot(track_latency=False):
+                # 首次创建 CachedContent 是阻塞的网络调用，放到线程中执行
+                model_instance = await asyncio.to_thread(gemini_context_cache.model_for, model, system)
+                response = await model_instance.generate_content_async(
+                    prompt,
+                    generation_config=google_generation_config(kwargs),
+                    stream=True
+                )
+                async for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
+
+        async for delta in self._astream_with_retry(stream):
+            yield delta
+
+class AsyncAnthropicInterface(AsyncLLMAPIInterface):
+    """
+    使用 AsyncAnthropic 客户端与 Anthropic API 交互的异步实现。
+    """
+    provider = "anthropic"
+    model_env_var = "ANTHROPIC_MODEL"
+    default_model = "claude-3-5-sonnet-20240620"
+
+    def __init__(self):
+        """
+        初始化Anthropic异步接口，从环境变量获取API密钥
+        """
+        load_dotenv()
+        api_key = os.getenv('ANTHROPIC_API_KEY')
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable is required")
+        base_url = os.getenv('ANTHROPIC_BASE_URL')
+        self.client = AsyncAnthropic(api_key=api_key, base_url=base_url)
+
+    async def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        """
+        使用 Anthropic API 异步获取文本补全。
+        """
+        model = self._resolve_model(model)
+        system = anthropic_system(kwargs.pop('system', None))
+        if system:
+            kwargs['system'] = system
+
+        async def call():
+            async with get_concurrency_limiter(self.provider).async_slot():
+                response = await self.client.messages.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **kwargs
+                )
+                return response.content[0].text
+
+        return await self._acall_with_retry(call)
+
+    async def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> AsyncIterator[str]:
+        """
+        使用 Anthropic API 异步流式获取文本补全。
+        """
+        model = self._resolve_model(model)
+        system = anthropic_system(kwargs.pop('system', None))
+        if system:
+            kwargs['system'] = system
+
+        async def stream():
+            async with get_concurrency_limiter(self.provider).async_slot(track_latency=False):
+                async with self.client.messages.stream(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **kwargs
+                ) as stream:
+                    async for text in stream.text_stream:
+                        yield text
+
+        async for delta in self._astream_with_retry(stream):
+            yield delta
+
+class _BackgroundEventLoop:
+    """
+    在守护线程中运行的进程级事件循环。
+    所有 SyncLLMAdapter 共享这一个循环，异步客户端的连接池因此始终绑定在同一个循环上。
+    """
+    _lock = threading.Lock()
+    _loop: asyncio.AbstractEventLoop = None
+
+    @classmethod
+    def get_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._lock:
+            if cls._loop is None or cls._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True)
+                thread.start()
+                cls._loop = loop
+            return cls._loop
+
+class SyncLLMAdapter(LLMAPIInterface):
+    """
+    将 AsyncLLMAPIInterface 适配为阻塞的 LLMAPIInterface。
+    调用线程只负责等待结果，真正的请求都在共享的后台事件循环中并发执行，
+    因此现有实体无需修改即可使用异步接口。
+    """
+    def __init__(self, async_interface: AsyncLLMAPIInterface):
+        self.async_interface = async_interface
+        self.provider = async_interface.provider
+        self.model_env_var = async_interface.model_env_var
+        self.default_model = async_interface.default_model
+        self._loop = _BackgroundEventLoop.get_loop()
+
+    def run(self, coroutine):
+        """
+        在后台事件循环中执行协程并阻塞等待其结果。
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        """
+        同步获取文本补全，model 为 None 时使用异步实现自身的默认模型。
+        """
+        return self.submit_completion(prompt, model, **kwargs).result()
+
+    def get_completions(self, prompts: List[str], model: str = None, max_concurrency: int = 8,
+                        on_result: Callable[[int, CompletionResult], None] = None, **kwargs) -> List[CompletionResult]:
+        """
+        批量补全：所有请求作为协程在后台事件循环中并发执行 (最多 max_concurrency 个同时进行)，不占用额外线程。
+        on_result 在每个请求结束时于事件循环线程中调用，应当只做轻量的工作 (例如设置 Future 的结果)。
+        """
+        if model is not None:
+            kwargs['model'] = model
+
+        async def run_all() -> List[CompletionResult]:
+            # 信号量必须在事件循环内创建
+            semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+            async def complete(index: int, prompt: str) -> CompletionResult:
+                async with semaphore:
+                    try:
+                        result = CompletionResult(await self.async_interface.get_completion(prompt, **kwargs))
+                    except Exception as e:
+                        result = CompletionResult(error=classify_error(self.provider, e))
+                if on_result is not None:
+                    on_result(index, result)
+                return result
+
+            return list(await asyncio.gather(*(complete(i, prompt) for i, prompt in enumerate(prompts))))
+
+        return self.run(run_all())
+
+    def submit_completion(self, prompt: str, model: str = None, **kwargs) -> concurrent.futures.Future:
+        """
+        提交一次补全请求并立即返回 Future。取消该 Future 会取消后台事件循环中的请求 (例如对冲请求中落败的一方)。
+        """
+        if model is not None:
+            kwargs['model'] = model
+        return asyncio.run_coroutine_threadsafe(self.async_interface.get_completion(prompt, **kwargs), self._loop)
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        """
+        同步迭代异步流：后台循环把文本增量放入线程安全队列，调用线程逐个取出。
+        调用方提前停止迭代 (close() / GeneratorExit) 时取消后台协程，立即关闭提供商的流并释放并发槽。
+        """
+        if model is not None:
+            kwargs['model'] = model
+        deltas: "queue.Queue[object]" = queue.Queue()
+        done = object()
+
+        async def pump():
+            stream = self.async_interface.get_completion_stream(prompt, **kwargs)
+            try:
+                async for delta in stream:
+                    deltas.put(delta)
+            except Exception as e:
+                # 把异常 (例如 LLMError) 交给调用线程重新抛出
+                deltas.put(e)
+            finally:
+                await stream.aclose()
+                deltas.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                delta = deltas.get()
+                if delta is done:
+                    return
+                if isinstance(delta, Exception):
+                    raise delta
+                yield delta
+        finally:
+            future.cancel()
+
+if __name__ == "__main__":
+    async def main():
+        llm_interface = AsyncOpenAIInterface()
+        prompts = [f"用一句话介绍数字 {i}" for i in range(5)]
+        results = await asyncio.gather(*(llm_interface.get_completion(p) for p in prompts))
+        for result in results:
+            print(result)
+
+    asyncio.run(main())
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+此文件定义了通用键值缓存的接口和具体实现。
+缓存值必须可以被 JSON 序列化，每个条目都带有 TTL，并且在总字节数超过上限时按最近最少使用的顺序淘汰。
+磁盘实现基于 SQLite 文件，多个工作进程可以共享同一个缓存文件；Redis 实现复用已有的 RedisClient。
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+from dotenv import load_dotenv
+
+from Interfaces.database_interface import RedisClient
+
+class CacheInterface(ABC):
+    """
+    一个抽象基类，定义了键值缓存的标准方法。
+    """
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """
+        读取缓存值，不存在或已过期时返回 None。
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入缓存值。ttl 为秒数，None 表示使用缓存的默认 TTL。
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        删除缓存值。
+        """
+        pass
+
+class DiskCache(CacheInterface):
+    """
+    基于 SQLite 文件的磁盘缓存。
+    同一个文件可以被多个进程同时打开，由 SQLite 的文件锁保证一致性。
+    """
+    def __init__(self, path: str, default_ttl: Optional[float] = None, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # INSERT OR REPLACE 删除旧行时只有开启递归触发器才会触发 DELETE 触发器
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+            # 总字节数由触发器维护，所有共享该文件的进程看到同一个计数，淘汰时无需对整表求和
+            self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute(
+                "INSERT OR IGNORE INTO stats (name, value) SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM entries"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_size_insert AFTER INSERT ON entries BEGIN "
+                "UPDATE stats SET value = value + new.size WHERE name = 'total_bytes'; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_size_delete AFTER DELETE ON entries BEGIN "
+                "UPDATE stats SET value = value - old.size WHERE name = 'total_bytes'; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_size_update AFTER UPDATE OF size ON entries BEGIN "
+                "UPDATE stats SET value = value - old.size + new.size WHERE name = 'total_bytes'; END"
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, expires_at, now)
+            )
+            self._evict(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, now: float) -> None:
+        """
+        先清理已过期条目，再按最近访问时间淘汰，直到总字节数不超过上限。
+        """
+        self._conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        total = self._conn.execute("SELECT value FROM stats WHERE name = 'total_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+# 写入条目并更新记账信息 (大小哈希、LRU 有序集合、字节计数器)，在 Redis 中原子执行，并发写入不会使总字节数失真。
+# KEYS: 值, 大小哈希, LRU, 字节计数器；ARGV: 缓存键, 值, 大小, 过期毫秒数 (0 表示不过期), 访问时间。返回新的总字节数
+_REDIS_SET_SCRIPT = """
+local old = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+if tonumber(ARGV[4]) > 0 then
+    redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[4])
+else
+    redis.call('SET', KEYS[1], ARGV[2])
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[5], ARGV[1])
+return redis.call('INCRBY', KEYS[4], tonumber(ARGV[3]) - old)
+"""
+
+# 删除条目及其记账信息并返回释放的字节数，同样原子执行。
+# ARGV: 缓存键, 是否从 LRU 中移除 ("1"/"0"), 是否只在值已不存在 (已过期) 时删除 ("1"/"0")
+_REDIS_FORGET_SCRIPT = """
+if ARGV[3] == '1' and redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local size = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+redis.call('DEL', KEYS[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+if ARGV[2] == '1' then
+    redis.call('ZREM', KEYS[3], ARGV[1])
+end
+if size > 0 then
+    redis.call('DECRBY', KEYS[4], size)
+end
+return size
+"""
+
+class RedisCache(CacheInterface):
+    """
+    基于 Redis 的缓存，适合多台机器共享。
+    条目使用 Redis 原生过期，另外维护一个按访问时间排序的有序集合和字节计数器用于容量淘汰。
+    写入与删除通过 Lua 脚本原子地更新记账信息。
+    """
+    def __init__(self, db_interface: RedisClient, namespace: str, default_ttl: Optional[float] = None, max_bytes: int = 256 * 1024 * 1024):
+        self.db_interface = db_interface
+        self.prefix = f"cache:{namespace}:"
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._lru_key = f"{self.prefix}__lru"
+        self._sizes_key = f"{self.prefix}__sizes"
+        self._bytes_key = f"{self.prefix}__bytes"
+        self._scripts = {}
+
+    @property
+    def client(self):
+        if not self.db_interface.client:
+            raise ConnectionError("Database is not connected. Call connect() first.")
+        return self.db_interface.client
+
+    def _script(self, source: str):
+        """
+        返回绑定到当前连接的 Lua 脚本 (按 SHA 调用，首次调用时自动加载)。重新连接后重新注册。
+        """
+        client = self.client
+        script = self._scripts.get(source)
+        if script is None or script.registered_client is not client:
+            script = self._scripts[source] = client.register_script(source)
+        return script
+
+    def _bookkeeping_keys(self, key: str) -> list:
+        return [self.prefix + key, self._sizes_key, self._lru_key, self._bytes_key]
+
+    def get(self, key: str) -> Optional[Any]:
+        # 值和记账信息在一次往返中读取：值不存在但仍有记账信息，说明条目已由 Redis 过期，此时才需要清理
+        pipe = self.client.pipeline()
+        pipe.get(self.prefix + key)
+        pipe.hget(self._sizes_key, key)
+        value, size = pipe.execute()
+        if value is None:
+            if size is not None:
+                # 只在值仍不存在时清理，避免删除其他客户端在此期间写入的新值
+                self._forget(key, only_if_expired=True)
+            return None
+        self.client.zadd(self._lru_key, {key: time.time()})
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        # 以毫秒为单位过期，不足一秒的 TTL 不会被截断为 0 (Redis 拒绝 0 秒的过期时间)
+        expire_ms = max(int(ttl * 1000), 1) if ttl else 0
+        total = int(self._script(_REDIS_SET_SCRIPT)(
+            keys=self._bookkeeping_keys(key), args=[key, payload, size, expire_ms, time.time()]
+        ))
+        while total > self.max_bytes:
+            oldest = self.client.zpopmin(self._lru_key)
+            if not oldest:
+                break
+            total -= self._forget(oldest[0][0], in_lru=False)
+
+    def delete(self, key: str) -> None:
+        self._forget(key)
+
+    def _forget(self, key: str, in_lru: bool = True, only_if_expired: bool = False) -> int:
+        """
+        删除条目及其记账信息，返回释放的字节数。only_if_expired 时值仍然存在则什么也不做。
+        """
+        return int(self._script(_REDIS_FORGET_SCRIPT)(
+            keys=self._bookkeeping_keys(key), args=[key, int(in_lru), int(only_if_expired)]
+        ))
+
+def create_cache(namespace: str, default_ttl: Optional[float] = None, max_bytes: int = 256 * 1024 * 1024,
+                 db_interface: RedisClient = None) -> CacheInterface:
+    """
+    根据环境变量 CACHE_BACKEND (disk | redis) 创建缓存。
+    磁盘缓存存放在 CACHE_DIR (默认 .cache) 下，以 namespace 命名。
+    """
+    load_dotenv()
+    backend = os.getenv('CACHE_BACKEND', 'disk').lower()
+    if backend == 'redis':
+        return RedisCache(db_interface or RedisClient(), namespace, default_ttl, max_bytes)
+    cache_dir = os.getenv('CACHE_DIR', '.cache')
+    return DiskCache(os.path.join(cache_dir, f"{namespace}.sqlite3"), default_ttl, max_bytes)
@@ -2,19 +2,244 @@
 """
 This file defines interfaces for interacting with Large Language Model (LLM) APIs.
 It provides an abstract base class for unifying the calling methods of different LLM providers (such as OpenAI, Google Cloud).
+Provider failures are raised as typed LLMError subclasses instead of being turned into an empty string. Transient
+failures (rate limits, overload, 5xx, timeouts) are retried by a shared RetryPolicy with jittered exponential backoff,
+and a per-provider CircuitBreaker fails fast while a provider keeps failing.
 """
 import os
+import time
+import random
+import hashlib
+import datetime
+import threading
+import contextvars
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from openai import OpenAI
 import google.generativeai as genai
 from dotenv import load_dotenv
 from anthropic import Anthropic
 
+from Interfaces.llm_concurrency import get_concurrency_limiter, error_status, is_overload_error, retry_after_seconds
+
+class LLMError(Exception):
+    """
+    LLM 调用失败。retryable 表示换个时间重试可能成功 (限流、过载、超时等)。
+    """
+    retryable = False
+
+    def __init__(self, message: str, provider: str = "", status_code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class LLMRateLimitError(LLMError):
+    """提供商限流 (429) 或过载 (529 / 503)。"""
+    retryable = True
+
+class LLMServerError(LLMError):
+    """提供商内部错误 (5xx)。"""
+    retryable = True
+
+class LLMConnectionError(LLMError):
+    """连接失败或请求超时。"""
+    retryable = True
+
+class LLMRequestError(LLMError):
+    """请求本身有误 (参数、鉴权、内容被拦截等)，重试不会成功。"""
+
+class LLMCircuitOpenError(LLMError):
+    """熔断器处于打开状态，请求未被发送。"""
+
+def classify_error(provider: str, error: BaseException) -> LLMError:
+    """
+    把 SDK 抛出的异常转换为对应的 LLMError 子类。
+    """
+    if isinstance(error, LLMError):
+        return error
+    status = error_status(error)
+    message = f"{provider} API error: {type(error).__name__}: {error}"
+    if is_overload_error(error):
+        return LLMRateLimitError(message, provider, status, retry_after_seconds(error))
+    if status is not None and status >= 500:
+        return LLMServerError(message, provider, status, retry_after_seconds(error))
+    name = type(error).__name__
+    if status is None and any(word in name for word in ("Timeout", "Connection", "DeadlineExceeded")):
+        return LLMConnectionError(message, provider)
+    return LLMRequestError(message, provider, status)
+
+class RetryPolicy:
+    """
+    对可重试错误使用带完全抖动 (full jitter) 的指数退避：第 n 次重试前等待 uniform(0, min(max_delay, base_delay * 2^n)) 秒，
+    服务器给出重试提示时至少等待该时间。rng 可以注入确定性的随机数生成器 (测试用)。
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 rng: random.Random = None):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = rng or random
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=int(os.getenv('LLM_RETRY_ATTEMPTS', '3')),
+            base_delay=float(os.getenv('LLM_RETRY_BASE_DELAY', '1')),
+            max_delay=float(os.getenv('LLM_RETRY_MAX_DELAY', '30'))
+        )
+
+    def should_retry(self, error: LLMError, attempt: int) -> bool:
+        return error.retryable and attempt < self.max_attempts - 1
+
+    def delay(self, attempt: int, error: LLMError = None) -> float:
+        delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if error is not None and error.retry_after:
+            delay = max(delay, min(error.retry_after, self.max_delay))
+        return delay
+
+class CircuitBreaker:
+    """
+    单个提供商的熔断器。
+    连续 failure_threshold 次可重试错误 (提供商故障) 后打开，打开期间的请求直接抛出 LLMCircuitOpenError；
+    reset_timeout 秒后进入半开状态，只放行一个试探请求，其余请求在试探结束前依然被拒绝；
+    试探成功则关闭，再次失败则重新打开。请求本身有误不计入失败 (但会结束试探)。
+    试探请求超过 reset_timeout 仍未报告结果 (例如流被调用方放弃) 时，允许发出新的试探。
+    clock 为单调时钟，可以注入以便测试。
+    """
+    def __init__(self, provider: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self._clock() - self._opened_at >= self.reset_timeout else "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            now = self._clock()
+            if state == "half_open":
+                if not self._probe_in_flight or now - self._probe_started_at >= self.reset_timeout:
+                    self._probe_in_flight = True
+                    self._probe_started_at = now
+                    self._stats["probes"] += 1
+                    return
+                remaining = self.reset_timeout - (now - self._probe_started_at)
+            else:
+                remaining = self.reset_timeout - (now - self._opened_at)
+            self._stats["rejected"] += 1
+        raise LLMCircuitOpenError(f"{self.provider} circuit is {state}, failing fast", self.provider, retry_after=remaining)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self, error: LLMError) -> None:
+        if not error.retryable:
+            with self._lock:
+                self._probe_in_flight = False
+            return
+        with self._lock:
+            self._probe_in_flight = False
+            half_open = self._state() == "half_open"
+            self._failures += 1
+            if half_open or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = self._clock()
+                self._stats["opened"] += 1
+                print(f"CircuitBreaker: {self.provider} circuit opened after {self._failures} consecutive failures")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self._state()
+            stats["consecutive_failures"] = self._failures
+        return stats
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_default_retry_policy: Optional[RetryPolicy] = None
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """
+    返回该提供商的进程级熔断器，参数来自 LLM_BREAKER_THRESHOLD / LLM_BREAKER_RESET。
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider,
+                failure_threshold=int(os.getenv('LLM_BREAKER_THRESHOLD', '5')),
+                reset_timeout=float(os.getenv('LLM_BREAKER_RESET', '30'))
+            )
+            _breakers[provider] = breaker
+        return breaker
+
+def default_retry_policy() -> RetryPolicy:
+    """
+    进程级默认重试策略 (首次使用时读取环境变量，此时 .env 已由接口加载)。
+    """
+    global _default_retry_policy
+    if _default_retry_policy is None:
+        _default_retry_policy = RetryPolicy.from_env()
+    return _default_retry_policy
+
+def circuit_breaker_stats() -> Dict[str, Dict[str, object]]:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {provider: breaker.stats() for provider, breaker in breakers.items()}
+
+@dataclass
+class CompletionResult:
+    """
+    批量补全中单个 prompt 的结果：成功时 text 为响应文本，失败时 error 为对应的 LLMError。
+    """
+    text: str = ""
+    error: Optional[LLMError] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 class LLMAPIInterface(ABC):
     """
     An abstract base class that defines standards for interacting with any LLM API.
     All specific LLM API implementations should inherit from this class and implement its methods.
     """
+    # 提供商名称与模型覆盖所用的环境变量，由具体实现声明
+    provider: str = ""
+    model_env_var: str = None
+    default_model: str = None
+    # 为 None 时使用 default_retry_policy()
+    retry_policy: RetryPolicy = None
+
+    def _resolve_model(self, model: str) -> str:
+        """
+        显式传入的模型 (例如模型路由的结果) 优先，其次是环境变量中的部署默认模型，都没有时使用实现声明的 default_model。
+        """
+        env_model = os.getenv(self.model_env_var) if self.model_env_var else None
+        return model or env_model or self.default_model
 
     @abstractmethod
     def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
@@ -25,16 +250,208 @@ class LLMAPIInterface(ABC):
             prompt (str): Prompt sent to LLM.
             model (str, optional): Specify the model to use. Defaults to None.
             **kwargs: Other API-specific parameters (e.g., temperature, max_tokens).
+                      system (str, optional): Static instructions sent separately from the prompt, so that the
+                      provider's prefix cache can reuse them across calls (see openai_messages / anthropic_system /
+                      GeminiContextCache).
 
         Returns:
             str: Text response generated by LLM.
+
+        Raises:
+            LLMError: The provider call failed (after retries for transient errors), or the circuit is open.
         """
         pass
 
+    def _call_with_retry(self, call: Callable[[], str]) -> str:
+        """
+        经过熔断器执行一次提供商调用，可重试的错误按重试策略退避后重试。
+        失败时抛出 LLMError 子类。
+        """
+        policy = self.retry_policy or default_retry_policy()
+        breaker = get_circuit_breaker(self.provider)
+        for attempt in range(policy.max_attempts):
+            breaker.before_call()
+            try:
+                result = call()
+            except Exception as e:
+                error = classify_error(self.provider, e)
+                breaker.record_failure(error)
+                if not policy.should_retry(error, attempt) or breaker.state == "open":
+                    raise error from e
+                self._wait_before_retry(policy, attempt, error)
+                continue
+            breaker.record_success()
+            return result
+
+    def _stream_with_retry(self, stream: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        _call_with_retry 的流式版本。已经产出文本后出错不再重试 (调用方已看到部分结果)，直接抛出。
+        """
+        policy = self.retry_policy or default_retry_policy()
+        breaker = get_circuit_breaker(self.provider)
+        for attempt in range(policy.max_attempts):
+            breaker.before_call()
+            started = False
+            try:
+                for delta in stream():
+                    started = True
+                    yield delta
+            except Exception as e:
+                error = classify_error(self.provider, e)
+                breaker.record_failure(error)
+                if started or not policy.should_retry(error, attempt) or breaker.state == "open":
+                    raise error from e
+                self._wait_before_retry(policy, attempt, error)
+                continue
+            breaker.record_success()
+            return
+
+    def _wait_before_retry(self, policy: RetryPolicy, attempt: int, error: LLMError) -> None:
+        delay = policy.delay(attempt, error)
+        print(f"{error} -- retrying in {delay:.1f}s (attempt {attempt + 2}/{policy.max_attempts})")
+        time.sleep(delay)
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        """
+        Get text completion from LLM as a stream of text deltas.
+        The default implementation yields the whole completion at once; providers with native
+        streaming support override it so that callers see the first tokens as soon as they arrive.
+
+        Args:
+            prompt (str): Prompt sent to LLM.
+            model (str, optional): Specify the model to use. Defaults to None.
+            **kwargs: Other API-specific parameters (e.g., temperature, max_tokens).
+
+        Yields:
+            str: Text deltas in generation order.
+        """
+        if model is not None:
+            kwargs['model'] = model
+        response = self.get_completion(prompt, **kwargs)
+        if response:
+            yield response
+
+    def get_completions(self, prompts: List[str], model: str = None, max_concurrency: int = 8,
+                        on_result: Callable[[int, CompletionResult], None] = None, **kwargs) -> List[CompletionResult]:
+        """
+        Get text completions for many independent prompts with the same parameters.
+        The default implementation fans out get_completion with at most max_concurrency calls in flight;
+        providers with native batching or an event loop may override it.
+
+        Args:
+            prompts (List[str]): Prompts sent to LLM.
+            model (str, optional): Specify the model to use. Defaults to None.
+            max_concurrency (int, optional): Maximum number of concurrent requests.
+            on_result (callable, optional): Called with (index, result) as soon as each prompt finishes, so callers
+                can use early results without waiting for the whole batch. May be called from worker threads.
+            **kwargs: Other API-specific parameters, shared by all prompts.
+
+        Returns:
+            List[CompletionResult]: One result per prompt, in the same order. A failed prompt carries its
+            LLMError instead of raising, so one failure does not discard the other results.
+        """
+        if model is not None:
+            kwargs['model'] = model
+
+        def complete(index: int, prompt: str) -> CompletionResult:
+            try:
+                result = CompletionResult(self.get_completion(prompt, **kwargs))
+            except Exception as e:
+                result = CompletionResult(error=classify_error(self.provider, e))
+            if on_result is not None:
+                on_result(index, result)
+            return result
+
+        if len(prompts) <= 1 or max_concurrency <= 1:
+            return [complete(i, prompt) for i, prompt in enumerate(prompts)]
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(prompts)), thread_name_prefix="llm-batch") as pool:
+            # 每个请求在调用方上下文的副本中执行，使上下文中的调用设置 (例如 hedging()) 同样作用于批量请求
+            futures = [pool.submit(contextvars.copy_context().run, complete, i, prompt) for i, prompt in enumerate(prompts)]
+            return [future.result() for future in futures]
+
+def openai_messages(prompt: str, system: str = None) -> List[dict]:
+    """
+    静态指令作为 system 消息放在最前面：OpenAI 会自动缓存超过 1024 token 的相同前缀。
+    """
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+def anthropic_system(system: str = None) -> Optional[List[dict]]:
+    """
+    把静态指令包装为带 cache_control 的 system 块，Anthropic 会缓存到该块为止的前缀。
+    没有静态指令时返回 None。
+    """
+    if not system:
+        return None
+    return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+
+class GeminiContextCache:
+    """
+    为 Gemini 的静态指令创建并复用 CachedContent。
+    显式缓存有最小长度要求 (GOOGLE_CONTEXT_CACHE_MIN_TOKENS)，较短的指令只作为 system_instruction 发送；
+    创建失败 (例如模型不支持缓存) 时同样退回 system_instruction，并且不再重试。
+    """
+    def __init__(self, min_tokens: int = None, ttl: int = None):
+        self.min_tokens = min_tokens or int(os.getenv('GOOGLE_CONTEXT_CACHE_MIN_TOKENS', '32768'))
+        self.ttl = ttl or int(os.getenv('GOOGLE_CONTEXT_CACHE_TTL', '3600'))
+        self._entries: Dict[Tuple[str, str], Tuple[Optional[object], float]] = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, model: str, system: str = None) -> "genai.GenerativeModel":
+        """
+        返回用于本次调用的 GenerativeModel 实例。
+        """
+        if not system:
+            return genai.GenerativeModel(model_name=model)
+        # 粗略估算 token 数 (约每 4 个字符一个 token)，避免每次调用都请求 count_tokens
+        if len(system) // 4 < self.min_tokens:
+            return genai.GenerativeModel(model_name=model, system_instruction=system)
+
+        key = (model, hashlib.sha256(system.encode('utf-8')).hexdigest())
+        with self._lock:
+            cached, expires_at = self._entries.get(key, (None, 0.0))
+            if key not in self._entries or (cached is not None and expires_at <= time.time()):
+                cached = self._create(model, system)
+                # 提前一分钟视为过期，避免使用即将失效的缓存
+                self._entries[key] = (cached, time.time() + self.ttl - 60)
+        if cached is None:
+            return genai.GenerativeModel(model_name=model, system_instruction=system)
+        return genai.GenerativeModel.from_cached_content(cached_content=cached)
+
+    def _create(self, model: str, system: str):
+        try:
+            return genai.caching.CachedContent.create(
+                model=model if model.startswith("models/") else f"models/{model}",
+                system_instruction=system,
+                ttl=datetime.timedelta(seconds=self.ttl)
+            )
+        except Exception as e:
+            print(f"Gemini context cache unavailable for {model}, sending instructions uncached: {e}")
+            return None
+
+gemini_context_cache = GeminiContextCache()
+
+def google_generation_config(kwargs: dict) -> dict:
+    """
+    适配kwargs以符合google-generativeai的generation_config。
+    没有可用参数时返回 None。
+    """
+    generation_config = {}
+    if 'temperature' in kwargs:
+        generation_config['temperature'] = kwargs['temperature']
+    if 'max_tokens' in kwargs:
+        generation_config['max_output_tokens'] = kwargs['max_tokens']
+    return generation_config if generation_config else None
+
 class OpenAIInterface(LLMAPIInterface):
     """
     与 OpenAI API 交互的具体实现。
     """
+    provider = "openai"
+    model_env_var = "OPENAI_MODEL"
+    default_model = "gpt-4o-mini"
+
     def __init__(self):
         """
         初始化OpenAI接口，从环境变量获取API密钥和可选的Base URL
@@ -48,7 +465,7 @@ class OpenAIInterface(LLMAPIInterface):
         self.client = OpenAI(api_key=api_key, base_url=base_url)
 
     
-    def get_completion(self, prompt: str, model: str = "gpt-4o-mini", **kwargs) -> str:
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
         """
         使用 OpenAI API 获取文本补全。
 
@@ -60,27 +477,50 @@ class OpenAIInterface(LLMAPIInterface):
         Returns:
             str: LLM 生成的文本响应。
         """
-        # 优先使用环境变量中的模型，如果没有则使用传入的默认值
-        env_model = os.getenv('OPENAI_MODEL')
-        if env_model:
-            model = env_model
+        model = self._resolve_model(model)
+        system = kwargs.pop('system', None)
         
-        try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                **kwargs
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"An error occurred with OpenAI API: {e}")
-            return ""
+        def call():
+            with get_concurrency_limiter(self.provider).slot():
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=openai_messages(prompt, system),
+                    **kwargs
+                )
+                return response.choices[0].message.content
+
+        return self._call_with_retry(call)
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        """
+        使用 OpenAI API 流式获取文本补全 (stream=True)，逐个产出文本增量。
+        """
+        model = self._resolve_model(model)
+        system = kwargs.pop('system', None)
+
+        def stream():
+            with get_concurrency_limiter(self.provider).slot(track_latency=False):
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=openai_messages(prompt, system),
+                    stream=True,
+                    **kwargs
+                )
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+        yield from self._stream_with_retry(stream)
 
 class GoogleCloudInterface(LLMAPIInterface):
     """
     与 Google AI (Gemini) API 交互的具体实现。
     注意：这使用 google-generativeai 库，它通过 API 密钥进行身份验证。
     """
+    provider = "google"
+    model_env_var = "GOOGLE_MODEL"
+    default_model = "gemini-1.5-flash"
+
     def __init__(self):
         """
         初始化Google AI接口，从环境变量获取API密钥
@@ -93,47 +533,62 @@ class GoogleCloudInterface(LLMAPIInterface):
         genai.configure(api_key=api_key)
 
     
-    def get_completion(self, prompt: str, model: str = "gemini-1.5-flash", **kwargs) -> str:
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
         """
         使用 Google AI API 获取文本补全。
 
         Args:
             prompt (str): 发送给 LLM 的提示。
-            model (str, optional): 指定要使用的模型。Defaults to "gemini-pro".
+            model (str, optional): 指定要使用的模型。Defaults to None (GOOGLE_MODEL 或 default_model).
             **kwargs: 其他API参数，例如 temperature, max_output_tokens,
                       封装在 'generation_config' 字典中。
 
         Returns:
             str: LLM 生成的文本响应。
         """
-        # 优先使用环境变量中的模型，如果没有则使用传入的默认值
-        env_model = os.getenv('GOOGLE_MODEL')
-        if env_model:
-            model = env_model
-            
-        try:
-            model_instance = genai.GenerativeModel(model_name=model)
-            
-            # 适配kwargs以符合google-generativeai的generation_config
-            generation_config = {}
-            if 'temperature' in kwargs:
-                generation_config['temperature'] = kwargs['temperature']
-            if 'max_tokens' in kwargs:
-                generation_config['max_output_tokens'] = kwargs['max_tokens']
+        model = self._resolve_model(model)
+        system = kwargs.pop('system', None)
             
-            response = model_instance.generate_content(
-                prompt,
-                generation_config=generation_config if generation_config else None
-            )
-            return response.text
-        except Exception as e:
-            print(f"An error occurred with Google AI API: {e}")
-            return ""
+        def call():
+            with get_concurrency_limiter(self.provider).slot():
+                model_instance = gemini_context_cache.model_for(model, system)
+                response = model_instance.generate_content(
+                    prompt,
+                    generation_config=google_generation_config(kwargs)
+                )
+                return response.text
+
+        return self._call_with_retry(call)
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        """
+        使用 Google AI API 流式获取文本补全 (stream=True)，逐个产出文本增量。
+        """
+        model = self._resolve_model(model)
+        system = kwargs.pop('system', None)
+
+        def stream():
+            with get_concurrency_limiter(self.provider).slot(track_latency=False):
+                model_instance = gemini_context_cache.model_for(model, system)
+                response = model_instance.generate_content(
+                    prompt,
+                    generation_config=google_generation_config(kwargs),
+                    stream=True
+                )
+                for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
+
+        yield from self._stream_with_retry(stream)
 
 class AnthropicInterface(LLMAPIInterface):
     """
     与 Anthropic API 交互的具体实现。
     """
+    provider = "anthropic"
+    model_env_var = "ANTHROPIC_MODEL"
+    default_model = "claude-3-5-sonnet-20240620"
+
     def __init__(self):
         """
         初始化Anthropic接口，从环境变量获取API密钥
@@ -145,25 +600,46 @@ class AnthropicInterface(LLMAPIInterface):
         base_url = os.getenv('ANTHROPIC_BASE_URL')
         self.client = Anthropic(api_key=api_key, base_url=base_url)
 
-    def get_completion(self, prompt: str, model: str = "claude-3-5-sonnet-20240620", **kwargs) -> str:
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
         """
         使用 Anthropic API 获取文本补全。
         """
-        # 优先使用环境变量中的模型，如果没有则使用传入的默认值
-        env_model = os.getenv('ANTHROPIC_MODEL')
-        if env_model:
-            model = env_model
+        model = self._resolve_model(model)
+        system = anthropic_system(kwargs.pop('system', None))
+        if system:
+            kwargs['system'] = system
             
-        try:
-            response = self.client.messages.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                **kwargs
-            )
-            return response.content[0].text
-        except Exception as e:
-            print(f"An error occurred with Anthropic API: {e}")
-            return ""
+        def call():
+            with get_concurrency_limiter(self.provider).slot():
+                response = self.client.messages.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **kwargs
+                )
+                return response.content[0].text
+
+        return self._call_with_retry(call)
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        """
+        使用 Anthropic API 流式获取文本补全 (messages.stream)，逐个产出文本增量。
+        """
+        model = self._resolve_model(model)
+        system = anthropic_system(kwargs.pop('system', None))
+        if system:
+            kwargs['system'] = system
+
+        def stream():
+            with get_concurrency_limiter(self.provider).slot(track_latency=False):
+                with self.client.messages.stream(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **kwargs
+                ) as stream:
+                    for text in stream.text_stream:
+                        yield text
+
+        yield from self._stream_with_retry(stream)
 
 # ==============================================================================
 # API 参数信息
@@ -181,6 +657,8 @@ OpenAI API (Chat Completions) - 主要参数
 - messages (list[dict], required):
   描述对话的消息列表。每个字典包含 'role' (e.g., "system", "user", "assistant")
   和 'content' (消息文本)。
+  get_completion(system=...) 传入的静态指令会作为第一条 system 消息发送；
+  前缀超过 1024 token 时 OpenAI 自动缓存，命中部分的输入费用和延迟都会降低。
 
 - temperature (float, optional, default=1.0):
   控制随机性的参数，介于 0.0 和 2.0 之间。较高的值（如 0.8）会使输出更随机，
@@ -224,6 +702,8 @@ Google AI (Gemini) API - 主要参数
 --------------------------------------------------------------------------------
 通过 GenerativeModel.generate_content(prompt, generation_config=...) 调用。
 generation_config 是一个包含以下参数的字典。
+get_completion(system=...) 传入的静态指令作为 system_instruction 发送，足够长时改用
+CachedContent (GenerativeModel.from_cached_content)，见 GeminiContextCache。
 
 - temperature (float, optional):
   控制随机性的参数，范围 [0.0, 1.0]。较高的值会产生更具创造性的输出，而较低的值会
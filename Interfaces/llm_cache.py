@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+此文件定义了 LLM 响应缓存层。
+CachedLLMAPIInterface 可以包装任意 LLMAPIInterface，对相同的 (provider, model, prompt, 参数) 请求直接返回缓存结果。
+缓存分为两级：进程内 LRU 以及可选的持久化缓存 (磁盘或 Redis，见 cache_interface.py)。
+"""
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Iterator, Optional
+
+from Interfaces.llm_api_interface import LLMAPIInterface
+from Interfaces.cache_interface import CacheInterface
+
+def make_request_key(provider: str, model: Optional[str], prompt: str, kwargs: dict) -> str:
+    """
+    为一次补全请求生成内容寻址的键。
+    kwargs 按键排序后序列化，数值型 temperature 统一为浮点数，保证等价请求得到相同的键。
+    """
+    normalized = dict(kwargs)
+    if normalized.get('temperature') is not None:
+        normalized['temperature'] = float(normalized['temperature'])
+    payload = json.dumps(
+        {"provider": provider, "model": model or "default", "prompt": prompt, "kwargs": normalized},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class _LRUTier:
+    """
+    线程安全的进程内 LRU，条目带过期时间。
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, tuple[str, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+class CachedLLMAPIInterface(LLMAPIInterface):
+    """
+    为任意 LLMAPIInterface 增加响应缓存。
+    单次调用可以传入 use_cache=False 跳过缓存 (例如 temperature 非零、希望得到新结果的请求)。
+    空响应表示调用失败，不会被缓存。
+    """
+    def __init__(self, llm_interface: LLMAPIInterface, persistent_cache: CacheInterface = None,
+                 memory_size: int = 512, ttl: Optional[float] = 7 * 24 * 3600):
+        self.llm_interface = llm_interface
+        self.provider = llm_interface.provider
+        self.model_env_var = llm_interface.model_env_var
+        self.default_model = llm_interface.default_model
+        self.persistent_cache = persistent_cache
+        self.ttl = ttl
+        self._memory = _LRUTier(memory_size)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "bypassed": 0}
+
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        """
+        先查进程内 LRU，再查持久化缓存，都未命中时调用被包装的接口并回填两级缓存。
+        """
+        use_cache = kwargs.pop('use_cache', True)
+        if model is not None:
+            kwargs['model'] = model
+        if not use_cache:
+            self._count("bypassed")
+            return self.llm_interface.get_completion(prompt, **kwargs)
+
+        call_kwargs = dict(kwargs)
+        resolved_model = self.llm_interface._resolve_model(call_kwargs.pop('model', None))
+        key = make_request_key(self.provider, resolved_model, prompt, call_kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        self._count("misses")
+        response = self.llm_interface.get_completion(prompt, **kwargs)
+        self._store(key, response)
+        return response
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        """
+        命中缓存时一次性产出完整结果；未命中时透传被包装接口的流，结束后回填缓存。
+        """
+        use_cache = kwargs.pop('use_cache', True)
+        if model is not None:
+            kwargs['model'] = model
+        if not use_cache:
+            self._count("bypassed")
+            yield from self.llm_interface.get_completion_stream(prompt, **kwargs)
+            return
+
+        call_kwargs = dict(kwargs)
+        resolved_model = self.llm_interface._resolve_model(call_kwargs.pop('model', None))
+        key = make_request_key(self.provider, resolved_model, prompt, call_kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            yield cached
+            return
+
+        self._count("misses")
+        parts = []
+        for delta in self.llm_interface.get_completion_stream(prompt, **kwargs):
+            parts.append(delta)
+            yield delta
+        self._store(key, "".join(parts))
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """
+        依次查询两级缓存并记录命中计数，未命中返回 None (未命中计数由调用方记录)。
+        """
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._count("memory_hits")
+            return cached
+
+        if self.persistent_cache:
+            try:
+                cached = self.persistent_cache.get(key)
+            except Exception as e:
+                print(f"LLM cache read error: {e}")
+                cached = None
+            if cached is not None:
+                self._count("persistent_hits")
+                self._memory.set(key, cached, self.ttl)
+                return cached
+        return None
+
+    def _store(self, key: str, response: str) -> None:
+        """
+        回填两级缓存，空响应视为失败不缓存。
+        """
+        if not response:
+            return
+        self._memory.set(key, response, self.ttl)
+        if self.persistent_cache:
+            try:
+                self.persistent_cache.set(key, response, self.ttl)
+            except Exception as e:
+                print(f"LLM cache write error: {e}")
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict[str, Any]:
+        """
+        返回命中/未命中计数以及命中率。
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["persistent_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines the per-provider adaptive concurrency limiter used by the LLM interfaces.
+A fixed number of worker threads either underuses the provider quota or triggers storms of rate-limit errors.
+Every provider therefore gets an AIMD limit on concurrent requests: the limit grows additively (about +1 per
+"round" of successful calls) while calls finish within the latency target, and is halved on 429 / overload
+errors, in which case new requests also pause for the server's retry hint (Retry-After / retry-after-ms).
+"""
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from Tools.utils.rate_limiter import parse_retry_after
+
+# 429: 限流；503: 服务不可用；529: Anthropic 过载
+OVERLOAD_STATUS_CODES = (429, 503, 529)
+
+def error_status(error: BaseException) -> Optional[int]:
+    """
+    从 SDK 异常中取出 HTTP 状态码 (openai / anthropic 为 status_code，google.api_core 为 code)。
+    """
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+def is_overload_error(error: BaseException) -> bool:
+    if error_status(error) in OVERLOAD_STATUS_CODES:
+        return True
+    name = type(error).__name__
+    return name in ("RateLimitError", "ResourceExhausted", "OverloadedError", "ServiceUnavailable")
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    读取异常所附响应中的重试提示，没有时返回 None。
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    return parse_retry_after(headers.get("retry-after"))
+
+class AdaptiveConcurrencyLimiter:
+    """
+    单个提供商的 AIMD 并发限制。
+    slot() / async_slot() 在调用前等待空闲的并发槽，调用结束后根据结果 (成功耗时、限流异常) 调整上限。
+    clock 为单调时钟，可以注入以便测试。
+    """
+    def __init__(self, provider: str, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 latency_target: float = 30.0, base_backoff: float = 1.0, max_backoff: float = 60.0,
+                 poll_interval: float = 0.05, clock: Callable[[], float] = time.monotonic):
+        self.provider = provider
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self._clock = clock
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._strikes = 0
+        self._condition = threading.Condition()
+        self._stats = {"requests": 0, "throttled": 0, "slow": 0, "waits": 0, "wait_seconds": 0.0}
+
+    @property
+    def limit(self) -> int:
+        return max(int(self._limit), self.min_limit)
+
+    def _try_acquire(self) -> float:
+        """
+        有空闲槽且未处于退避期时占用一个槽并返回 0，否则返回建议的等待秒数。调用方需持有 _condition。
+        """
+        delay = self._blocked_until - self._clock()
+        if delay > 0:
+            return delay
+        if self._in_flight >= self.limit:
+            return self.poll_interval
+        self._in_flight += 1
+        self._stats["requests"] += 1
+        return 0.0
+
+    def _record_wait(self, start: float) -> None:
+        waited = self._clock() - start
+        if waited > 0.001:
+            self._stats["waits"] += 1
+            self._stats["wait_seconds"] += waited
+
+    def _release(self, latency: Optional[float], error: Optional[BaseException]) -> None:
+        """
+        释放槽位并调整上限。latency 为 None 时 (例如流式调用) 只按是否出错调整。
+        """
+        backoff = None
+        with self._condition:
+            self._in_flight -= 1
+            now = self._clock()
+            if error is not None and is_overload_error(error):
+                self._stats["throttled"] += 1
+                # 同一波并发请求同时收到的多个 429 只减半一次
+                if now - self._last_decrease >= self.base_backoff:
+                    self._limit = max(self.min_limit, self._limit / 2)
+                    self._last_decrease = now
+                    self._strikes += 1
+                backoff = retry_after_seconds(error)
+                if backoff is None:
+                    backoff = self.base_backoff * 2 ** (self._strikes - 1)
+                backoff = min(backoff, self.max_backoff)
+                self._blocked_until = max(self._blocked_until, now + backoff)
+            elif error is None:
+                self._strikes = 0
+                if latency is not None and latency > self.latency_target:
+                    self._stats["slow"] += 1
+                else:
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+        if backoff is not None:
+            print(f"AdaptiveConcurrencyLimiter: {self.provider} overloaded ({type(error).__name__}), "
+                  f"limit -> {self.limit}, pausing {backoff:.1f}s")
+
+    @contextmanager
+    def slot(self, track_latency: bool = True):
+        """
+        占用一个并发槽 (阻塞等待)。track_latency=False 时 (流式调用) 耗时不参与判断。
+        """
+        start = self._clock()
+        with self._condition:
+            while True:
+                delay = self._try_acquire()
+                if delay <= 0:
+                    break
+                self._condition.wait(timeout=delay)
+            self._record_wait(start)
+
+        call_start = self._clock()
+        try:
+            yield
+        except BaseException as e:
+            self._release(None, e)
+            raise
+        self._release(self._clock() - call_start if track_latency else None, None)
+
+    @asynccontextmanager
+    async def async_slot(self, track_latency: bool = True):
+        """
+        slot() 的异步版本，等待时不阻塞事件循环。
+        """
+        start = self._clock()
+        while True:
+            with self._condition:
+                delay = self._try_acquire()
+                if delay <= 0:
+                    self._record_wait(start)
+                    break
+            await asyncio.sleep(min(delay, self.max_backoff))
+
+        call_start = self._clock()
+        try:
+            yield
+        except BaseException as e:
+            self._release(None, e)
+            raise
+        self._release(self._clock() - call_start if track_latency else None, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回当前并发上限、进行中的请求数、限流/慢调用次数以及等待统计。
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["limit"] = self.limit
+            stats["in_flight"] = self._in_flight
+            stats["paused_seconds"] = max(self._blocked_until - self._clock(), 0.0)
+        return stats
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_concurrency_limiter(provider: str) -> AdaptiveConcurrencyLimiter:
+    """
+    返回该提供商的进程级限制器，参数来自 LLM_CONCURRENCY_INITIAL / LLM_CONCURRENCY_MAX / LLM_LATENCY_TARGET。
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter(
+                provider,
+                initial_limit=int(os.getenv('LLM_CONCURRENCY_INITIAL', '4')),
+                max_limit=int(os.getenv('LLM_CONCURRENCY_MAX', '32')),
+                latency_target=float(os.getenv('LLM_LATENCY_TARGET', '30'))
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+def concurrency_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    所有提供商限制器的统计 (提供商 -> stats)。
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {provider: limiter.stats() for provider, limiter in limiters.items()}
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+此文件定义了对冲请求 (hedged requests) 与提供商故障转移层。
+单个提供商的长尾延迟决定了整个会话的完成时间。HedgedLLMAPIInterface 组合一个主提供商和若干备用提供商：
+主提供商在其历史延迟的某个分位数 (例如 p95) 内没有返回时，向下一个备用提供商发出对冲请求，
+采用最先返回的有效结果并取消其余请求；主提供商熔断器打开或调用失败时直接转移到备用提供商。
+对冲是按调用选择开启的 (见 hedging())：只有短小、可重复的调用 (例如摘要) 值得多花一次请求，
+规划这类长输出调用只做故障转移，并在调用线程上直接执行。
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from Interfaces.llm_api_interface import LLMAPIInterface, LLMError, classify_error, get_circuit_breaker
+
+_hedging_enabled: ContextVar[bool] = ContextVar("llm_hedging_enabled", default=False)
+
+@contextmanager
+def hedging(enabled: bool = True):
+    """
+    在此上下文中发出的 LLM 调用是否允许对冲 (默认不允许)。实体在调用接口时设置，见 BaseLLMEntity.hedge_requests。
+    """
+    token = _hedging_enabled.set(enabled)
+    try:
+        yield
+    finally:
+        _hedging_enabled.reset(token)
+
+class LatencyTracker:
+    """
+    最近 window 次调用耗时的滑动窗口，用于计算分位数。
+    """
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        """
+        返回第 q 百分位 (0-100) 的耗时，样本不足 min_samples 时返回 None。
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(int(len(samples) * q / 100), len(samples) - 1)
+        return samples[index]
+
+class HedgedLLMAPIInterface(LLMAPIInterface):
+    """
+    主提供商 + 备用提供商的组合接口。
+    hedge_percentile: 主提供商耗时达到其历史分位数后发出对冲请求 (环境变量 LLM_HEDGE_PERCENTILE)；
+    延迟按 (模型, max_tokens) 分别统计，长输出的调用不会以短调用的分位数为准。
+    历史样本不足 min_samples 时使用 default_hedge_delay 秒 (LLM_HEDGE_DELAY)。
+    备用提供商使用各自的默认模型 (调用方指定的 model 只对主提供商有效)。
+    未开启对冲的调用在调用线程上依次尝试各提供商，不占用线程池。
+    开启对冲的调用在线程池中执行 (调用线程需要等待先返回的一方)，线程池大小默认为
+    LLM_CONCURRENCY_MAX × 提供商数，不会低于各提供商自适应并发限制的上限。
+    被包装的接口提供 submit_completion (例如 SyncLLMAdapter) 时，取消落败的请求会真正中止它；
+    否则落败的请求只能被忽略，直到其自行结束。
+    """
+    def __init__(self, primary: LLMAPIInterface, secondaries: List[LLMAPIInterface], hedge_percentile: float = None,
+                 default_hedge_delay: float = None, min_samples: int = 20, max_workers: int = None):
+        self.primary = primary
+        self.secondaries = list(secondaries)
+        self.provider = primary.provider
+        self.model_env_var = primary.model_env_var
+        self.default_model = primary.default_model
+        self.hedge_percentile = hedge_percentile or float(os.getenv('LLM_HEDGE_PERCENTILE', '95'))
+        self.default_hedge_delay = default_hedge_delay or float(os.getenv('LLM_HEDGE_DELAY', '8'))
+        self.min_samples = min_samples
+
+        max_workers = max_workers or int(os.getenv('LLM_CONCURRENCY_MAX', '32')) * (1 + len(self.secondaries))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._primary_latency: Dict[Tuple[str, Any], LatencyTracker] = {}
+        self._observed_latency = LatencyTracker()
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "errors": 0}
+
+    def _resolve_model(self, model: str) -> str:
+        return self.primary._resolve_model(model)
+
+    def _latency_key(self, kwargs: dict) -> Tuple[str, Any]:
+        return self.primary._resolve_model(kwargs.get('model')), kwargs.get('max_tokens')
+
+    def _latency_tracker(self, key: Tuple[str, Any]) -> LatencyTracker:
+        with self._lock:
+            tracker = self._primary_latency.get(key)
+            if tracker is None:
+                tracker = self._primary_latency[key] = LatencyTracker()
+            return tracker
+
+    def hedge_delay(self, key: Tuple[str, Any] = None) -> float:
+        """
+        当前的对冲等待时间：主提供商在同一 (模型, max_tokens) 下延迟的 hedge_percentile 分位数。
+        """
+        with self._lock:
+            tracker = self._primary_latency.get(key)
+        threshold = tracker.percentile(self.hedge_percentile, self.min_samples) if tracker else None
+        return threshold if threshold is not None else self.default_hedge_delay
+
+    def _available(self) -> List[LLMAPIInterface]:
+        """
+        按优先级返回熔断器未打开的接口；全部打开时仍返回主提供商 (让它快速失败)。
+        """
+        interfaces = [self.primary] + self.secondaries
+        available = [i for i in interfaces if get_circuit_breaker(i.provider).state != "open"]
+        return available or [self.primary]
+
+    def _call_kwargs(self, interface: LLMAPIInterface, kwargs: dict) -> dict:
+        if interface is self.primary:
+            return kwargs
+        return {k: v for k, v in kwargs.items() if k != 'model'}
+
+    def _submit(self, interface: LLMAPIInterface, prompt: str, kwargs: dict) -> Future:
+        call_kwargs = self._call_kwargs(interface, kwargs)
+        submit = getattr(interface, 'submit_completion', None)
+        if submit is not None:
+            return submit(prompt, **call_kwargs)
+        return self._pool.submit(interface.get_completion, prompt, **call_kwargs)
+
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        """
+        向第一个可用的提供商发出请求，失败时转移到下一个提供商。
+        当前上下文开启了对冲时 (hedging())，超过对冲等待时间仍未返回会向下一个提供商发出对冲请求，
+        返回最先得到的非空结果。所有提供商都失败时抛出最后一个 LLMError。
+        """
+        if model is not None:
+            kwargs['model'] = model
+        start = time.monotonic()
+        try:
+            if _hedging_enabled.get() and self.secondaries:
+                return self._race(prompt, kwargs)
+            return self._in_order(prompt, kwargs)
+        finally:
+            self._observed_latency.record(time.monotonic() - start)
+
+    def _candidates(self) -> List[LLMAPIInterface]:
+        candidates = self._available()
+        self._count("calls")
+        if candidates[0] is not self.primary:
+            self._count("failovers")
+            print(f"HedgedLLM: {self.primary.provider} circuit is open, failing over to {candidates[0].provider}")
+        return candidates
+
+    def _in_order(self, prompt: str, kwargs: dict) -> str:
+        """
+        不对冲：在调用线程上依次尝试可用的提供商，失败或空结果时转移到下一个。
+        """
+        last_error: Optional[LLMError] = None
+        for index, interface in enumerate(self._candidates()):
+            if index > 0:
+                self._count("failovers")
+            started = time.monotonic()
+            try:
+                response = interface.get_completion(prompt, **self._call_kwargs(interface, kwargs))
+            except Exception as e:
+                last_error = classify_error(interface.provider, e)
+                print(f"HedgedLLM: {interface.provider} failed: {last_error}")
+                continue
+            if interface is self.primary:
+                self._latency_tracker(self._latency_key(kwargs)).record(time.monotonic() - started)
+            if response:
+                return response
+
+        self._count("errors")
+        if last_error is not None:
+            raise last_error
+        return ""
+
+    def _race(self, prompt: str, kwargs: dict) -> str:
+        candidates = self._candidates()
+        key = self._latency_key(kwargs)
+        latency = self._latency_tracker(key)
+        pending: Dict[Future, tuple] = {}
+        last_error: Optional[LLMError] = None
+
+        def launch():
+            interface = candidates.pop(0)
+            pending[self._submit(interface, prompt, kwargs)] = (interface, time.monotonic())
+
+        launch()
+        while pending:
+            # 只有一个请求在进行且还有备用提供商时，等待对冲阈值；否则等到任一请求结束
+            timeout = self.hedge_delay(key) if candidates and len(pending) == 1 else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                self._count("hedged")
+                print(f"HedgedLLM: no response after {timeout:.1f}s, hedging to {candidates[0].provider}")
+                launch()
+                continue
+
+            for future in done:
+                interface, started = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = classify_error(interface.provider, e)
+                    print(f"HedgedLLM: {interface.provider} failed: {last_error}")
+                    response = None
+                else:
+                    if interface is self.primary:
+                        latency.record(time.monotonic() - started)
+                if response:
+                    self._cancel(pending, latency)
+                    if interface is not self.primary:
+                        self._count("hedge_wins")
+                    return response
+
+            # 失败或空结果：没有进行中的请求时立即转移到下一个提供商
+            if not pending and candidates:
+                self._count("failovers")
+                launch()
+
+        self._count("errors")
+        if last_error is not None:
+            raise last_error
+        return ""
+
+    def _cancel(self, pending: Dict[Future, tuple], latency: LatencyTracker) -> None:
+        """
+        取消落败的请求。主提供商被取消时把已等待的时间计入其延迟样本 (真实耗时至少这么长)。
+        """
+        for future, (interface, started) in pending.items():
+            future.cancel()
+            if interface is self.primary:
+                latency.record(time.monotonic() - started)
+        pending.clear()
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        """
+        流式调用只做故障转移，不做对冲：依次尝试可用的提供商，产出第一段文本之前失败时转移到下一个。
+        """
+        if model is not None:
+            kwargs['model'] = model
+        self._count("calls")
+        last_error: Optional[LLMError] = None
+        for index, interface in enumerate(self._available()):
+            if index > 0 or interface is not self.primary:
+                self._count("failovers")
+            started = False
+            try:
+                for delta in interface.get_completion_stream(prompt, **self._call_kwargs(interface, kwargs)):
+                    started = True
+                    yield delta
+                return
+            except LLMError as e:
+                if started:
+                    raise
+                last_error = e
+                print(f"HedgedLLM: {interface.provider} stream failed before output: {e}")
+        self._count("errors")
+        if last_error is not None:
+            raise last_error
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回对冲/故障转移计数、每个 (模型, max_tokens) 当前的对冲阈值，以及调用方看到的 p50 / p95 / p99 延迟 (秒)。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            trackers = dict(self._primary_latency)
+        stats["hedge_delay"] = {
+            f"{model}/{max_tokens or 'default'}": self.hedge_delay((model, max_tokens)) for model, max_tokens in trackers
+        }
+        for q in (50, 95, 99):
+            stats[f"p{q}_latency"] = self._observed_latency.percentile(q)
+        return stats
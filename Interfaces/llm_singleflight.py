@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+此文件定义了 LLM 请求合并 (single-flight) 层。
+并行执行时，多个线程经常在同一时刻发出完全相同的请求 (例如同一个页面被两个命令返回后需要总结)。
+SingleFlightLLMAPIInterface 包装任意 LLMAPIInterface：相同的 (provider, model, prompt, 参数) 请求在进行中时，
+后到的请求不再调用上游，而是等待第一个请求完成并共享其结果。
+与 CachedLLMAPIInterface 配合时应放在最外层，使同时到达的相同请求连缓存都只查询一次。
+"""
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+from Interfaces.llm_api_interface import LLMAPIInterface
+from Interfaces.llm_cache import CachedLLMAPIInterface, make_request_key
+
+class _Flight:
+    """
+    一次进行中的上游调用，完成后保存结果或异常。
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self) -> str:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SingleFlightLLMAPIInterface(LLMAPIInterface):
+    """
+    为任意 LLMAPIInterface 增加请求合并。
+    单次调用传入 use_cache=False 时不参与合并 (调用方希望得到新的结果)。
+    use_cache 只有在被包装的接口是 CachedLLMAPIInterface 时才会转交，其他接口 (原始提供商) 不认识这个参数。
+    上游抛出的异常会同样抛给所有等待中的请求。
+    """
+    def __init__(self, llm_interface: LLMAPIInterface):
+        self.llm_interface = llm_interface
+        self.provider = llm_interface.provider
+        self.model_env_var = llm_interface.model_env_var
+        self.default_model = llm_interface.default_model
+
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"upstream_calls": 0, "coalesced": 0, "bypassed": 0}
+
+    def _key(self, prompt: str, kwargs: dict) -> str:
+        call_kwargs = dict(kwargs)
+        resolved_model = self.llm_interface._resolve_model(call_kwargs.pop('model', None))
+        return make_request_key(self.provider, resolved_model, prompt, call_kwargs)
+
+    def _pop_use_cache(self, kwargs: dict) -> bool:
+        """
+        从 kwargs 中取出 use_cache；被包装的是缓存层时放回去，让缓存同样跳过。
+        """
+        use_cache = kwargs.pop('use_cache', True)
+        if not use_cache and isinstance(self.llm_interface, CachedLLMAPIInterface):
+            kwargs['use_cache'] = False
+        return use_cache
+
+    def _join(self, key: str):
+        """
+        返回 (flight, is_leader)：没有进行中的相同请求时由当前线程负责调用上游。
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                return flight, False
+            flight = _Flight()
+            self._flights[key] = flight
+            self._stats["upstream_calls"] += 1
+            return flight, True
+
+    def _land(self, key: str, flight: _Flight, result: str = None, error: BaseException = None) -> None:
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.result, flight.error = result, error
+        flight.done.set()
+
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        """
+        相同请求进行中时等待其结果，否则调用被包装的接口并把结果分享给等待者。
+        """
+        if model is not None:
+            kwargs['model'] = model
+        if not self._pop_use_cache(kwargs):
+            self._count("bypassed")
+            return self.llm_interface.get_completion(prompt, **kwargs)
+
+        key = self._key(prompt, kwargs)
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            return flight.wait()
+
+        try:
+            response = self.llm_interface.get_completion(prompt, **kwargs)
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result=response)
+        return response
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        """
+        第一个请求透传被包装接口的流；合并进来的请求等待流结束后一次性产出完整结果。
+        流被提前关闭时把已收到的部分视为不完整，等待者会得到异常而不是半截的结果。
+        """
+        if model is not None:
+            kwargs['model'] = model
+        if not self._pop_use_cache(kwargs):
+            self._count("bypassed")
+            yield from self.llm_interface.get_completion_stream(prompt, **kwargs)
+            return
+
+        key = self._key(prompt, kwargs)
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            response = flight.wait()
+            if response:
+                yield response
+            return
+
+        parts = []
+        try:
+            for delta in self.llm_interface.get_completion_stream(prompt, **kwargs):
+                parts.append(delta)
+                yield delta
+        except BaseException as e:
+            self._land(key, flight, error=e if isinstance(e, Exception) else RuntimeError("LLM stream was closed before completion"))
+            raise
+        self._land(key, flight, result="".join(parts))
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回上游调用数、被合并的请求数、当前进行中的请求数以及合并率。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        requests = stats["upstream_calls"] + stats["coalesced"]
+        stats["coalesce_rate"] = stats["coalesced"] / requests if requests else 0.0
+        return stats
@@ -9,21 +9,148 @@ from Interfaces.database_interface import RedisClient
 from Interfaces.llm_api_interface import OpenAIInterface
 from Entities.filter_summary import LLMFilterSummary
 from .tool_registry import ToolRegistry
+from .scheduler import PriorityCommandQueue, command_priority_ranks, command_priority_rank, find_cyclic_commands
 
-from queue import Queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import defaultdict
+from typing import Dict, List, Optional
 import threading
+import time
 import uuid
+import os
+
+# 默认的单工具并发上限，未列出的工具只受全局上限约束
+DEFAULT_TOOL_CONCURRENCY = {"web_search": 8}
+
+def _tool_concurrency_from_env() -> Dict[str, int]:
+    """
+    解析环境变量 TOOL_CONCURRENCY，格式为 "web_search=8,other_tool=2"。
+    """
+    limits = {}
+    for item in os.getenv('TOOL_CONCURRENCY', '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+class _CommandBatch:
+    """
+    一组一起等待的命令：收集结果，并在全部命令结束时唤醒等待者。
+    如果绑定了 working_memory，每个结果一产生就写入其中。
+    """
+    def __init__(self, working_memory: Optional[WorkingMemory] = None):
+        self.working_memory = working_memory
+        self.results = {}
+        self.command_ids = set()
+        self.total = 0
+        self.pending = 0
+        self.condition = threading.Condition()
+
+    def add(self):
+        with self.condition:
+            self.total += 1
+            self.pending += 1
+
+    def record(self, cmd_id: str, result: Optional[dict]):
+        with self.condition:
+            if result:
+                self.results[cmd_id] = result
+                if self.working_memory is not None:
+                    self.working_memory.data[cmd_id] = result
+
+    def finish(self):
+        with self.condition:
+            self.pending -= 1
+            if self.pending == 0:
+                self.condition.notify_all()
+
+    def wait(self):
+        with self.condition:
+            while self.pending > 0:
+                self.condition.wait()
+
+class _SummaryBatcher:
+    """
+    把并行执行的命令几乎同时发出的总结请求合并为一次批量补全调用。
+    每个请求方先在自己的线程上完成预筛选与切块 (LLMFilterSummary.map_prompts)，再把 map 阶段的 prompt 放入队列；
+    第一个放入的请求等待 window 秒收集同批 prompt，然后在后台线程中统一提交 (complete_prompts)。
+    每个 prompt 完成时立即唤醒其请求方，请求方随后在自己的线程上合并多块结果 (combine)，
+    因此一条命令只等待自己的 prompt，而不是整批中最慢的那一条。
+    window 为 0 时不做合并，直接调用 process。
+    """
+    def __init__(self, summarizer: LLMFilterSummary, window: float = None):
+        self.summarizer = summarizer
+        self.window = window if window is not None else float(os.getenv('SUMMARY_BATCH_WINDOW', '0.05'))
+        self._lock = threading.Lock()
+        self._queue = []
+
+    def summarize(self, mcp: MCP, raw_data: str, query: str = None) -> str:
+        """
+        与 LLMFilterSummary.process 签名相同，返回该条原始数据的摘要。
+        """
+        if self.window <= 0:
+            return self.summarizer.process(mcp, raw_data=raw_data, query=query)
+
+        prompts = self.summarizer.map_prompts(raw_data, query)
+        if not prompts:
+            return ""
+        futures = [Future() for _ in prompts]
+        with self._lock:
+            is_leader = not self._queue
+            self._queue.extend(zip(prompts, futures))
+        if is_leader:
+            time.sleep(self.window)
+            with self._lock:
+                batch, self._queue = self._queue, []
+            threading.Thread(target=self._flush, args=(batch,), name="summary-batch", daemon=True).start()
+        return self.summarizer.combine([future.result() for future in futures])
+
+    def _flush(self, batch: list) -> None:
+        futures = [future for _, future in batch]
+        try:
+            self.summarizer.complete_prompts([prompt for prompt, _ in batch],
+                                             on_result=lambda i, summary: futures[i].set_result(summary))
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
 
 class ToolExecutor:
-    def __init__(self, db_interface: RedisClient, llm_summarizer: LLMFilterSummary):
+    """
+    在一个有界线程池上执行命令。
+    线程池在执行器的整个生命周期内复用，全局并发不超过 max_workers，
+    每个工具的并发不超过 tool_concurrency 中的上限，超出的命令在队列中等待空闲槽位。
+    等待中的命令按父战略计划的优先级 (High > Medium > Low) 出队，同优先级保持计划顺序。
+    命令可以通过 depends_on 声明依赖：依赖全部结束 (结果写入 WorkingMemory) 之前命令不会入队，
+    因此所有就绪的命令并行执行，而有先后要求的命令依然按序执行。
+    """
+    def __init__(self, db_interface: RedisClient, llm_summarizer: LLMFilterSummary,
+                 max_workers: int = None, tool_concurrency: Dict[str, int] = None):
         self.db_interface = db_interface
         self.llm_summarizer = llm_summarizer
         self.tool_registry = ToolRegistry()
         self.entity_id = self.__class__.__name__
-        
-        self._active_threads = 0
-        self._thread_lock = threading.Lock()
-        self._result_queue = Queue()
+        # 同时完成的工具调用共享一次批量总结
+        self._summary_batcher = _SummaryBatcher(llm_summarizer)
+
+        self.max_workers = max_workers or int(os.getenv('EXECUTOR_MAX_WORKERS', '16'))
+        self.tool_concurrency = {**DEFAULT_TOOL_CONCURRENCY, **_tool_concurrency_from_env(), **(tool_concurrency or {})}
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool-executor")
+
+        # 调度状态，均由 _lock 保护
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._pending = defaultdict(PriorityCommandQueue)
+        self._running = defaultdict(int)
+        self._in_flight = 0
+        # 依赖跟踪：已结束的命令、等待依赖的命令及其剩余依赖、依赖 -> 等待它的命令
+        self._known = set()
+        self._completed = set()
+        self._blocked = {}
+        self._dependents = defaultdict(list)
+
+        # 流式提交的命令 (规划仍在进行时即开始执行)
+        self._submitted = _CommandBatch()
     
     def execute(self, mcp: MCP, working_memory: WorkingMemory) -> bool:
         executable_commands = mcp.executable_commands
@@ -31,51 +158,168 @@ class ToolExecutor:
         if not executable_commands:
             return False
         
-        batch_size = len(executable_commands)
-        results = {}
-        
-        for i in range(0, len(executable_commands), batch_size):
-            batch = executable_commands[i:i + batch_size]
-            
-            batch_results = self._execute_batch(mcp, batch)
-            results.update(batch_results)
-            
-            if hasattr(mcp, 'should_stop') and mcp.should_stop:
-                break
-        
-        working_memory.data.update(results)
+        batch = _CommandBatch(working_memory)
+        ranks = command_priority_ranks(mcp)
+        self._enqueue(mcp, executable_commands, batch, ranks)
+        batch.wait()
+        self._retire(batch)
         return True
-    
-    def _execute_batch(self, mcp: MCP, commands):
-        threads = []
-        results = {}
-        results_lock = threading.Lock()
-        
-        for cmd in commands:
-            thread = threading.Thread(
-                target=self._execute_single_cmd_threaded,
-                args=(mcp, cmd, results, results_lock)
-            )
-            threads.append(thread)
-            thread.start()
-        
-        for thread in threads:
-            thread.join()
-        
-        return results
-    
-    def _execute_single_cmd_threaded(self, mcp: MCP, cmd, results, results_lock):
+
+    def submit(self, mcp: MCP, cmd: ExecutableCommand, working_memory: Optional[WorkingMemory] = None) -> None:
+        """
+        立即将单个命令加入执行队列，不等待其完成。
+        用于规划器流式产出命令时，让工具执行与剩余的规划过程重叠。
+        传入 working_memory 时，结果一产生就写入其中，工具也可以读取会话中已收集的内容。
+        """
+        if working_memory is not None:
+            with self._lock:
+                self._submitted.working_memory = working_memory
+        self._enqueue(mcp, [cmd], self._submitted, {cmd.id: command_priority_rank(mcp, cmd)})
+
+    def collect(self, working_memory: WorkingMemory) -> bool:
+        """
+        等待所有通过 submit 提交的命令结束，并将结果写入 working_memory。
+        没有提交过任何命令时返回 False。
+        """
+        with self._lock:
+            batch = self._submitted
+            self._submitted = _CommandBatch()
+        if batch.total == 0:
+            return False
+
+        batch.wait()
+        self._retire(batch)
+        working_memory.data.update(batch.results)
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        关闭线程池，执行器不再可用。
+        尚未开始的命令 (就绪队列、等待依赖、已提交但未运行) 全部放弃并计为结束，
+        因此阻塞在 execute()/collect() 中的调用者会在正在运行的命令结束后返回。
+        """
+        with self._lock:
+            self._stopping = True
+            dropped = [batch for queue in self._pending.values() for _, _, batch in self._drain(queue)]
+            dropped += [batch for _, _, batch, _, _ in self._blocked.values()]
+            self._pending.clear()
+            self._blocked.clear()
+            self._dependents.clear()
+        for batch in dropped:
+            batch.finish()
+        # 不取消已提交的任务：它们会检查 _stopping 后立即结束，并负责调用 batch.finish()
+        self._pool.shutdown(wait=wait)
+
+    @staticmethod
+    def _drain(queue: PriorityCommandQueue) -> list:
+        items = []
+        while queue:
+            items.append(queue.pop())
+        return items
+
+    def _retire(self, batch: _CommandBatch) -> None:
+        """
+        批次全部结束后，从依赖跟踪中移除其命令ID，避免 _known/_completed 随执行器生命周期无限增长。
+        之后提交的命令不能再依赖这些命令 (会被当作未知依赖忽略)。
+        """
+        with self._lock:
+            self._known -= batch.command_ids
+            self._completed -= batch.command_ids
+
+    def _tool_limit(self, tool: str) -> int:
+        return min(self.tool_concurrency.get(tool, self.max_workers), self.max_workers)
+
+    def _enqueue(self, mcp: MCP, commands: List[ExecutableCommand], batch: _CommandBatch, ranks: Dict[str, int]) -> None:
+        """
+        将一组命令全部登记后再统一调度，保证同一批中高优先级的命令先被提交。
+        依赖尚未结束的命令进入等待集合，其余命令直接进入就绪队列。
+        """
+        for _ in commands:
+            batch.add()
+        cyclic = find_cyclic_commands(commands)
+        with self._lock:
+            if self._stopping:
+                for _ in commands:
+                    batch.finish()
+                return
+            batch.command_ids.update(cmd.id for cmd in commands)
+            self._known.update(batch.command_ids)
+            for cmd in commands:
+                if cmd.id in cyclic:
+                    print(f"Warning: command {cmd.id} is part of a dependency cycle, ignoring its dependencies")
+                    deps = set()
+                else:
+                    deps = {dep for dep in cmd.depends_on if dep not in self._completed}
+                unknown = {dep for dep in deps if dep not in self._known}
+                if unknown:
+                    print(f"Warning: command {cmd.id} depends on unknown commands {unknown}, ignoring them")
+                    deps -= unknown
+
+                if deps:
+                    self._blocked[cmd.id] = (mcp, cmd, batch, ranks[cmd.id], deps)
+                    for dep in deps:
+                        self._dependents[dep].append(cmd.id)
+                else:
+                    self._pending[cmd.tool].push(ranks[cmd.id], (mcp, cmd, batch))
+            self._dispatch()
+
+    def _release_dependents(self, cmd_id: str) -> None:
+        """
+        在持有 _lock 时调用：标记命令已结束，并把依赖全部满足的命令移入就绪队列。
+        失败的命令同样视为结束，避免其下游永久阻塞。
+        """
+        self._completed.add(cmd_id)
+        for dependent_id in self._dependents.pop(cmd_id, []):
+            mcp, cmd, batch, rank, deps = self._blocked[dependent_id]
+            deps.discard(cmd_id)
+            if not deps:
+                del self._blocked[dependent_id]
+                self._pending[cmd.tool].push(rank, (mcp, cmd, batch))
+
+    def _dispatch(self) -> None:
+        """
+        在持有 _lock 时调用：按优先级把等待中的命令提交到线程池，直到全局或工具槽位用尽。
+        每次从所有仍有空闲槽位的工具中，选出队首优先级最高的命令。
+        """
+        while not self._stopping and self._in_flight < self.max_workers:
+            candidates = [
+                (queue.peek_key(), tool) for tool, queue in self._pending.items()
+                if queue and self._running[tool] < self._tool_limit(tool)
+            ]
+            if not candidates:
+                return
+            _, tool = min(candidates)
+            mcp, cmd, batch = self._pending[tool].pop()
+            self._running[tool] += 1
+            self._in_flight += 1
+            self._pool.submit(self._run_command, mcp, cmd, batch)
+
+    def _run_command(self, mcp: MCP, cmd: ExecutableCommand, batch: _CommandBatch) -> None:
+        result = None
+        try:
+            # 执行器关闭或工作流被要求停止时，放弃尚未开始的命令
+            if not self._stopping and not getattr(mcp, 'should_stop', False):
+                result = self._execute_single_cmd(mcp, cmd, batch.working_memory)
+        finally:
+            batch.record(cmd.id, result)
+            with self._lock:
+                self._running[cmd.tool] -= 1
+                self._in_flight -= 1
+                self._release_dependents(cmd.id)
+                self._dispatch()
+            batch.finish()
+
+    def _execute_single_cmd(self, mcp: MCP, cmd: ExecutableCommand, working_memory: Optional[WorkingMemory] = None) -> Optional[dict]:
         try:
             tool_class = self.tool_registry.get_tool_class(cmd.tool)
             tool_instance = tool_class(self.db_interface, self.llm_summarizer)
             
-            result = tool_instance.execute(mcp, executable_command=cmd)
-            if result:
-                with results_lock:
-                    results[cmd.id] = result
+            return tool_instance.execute(mcp, executable_command=cmd, working_memory=working_memory,
+                                         summarize=self._summary_batcher.summarize)
                 
         except Exception as e:
             print(f"Thread execution error: {e}")
+            return None
 
 
 if __name__ == "__main__":
@@ -101,4 +345,5 @@ if __name__ == "__main__":
     )
     working_memory = WorkingMemory()
     executor.execute(mcp, working_memory)
+    executor.shutdown()
     print(f"Executor: Working memory data: {working_memory.data}")
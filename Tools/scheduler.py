@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines priority helpers for command scheduling.
+LLMStrategyPlanner records a priority (High/Medium/Low) in every StrategyPlan.description;
+commands inherit the priority of their parent plan through their parent subgoal,
+so that high-priority subgoals are dispatched (and therefore finish) first under constrained concurrency.
+It also provides the dependency-cycle check used by the executor's DAG scheduling.
+"""
+import heapq
+import itertools
+from typing import Dict, List, Optional, Set, Tuple, Any
+
+from Data.mcp_models import MCP, ExecutableCommand
+
+def command_priority_ranks(mcp: MCP) -> Dict[str, int]:
+    """
+    计算 MCP 中所有命令的优先级排序值：命令 -> 子目标 -> 战略计划 (均为索引查找)。
+    """
+    return {cmd.id: mcp.command_priority_rank(cmd) for cmd in mcp.executable_commands}
+
+def command_priority_rank(mcp: MCP, cmd: ExecutableCommand) -> int:
+    """
+    计算单个命令的优先级排序值。
+    """
+    return mcp.command_priority_rank(cmd)
+
+def find_cyclic_commands(commands: List[ExecutableCommand]) -> Set[str]:
+    """
+    对一组命令内部的 depends_on 做拓扑排序 (Kahn 算法)，返回无法排序的命令ID，
+    即处于依赖环中或 (间接) 依赖于环的命令。指向这组命令之外的依赖不参与判断。
+    """
+    ids = {cmd.id for cmd in commands}
+    remaining = {cmd.id: {dep for dep in cmd.depends_on if dep in ids} for cmd in commands}
+    dependents: Dict[str, List[str]] = {}
+    for cmd_id, deps in remaining.items():
+        for dep in deps:
+            dependents.setdefault(dep, []).append(cmd_id)
+
+    ready = [cmd_id for cmd_id, deps in remaining.items() if not deps]
+    while ready:
+        cmd_id = ready.pop()
+        for dependent_id in dependents.get(cmd_id, []):
+            remaining[dependent_id].discard(cmd_id)
+            if not remaining[dependent_id]:
+                ready.append(dependent_id)
+        del remaining[cmd_id]
+    return set(remaining)
+
+class PriorityCommandQueue:
+    """
+    按 (优先级, 入队顺序) 出队的最小堆，同优先级的命令保持计划中的原始顺序。
+    """
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, rank: int, item: Any) -> None:
+        heapq.heappush(self._heap, (rank, next(self._counter), item))
+
+    def peek_key(self) -> Optional[Tuple[int, int]]:
+        """返回队首的 (优先级, 入队序号)，队列为空时返回 None。"""
+        if not self._heap:
+            return None
+        rank, seq, _ = self._heap[0]
+        return rank, seq
+
+    def pop(self) -> Any:
+        return heapq.heappop(self._heap)[2]
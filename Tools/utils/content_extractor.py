@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines the ContentExtractor used by WebSearchTool.
+trafilatura's extract() is CPU-bound HTML parsing; running it on the executor's threads serializes on the GIL
+when many downloads finish at the same time. The extractor ships raw HTML bytes to a process pool sized to
+the number of cores and returns the extracted text, so extraction throughput scales with the core count.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from trafilatura import extract
+
+def extract_html(html: bytes) -> Optional[str]:
+    """
+    在工作进程中执行的提取函数 (必须是模块级函数才能被 pickle)。
+    """
+    if not html:
+        return None
+    try:
+        return extract(html)
+    except Exception as e:
+        print(f"ContentExtractor trafilatura extract error: {e}")
+        return None
+
+class ContentExtractor:
+    """
+    基于进程池的正文提取阶段。
+    工作进程使用 spawn 方式启动，避免在多线程进程中 fork；进程池损坏时退回到当前线程内提取。
+    """
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def extract(self, html: bytes) -> Optional[str]:
+        """
+        提取单个页面的正文。
+        """
+        return self.extract_many([html])[0]
+
+    def extract_many(self, pages: List[bytes]) -> List[Optional[str]]:
+        """
+        并行提取一组页面的正文，结果顺序与输入一致。
+        """
+        if not pages:
+            return []
+        try:
+            return list(self._pool.map(extract_html, pages))
+        except BrokenProcessPool as e:
+            print(f"ContentExtractor: process pool unavailable ({e}), extracting in-thread")
+            return [extract_html(page) for page in pages]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+_default_extractor: Optional[ContentExtractor] = None
+_default_extractor_lock = threading.Lock()
+
+def get_content_extractor() -> ContentExtractor:
+    """
+    返回进程内共享的 ContentExtractor，工作进程数来自环境变量 EXTRACT_WORKERS (默认等于 CPU 核数)。
+    """
+    global _default_extractor
+    with _default_extractor_lock:
+        if _default_extractor is None:
+            load_dotenv()
+            workers = os.getenv('EXTRACT_WORKERS')
+            _default_extractor = ContentExtractor(int(workers) if workers else None)
+        return _default_extractor
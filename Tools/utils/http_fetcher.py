@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines the PageFetcher used by WebSearchTool.
+All page downloads go through one shared httpx.Client, so connections (and TLS sessions) to the same
+host are kept alive and reused across searches, and a batch of URLs is downloaded concurrently:
+the latency of a search becomes roughly that of its slowest page instead of the sum of all pages.
+Requests pass through a per-host HostRateLimiter, so parallel searches stay polite to each individual site.
+A URL is only handed to a download thread once its host is ready; URLs of throttled or busy hosts wait on the
+calling thread, so one slow host cannot occupy the shared download pool.
+"""
+import os
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+from Tools.utils.rate_limiter import HostRateLimiter, THROTTLE_STATUS_CODES
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+}
+
+@dataclass
+class FetchResult:
+    """
+    一次页面下载的结果。content 为 None 表示下载失败，error 记录原因。
+    """
+    url: str
+    status_code: Optional[int] = None
+    content: Optional[bytes] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    truncated: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.content is not None and self.status_code is not None and self.status_code < 400
+
+class PageFetcher:
+    """
+    基于共享 httpx.Client 连接池的并发页面下载器。
+    每个请求都有超时限制，响应体超过 max_bytes 时截断，fetch_many 返回的结果与输入 URL 顺序一致。
+    下载使用独立的线程池，不占用 ToolExecutor 的工作线程，避免嵌套提交导致的死锁。
+    """
+    def __init__(self, timeout: float = 10.0, max_bytes: int = 5 * 1024 * 1024, max_workers: int = 16,
+                 max_connections: int = 64, rate_limiter: Optional[HostRateLimiter] = None, max_retries: int = 2):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.max_retries = max_retries
+        self.client = httpx.Client(
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(timeout),
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="page-fetcher")
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """
+        在主机限流器的许可下下载单个页面，重试规则见 fetch_many。
+        """
+        return self.fetch_many([url], [headers])[0]
+
+    def _download(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """
+        下载单个页面，边读边计数，超过 max_bytes 的部分被丢弃。
+        """
+        try:
+            with self.client.stream("GET", url, headers=headers) as response:
+                chunks, size, truncated = [], 0, False
+                for chunk in response.iter_bytes():
+                    remaining = self.max_bytes - size
+                    if len(chunk) >= remaining:
+                        chunks.append(chunk[:remaining])
+                        size = self.max_bytes
+                        truncated = len(chunk) > remaining
+                        if truncated:
+                            break
+                        continue
+                    chunks.append(chunk)
+                    size += len(chunk)
+                return FetchResult(
+                    url=url,
+                    status_code=response.status_code,
+                    content=b"".join(chunks),
+                    headers=dict(response.headers),
+                    truncated=truncated,
+                )
+        except (httpx.HTTPError, httpx.InvalidURL, httpx.StreamError) as e:
+            # InvalidURL 和 StreamError 不是 HTTPError 的子类，单个URL的失败不能影响同批的其他页面
+            return FetchResult(url=url, error=f"{type(e).__name__}: {e}")
+
+    def fetch_many(self, urls: List[str], headers: Optional[List[Optional[Dict[str, str]]]] = None) -> List[FetchResult]:
+        """
+        并发下载一组页面，结果顺序与 urls 一致。headers 可以为每个 URL 指定额外的请求头 (例如条件请求头)。
+        只有主机限流器放行的 URL 才会提交到下载线程池；其余 URL 在调用线程上等待，直到其主机的退避结束、
+        令牌补充或并发槽释放。收到 429/503 时主机进入退避，退避结束后最多重试 max_retries 次；
+        退避时间达到上限时直接放弃。
+        """
+        headers = headers or [None] * len(urls)
+        results: List[Optional[FetchResult]] = [None] * len(urls)
+        attempts = [0] * len(urls)
+        hosts = [""] * len(urls)
+        # (索引, 首次被推迟的时间)；从未被推迟的 URL 不计入等待统计
+        waiting = []
+        for i, url in enumerate(urls):
+            try:
+                hosts[i] = urlsplit(url).hostname or ""
+                waiting.append((i, None))
+            except ValueError as e:
+                results[i] = FetchResult(url=url, error=f"InvalidURL: {e}")
+
+        running = {}
+        while waiting or running:
+            next_delay, deferred = None, []
+            for i, queued_at in waiting:
+                delay = self.rate_limiter.try_acquire(hosts[i], queued_at)
+                if delay <= 0:
+                    running[self._pool.submit(self._download, urls[i], headers[i])] = i
+                else:
+                    deferred.append((i, queued_at if queued_at is not None else time.monotonic()))
+                    next_delay = delay if next_delay is None else min(next_delay, delay)
+            waiting = deferred
+            if not running:
+                time.sleep(next_delay)
+                continue
+
+            done, _ = wait(running, timeout=next_delay, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = FetchResult(url=urls[i], error=f"{type(e).__name__}: {e}")
+                backoff = self.rate_limiter.record_response(hosts[i], result.status_code, result.headers.get("retry-after"))
+                self.rate_limiter.release(hosts[i])
+                attempts[i] += 1
+                if (result.status_code in THROTTLE_STATUS_CODES and attempts[i] <= self.max_retries
+                        and backoff < self.rate_limiter.max_backoff):
+                    waiting.append((i, time.monotonic()))
+                else:
+                    results[i] = result
+        return results
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+        self.client.close()
+
+_default_fetcher: Optional[PageFetcher] = None
+_default_fetcher_lock = threading.Lock()
+
+def get_page_fetcher() -> PageFetcher:
+    """
+    返回进程内共享的 PageFetcher，参数来自环境变量 FETCH_TIMEOUT、FETCH_MAX_BYTES、FETCH_MAX_WORKERS，
+    以及每个主机的请求速率 FETCH_HOST_RATE (次/秒) 和并发上限 FETCH_HOST_CONCURRENCY。
+    """
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            load_dotenv()
+            _default_fetcher = PageFetcher(
+                timeout=float(os.getenv('FETCH_TIMEOUT', '10')),
+                max_bytes=int(os.getenv('FETCH_MAX_BYTES', str(5 * 1024 * 1024))),
+                max_workers=int(os.getenv('FETCH_MAX_WORKERS', '16')),
+                rate_limiter=HostRateLimiter(
+                    rate=float(os.getenv('FETCH_HOST_RATE', '2')),
+                    max_concurrency=int(os.getenv('FETCH_HOST_CONCURRENCY', '4')),
+                ),
+            )
+        return _default_fetcher
+
+if __name__ == "__main__":
+    urls = ["https://www.python.org", "https://www.example.com", "https://httpbin.org/delay/1"]
+    fetcher = get_page_fetcher()
+    start = time.time()
+    for result in fetcher.fetch_many(urls):
+        print(result.url, result.status_code, len(result.content or b""), result.error)
+    print(f"Fetched {len(urls)} pages in {time.time() - start:.2f}s")
+    print(f"Rate limiter stats: {fetcher.rate_limiter.stats()}")
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines SimHash-based near-duplicate detection for extracted page content.
+Search hits often include syndicated copies of the same article; detecting them before storage and summarization
+saves RedisJSON space and summary tokens. A 64-bit SimHash is computed over word / CJK-character shingles, and two
+pages whose fingerprints differ in at most max_distance bits are treated as duplicates. Lookups use the classic
+banding trick: the fingerprint is split into max_distance + 1 bands, and by the pigeonhole principle a near
+duplicate must match at least one band exactly, so only those candidates are compared.
+"""
+import re
+import hashlib
+import threading
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from Data.mcp_models import WorkingMemory
+
+FINGERPRINT_BITS = 64
+
+# 拉丁字母/数字组成的词作为一个词元，每个中日韩字符单独作为一个词元
+_TOKEN_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]|[^\W_]+", re.UNICODE)
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.casefold())
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    计算文本的 64 位 SimHash 指纹。
+    """
+    tokens = _tokens(text)
+    if len(tokens) < shingle_size:
+        shingles = [" ".join(tokens)] if tokens else []
+    else:
+        shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+
+    weights = [0] * FINGERPRINT_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+class SimHashIndex:
+    """
+    分段索引：指纹被切分为 max_distance + 1 段，任一段完全相同的指纹才会被比较汉明距离。
+    """
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self._bands = max_distance + 1
+        self._band_bits = -(-FINGERPRINT_BITS // self._bands)
+        self._buckets: Dict[Tuple[int, int], List[Tuple[int, str]]] = defaultdict(list)
+
+    def _band_keys(self, fingerprint: int) -> List[Tuple[int, int]]:
+        mask = (1 << self._band_bits) - 1
+        return [(i, fingerprint >> (i * self._band_bits) & mask) for i in range(self._bands)]
+
+    def add(self, fingerprint: int, label: str) -> None:
+        for key in self._band_keys(fingerprint):
+            self._buckets[key].append((fingerprint, label))
+
+    def find(self, fingerprint: int) -> Optional[str]:
+        """
+        返回与指纹近似重复的已有条目标签，没有时返回 None。
+        """
+        for key in self._band_keys(fingerprint):
+            for candidate, label in self._buckets.get(key, ()):
+                if hamming_distance(candidate, fingerprint) <= self.max_distance:
+                    return label
+        return None
+
+class _SessionIndex:
+    """
+    一个会话的持久化指纹索引，synced 记录 content_fingerprints 中已加入索引的条目数。
+    """
+    def __init__(self, max_distance: int):
+        self.index = SimHashIndex(max_distance)
+        self.synced = 0
+        self.lock = threading.Lock()
+
+    def sync(self, seen: Dict[str, str]) -> None:
+        """
+        在持有 lock 时调用：把 content_fingerprints 中新增的条目 (字典保持插入顺序) 加入索引。
+        条目少于已同步的数量说明字典被替换或清空，此时重建索引。
+        """
+        if len(seen) < self.synced:
+            self.index = SimHashIndex(self.index.max_distance)
+            self.synced = 0
+        for fingerprint_hex, url in islice(seen.items(), self.synced, None):
+            self.index.add(int(fingerprint_hex, 16), url)
+        self.synced = len(seen)
+
+class NearDuplicateFilter:
+    """
+    过滤一次搜索结果中的近似重复页面，既在本次结果内部比较，也与会话中已收集的内容比较。
+    会话指纹保存在 WorkingMemory.content_fingerprints (指纹十六进制 -> URL) 中，
+    对应的分段索引随 WorkingMemory 一起保存并增量更新，每次过滤只处理新增的指纹。
+    检查与登记在该会话索引的锁内完成，避免并行执行的搜索命令同时保留同一篇文章；不同会话互不阻塞。
+    """
+    _create_lock = threading.Lock()
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+
+    def _session_index(self, working_memory: Optional[WorkingMemory]) -> _SessionIndex:
+        if working_memory is None:
+            return _SessionIndex(self.max_distance)
+        with self._create_lock:
+            if working_memory._duplicate_index is None:
+                working_memory._duplicate_index = _SessionIndex(self.max_distance)
+            return working_memory._duplicate_index
+
+    def filter(self, results: List[dict], working_memory: Optional[WorkingMemory] = None) -> Tuple[List[dict], List[dict]]:
+        """
+        results 中每项需包含 "url" 和 "content"。
+        返回 (保留的结果, 重复项)，重复项的格式为 {"url": ..., "duplicate_of": 原始URL}。
+        传入 working_memory 时，保留的结果会登记到其 content_fingerprints 中。
+        """
+        fingerprints = [simhash(item["content"]) for item in results]
+        seen = working_memory.content_fingerprints if working_memory is not None else {}
+        session = self._session_index(working_memory)
+        unique, duplicates = [], []
+        with session.lock:
+            session.sync(seen)
+            for item, fingerprint in zip(results, fingerprints):
+                original = session.index.find(fingerprint)
+                if original is not None:
+                    duplicates.append({"url": item["url"], "duplicate_of": original})
+                    continue
+                session.index.add(fingerprint, item["url"])
+                unique.append(item)
+                seen[f"{fingerprint:016x}"] = item["url"]
+                session.synced += 1
+        return unique, duplicates
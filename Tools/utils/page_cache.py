@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines the PageCache used by WebSearchTool.
+Popular URLs come back from DDGS across commands, cycles and sessions. The cache stores the extracted text of a
+page together with its ETag / Last-Modified validators, keyed by the normalized URL. Within the TTL an entry is
+served directly; after that it is revalidated with a conditional GET, and a 304 reuses the stored text without
+downloading or extracting the page again. The backing store is a CacheInterface (disk or Redis), so all worker
+processes share it and eviction by total bytes is handled there.
+"""
+import os
+import time
+import threading
+import hashlib
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from dotenv import load_dotenv
+
+from Interfaces.cache_interface import CacheInterface, create_cache
+from Interfaces.database_interface import RedisClient
+
+# 不影响页面内容的跟踪参数
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "spm", "from", "ref"}
+
+def normalize_url(url: str) -> str:
+    """
+    规范化URL：协议和主机小写、去掉默认端口和片段、删除跟踪参数并对查询参数排序。
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+class PageCache:
+    """
+    带条件重验证的页面正文缓存。
+    条目格式: {"url", "content", "etag", "last_modified", "validated_at"}。
+    ttl 内的条目视为新鲜；过期条目仍保留 (直到 retention 到期或被容量淘汰)，用于发起条件请求。
+    """
+    def __init__(self, cache: CacheInterface, ttl: float = 24 * 3600, retention: float = 30 * 24 * 3600):
+        self.cache = cache
+        self.ttl = ttl
+        self.retention = retention
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.cache.get(self._key(url))
+        except Exception as e:
+            print(f"PageCache read error: {e}")
+            return None
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("validated_at", 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        根据缓存条目构造条件请求头，没有校验器时返回空字典。
+        """
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, content: str, headers: Dict[str, str]) -> None:
+        """
+        保存提取后的正文以及响应中的校验器。
+        """
+        headers = {k.lower(): v for k, v in headers.items()}
+        entry = {
+            "url": url,
+            "content": content,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "validated_at": time.time(),
+        }
+        self._write(url, entry)
+
+    def revalidated(self, url: str, entry: Dict[str, Any], headers: Dict[str, str]) -> None:
+        """
+        服务器返回 304 后刷新条目的验证时间 (以及可能更新的校验器)。
+        """
+        headers = {k.lower(): v for k, v in headers.items()}
+        entry = dict(entry)
+        entry["etag"] = headers.get("etag") or entry.get("etag")
+        entry["last_modified"] = headers.get("last-modified") or entry.get("last_modified")
+        entry["validated_at"] = time.time()
+        self._write(url, entry)
+
+    def _write(self, url: str, entry: Dict[str, Any]) -> None:
+        try:
+            self.cache.set(self._key(url), entry, self.retention)
+        except Exception as e:
+            print(f"PageCache write error: {e}")
+
+def create_page_cache(db_interface: RedisClient = None) -> PageCache:
+    """
+    创建页面缓存，存储后端由 CACHE_BACKEND 决定；PAGE_CACHE_TTL 为重验证间隔 (秒)，PAGE_CACHE_MAX_BYTES 为容量上限。
+    """
+    load_dotenv()
+    ttl = float(os.getenv('PAGE_CACHE_TTL', str(24 * 3600)))
+    max_bytes = int(os.getenv('PAGE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+    retention = 30 * 24 * 3600
+    return PageCache(create_cache("pages", default_ttl=retention, max_bytes=max_bytes, db_interface=db_interface), ttl, retention)
+
+_default_page_cache: Optional[PageCache] = None
+_default_page_cache_lock = threading.Lock()
+
+def get_page_cache(db_interface: RedisClient = None) -> PageCache:
+    """
+    返回进程内共享的页面缓存，首次调用时通过 create_page_cache 创建。
+    所有 WebSearchTool 实例共用同一个 SQLite 连接 (或 RedisCache)，而不是每个命令各开一个。
+    """
+    global _default_page_cache
+    with _default_page_cache_lock:
+        if _default_page_cache is None:
+            _default_page_cache = create_page_cache(db_interface)
+        return _default_page_cache
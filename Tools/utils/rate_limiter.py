@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines the per-host politeness limiter used by PageFetcher.
+When many web_search commands run in parallel, several of them hit the same site. Every host gets a token bucket
+(requests per second with a small burst) and a cap on concurrent requests; other hosts are unaffected, so overall
+fetch throughput stays high. A 429/503 response pauses the host (honoring Retry-After, otherwise exponential
+backoff) and halves its rate, which then recovers additively on successful responses.
+Admission is non-blocking (try_acquire returns how long to wait), so the fetcher defers a URL whose host is not
+ready instead of parking one of its shared download threads on it.
+"""
+import time
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+# 主机并发槽已满时的重新检查间隔 (秒)：槽位由其他请求释放，没有可预知的等待时间
+SLOT_POLL_INTERVAL = 0.05
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 头，支持秒数和 HTTP 日期两种格式，无法解析时返回 None。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class _HostState:
+    """
+    单个主机的限流状态。
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.strikes = 0
+
+class HostRateLimiter:
+    """
+    按主机的令牌桶 + 并发上限 + 自适应退避。
+    try_acquire(host) 不阻塞：可以立即发请求时占用一个并发槽并返回 0，否则返回建议的等待秒数；
+    请求结束后调用 release(host)，并通过 record_response(host, ...) 调整该主机的速率与退避。
+    主机状态保存在容量为 max_hosts 的 LRU 中，空闲且未处于退避的主机会被淘汰。
+    """
+    def __init__(self, rate: float = 2.0, burst: int = 4, max_concurrency: int = 4,
+                 min_rate: float = 0.2, base_backoff: float = 1.0, max_backoff: float = 60.0, max_hosts: int = 1024):
+        self.base_rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_rate = min_rate
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_hosts = max_hosts
+
+        self._hosts: "OrderedDict[str, _HostState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "throttled_responses": 0, "waits": 0, "wait_seconds": 0.0}
+        self._throttled_hosts: Dict[str, int] = {}
+
+    def _state(self, host: str) -> _HostState:
+        """
+        在持有 _lock 时调用：返回主机状态并将其标记为最近使用，超出容量时淘汰最久未用的空闲主机。
+        """
+        state = self._hosts.get(host)
+        if state is not None:
+            self._hosts.move_to_end(host)
+            return state
+        state = _HostState(self.base_rate, self.burst)
+        self._hosts[host] = state
+        self._evict_idle()
+        return state
+
+    def _evict_idle(self) -> None:
+        """
+        在持有 _lock 时调用：主机数超过 max_hosts 时，从最久未用的开始淘汰没有进行中请求且不在退避中的主机。
+        """
+        if len(self._hosts) <= self.max_hosts:
+            return
+        now = time.monotonic()
+        for name in list(self._hosts)[:-1]:
+            if len(self._hosts) <= self.max_hosts:
+                break
+            state = self._hosts[name]
+            if state.in_flight == 0 and state.blocked_until <= now:
+                del self._hosts[name]
+
+    def try_acquire(self, host: str, queued_at: Optional[float] = None) -> float:
+        """
+        尝试占用该主机的一个并发槽并消耗一个令牌。
+        成功时返回 0 (之后必须调用 release)；否则返回距离下次可能成功的秒数 (退避剩余时间或令牌补充时间)。
+        queued_at 为请求开始排队的 time.monotonic() 时间，用于统计等待时长。
+        """
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            delay = state.blocked_until - now
+            if delay > 0:
+                return delay
+            if state.in_flight >= self.max_concurrency:
+                return SLOT_POLL_INTERVAL
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * state.rate)
+            state.updated = now
+            if state.tokens < 1:
+                return (1 - state.tokens) / state.rate
+
+            state.tokens -= 1
+            state.in_flight += 1
+            self._stats["requests"] += 1
+            waited = now - queued_at if queued_at is not None else 0.0
+            if waited > 0.001:
+                self._stats["waits"] += 1
+                self._stats["wait_seconds"] += waited
+            return 0.0
+
+    def release(self, host: str) -> None:
+        """
+        释放 try_acquire 占用的并发槽。
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None:
+                state.in_flight = max(0, state.in_flight - 1)
+            self._evict_idle()
+
+    def record_response(self, host: str, status_code: Optional[int], retry_after: Optional[str] = None) -> float:
+        """
+        根据响应状态调整主机限流，返回该主机需要暂停的秒数 (未被限流时为 0)。
+        """
+        with self._lock:
+            state = self._state(host)
+            if status_code not in THROTTLE_STATUS_CODES:
+                if status_code is not None and status_code < 400:
+                    state.strikes = 0
+                    state.rate = min(self.base_rate, state.rate + self.base_rate / 10)
+                return 0.0
+
+            state.strikes += 1
+            state.rate = max(self.min_rate, state.rate / 2)
+            backoff = parse_retry_after(retry_after)
+            if backoff is None:
+                backoff = self.base_backoff * 2 ** (state.strikes - 1)
+            backoff = min(backoff, self.max_backoff)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + backoff)
+            state.tokens = 0.0
+
+            self._stats["throttled_responses"] += 1
+            self._throttled_hosts[host] = self._throttled_hosts.get(host, 0) + 1
+        print(f"HostRateLimiter: {host} returned {status_code}, backing off {backoff:.1f}s")
+        return backoff
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回请求数、被限流的响应数、等待次数与累计等待时间，以及每个主机被限流的次数。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["throttled_hosts"] = dict(self._throttled_hosts)
+            stats["host_rates"] = {host: state.rate for host, state in self._hosts.items() if state.rate < self.base_rate}
+        return stats
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+This file defines the search-result cache and the shared DDGS sessions used by WebSearchTool.
+The task planner often emits the same keyword set in a different order (["保守","投资策略"] and
+["投资策略","保守"]), so results are cached under a normalized query: keywords are stripped, case-folded,
+de-duplicated and sorted, and combined with num_results. DDGS instances keep their search-engine clients
+(and HTTP connections) between calls, so one instance is reused per thread instead of opening a fresh one per command.
+"""
+import os
+import hashlib
+import threading
+from typing import List, Optional
+
+from ddgs import DDGS
+from dotenv import load_dotenv
+
+from Interfaces.cache_interface import CacheInterface, create_cache
+from Interfaces.database_interface import RedisClient
+
+def normalize_query(keywords: list, num_results: int) -> str:
+    """
+    规范化搜索请求：去除空白、大小写折叠、去重并排序关键词，再附加结果数量。
+    """
+    terms = sorted({str(k).strip().casefold() for k in keywords if str(k).strip()})
+    return f"{num_results}|" + "\x1f".join(terms)
+
+class SearchCache:
+    """
+    以规范化查询为键缓存 DDGS 返回的URL列表，条目在 ttl 秒后过期。
+    """
+    def __init__(self, cache: CacheInterface, ttl: float = 6 * 3600):
+        self.cache = cache
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(keywords: list, num_results: int) -> str:
+        return hashlib.sha256(normalize_query(keywords, num_results).encode('utf-8')).hexdigest()
+
+    def get(self, keywords: list, num_results: int) -> Optional[List[str]]:
+        try:
+            return self.cache.get(self._key(keywords, num_results))
+        except Exception as e:
+            print(f"SearchCache read error: {e}")
+            return None
+
+    def set(self, keywords: list, num_results: int, urls: List[str]) -> None:
+        try:
+            self.cache.set(self._key(keywords, num_results), urls, self.ttl)
+        except Exception as e:
+            print(f"SearchCache write error: {e}")
+
+def create_search_cache(db_interface: RedisClient = None) -> SearchCache:
+    """
+    创建搜索结果缓存，存储后端由 CACHE_BACKEND 决定，过期时间来自 SEARCH_CACHE_TTL (秒)。
+    """
+    load_dotenv()
+    ttl = float(os.getenv('SEARCH_CACHE_TTL', str(6 * 3600)))
+    return SearchCache(create_cache("search", default_ttl=ttl, max_bytes=64 * 1024 * 1024, db_interface=db_interface), ttl)
+
+_default_search_cache: Optional[SearchCache] = None
+_default_search_cache_lock = threading.Lock()
+
+def get_search_cache(db_interface: RedisClient = None) -> SearchCache:
+    """
+    返回进程内共享的搜索结果缓存，首次调用时通过 create_search_cache 创建。
+    """
+    global _default_search_cache
+    with _default_search_cache_lock:
+        if _default_search_cache is None:
+            _default_search_cache = create_search_cache(db_interface)
+        return _default_search_cache
+
+_thread_local = threading.local()
+
+def get_ddgs() -> DDGS:
+    """
+    返回当前线程复用的 DDGS 实例 (DDGS 不保证线程安全，因此每个线程一个)。
+    """
+    ddgs = getattr(_thread_local, "ddgs", None)
+    if ddgs is None:
+        ddgs = DDGS()
+        _thread_local.ddgs = ddgs
+    return ddgs
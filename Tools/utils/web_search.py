@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from bs4 import BeautifulSoup
-from ddgs import DDGS
 import requests
 import json
 import time
 import random
-from trafilatura import fetch_url, extract
 from typing import Optional
+from Tools.utils.http_fetcher import get_page_fetcher
+from Tools.utils.content_extractor import get_content_extractor
+from Tools.utils.page_cache import get_page_cache
+from Tools.utils.search_cache import get_search_cache, get_ddgs
+from Tools.utils.near_duplicate import NearDuplicateFilter
 from Interfaces.llm_api_interface import OpenAIInterface
 from Interfaces.database_interface import RedisClient
 from Tools.utils.base_tool import BaseTool
@@ -28,6 +31,9 @@ class WebSearchTool(BaseTool):
             print("WebSearchTool: No database interface provided!")
         else:
             print(f"WebSearchTool: Database interface connected with host: {self.db_interface.host}, port: {self.db_interface.port}, db: {self.db_interface.db}")
+        self.page_cache = get_page_cache(self.db_interface)
+        self.search_cache = get_search_cache(self.db_interface)
+        self.duplicate_filter = NearDuplicateFilter()
 
     def execute(self, mcp: MCP, executable_command: ExecutableCommand, **kwargs) -> dict:
         try:
@@ -45,10 +51,24 @@ class WebSearchTool(BaseTool):
             content_results = self._search_and_extract(keywords, num_results)
             if not content_results:
                 return {"error": "No search results found"}
+
+            # 丢弃本次结果内部以及与会话中已收集内容近似重复的页面，只保留指向原始页面的链接
+            content_results, duplicates = self.duplicate_filter.filter(content_results, kwargs.get("working_memory"))
+            if duplicates:
+                print(f"WebSearchTool: Dropped {len(duplicates)} near-duplicate pages: {duplicates}")
+            if not content_results:
+                return {"duplicate_of": [item["duplicate_of"] for item in duplicates]}
+
             raw_data_str = json.dumps(content_results, indent=2, ensure_ascii=False)
             data_key = f"{mcp.session_id}:{mcp.global_cycle_count}:{self.tool_id}:{self.instance_id}"
-            self.db_interface.store_data(data_key, content_results)
-            summary = self.llm_summarizer.process(mcp, raw_data=raw_data_str)
+            self.db_interface.store_data(data_key, content_results + duplicates)
+            sub_goal = mcp.get_sub_goal(executable_command.parent_sub_goal_id)
+            query = " ".join(str(k) for k in keywords if k)
+            if sub_goal:
+                query = f"{query} {sub_goal.description}"
+            # 由执行器调用时使用其批量总结入口，与同时完成的其他命令合并为一次批量调用
+            summarize = kwargs.get("summarize") or self.llm_summarizer.process
+            summary = summarize(mcp, raw_data=raw_data_str, query=query)
             return {
                 data_key: summary
             }
@@ -61,21 +81,14 @@ class WebSearchTool(BaseTool):
 
     def _search_and_extract(self, keywords: list, num_results: int) -> list[dict]:
         try:
-            query = " ".join(str(k) for k in keywords if k)
+            urls = self._search(keywords, num_results)
+
             results = []
-            
-            with DDGS() as ddgs:
-                for hit in ddgs.text(query, max_results=num_results):
-                    url = hit.get("href")
-                    if not url:
-                        continue
-                    
-                    content = self._trafilatura_extract(url)
-                    if content:
-                        results.append({"url": url, "content": content})
-                    else:
-                        print(f"WebSearchTool: Skipping {url} after failed retries")
-                        continue
+            for url, content in zip(urls, self._fetch_contents(urls)):
+                if content:
+                    results.append({"url": url, "content": content})
+                else:
+                    print(f"WebSearchTool: Skipping {url} after failed download or extraction")
             
             return results
             
@@ -85,15 +98,52 @@ class WebSearchTool(BaseTool):
             traceback.print_exc()
             return []
 
-    def _trafilatura_extract(self, url: str) -> Optional[str]:
-        try:
-            downloaded = fetch_url(url)
-            content = extract(downloaded)
-            print(content)
-            return content
-        except Exception as e:
-            print(f"WebSearchTool trafilatura extract error: {e}")
-            return None
+    def _search(self, keywords: list, num_results: int) -> list[str]:
+        """
+        返回搜索命中的URL列表，相同 (或仅顺序、大小写不同) 的关键词组合直接命中缓存。
+        """
+        urls = self.search_cache.get(keywords, num_results)
+        if urls is not None:
+            print(f"WebSearchTool: Search cache hit for {keywords}")
+            return urls
+
+        query = " ".join(str(k) for k in keywords if k)
+        urls = [hit.get("href") for hit in get_ddgs().text(query, max_results=num_results) if hit.get("href")]
+        if urls:
+            self.search_cache.set(keywords, num_results, urls)
+        return urls
+
+    def _fetch_contents(self, urls: list[str]) -> list[Optional[str]]:
+        """
+        获取每个URL的正文，结果顺序与 urls 一致。
+        缓存中新鲜的条目直接使用；过期条目发起条件请求，304 时复用缓存正文；
+        其余页面通过共享连接池并发下载，再交给进程池并行提取正文并写入缓存。
+        """
+        entries = [self.page_cache.get(url) for url in urls]
+        contents = [entry["content"] if entry and self.page_cache.is_fresh(entry) else None for entry in entries]
+        to_fetch = [i for i, content in enumerate(contents) if content is None]
+
+        pages = get_page_fetcher().fetch_many(
+            [urls[i] for i in to_fetch],
+            [self.page_cache.conditional_headers(entries[i]) for i in to_fetch]
+        )
+        to_extract = []
+        for i, page in zip(to_fetch, pages):
+            if page.status_code == 304 and entries[i]:
+                contents[i] = entries[i]["content"]
+                self.page_cache.revalidated(urls[i], entries[i], page.headers)
+            elif page.ok:
+                to_extract.append((i, page))
+            else:
+                print(f"WebSearchTool: Failed to fetch {page.url} ({page.error or page.status_code})")
+
+        # 正文提取是 CPU 密集型的，交给进程池并行执行
+        extracted = get_content_extractor().extract_many([page.content for _, page in to_extract])
+        for (i, page), content in zip(to_extract, extracted):
+            contents[i] = content
+            if content:
+                self.page_cache.store(urls[i], content, page.headers)
+        return contents
 
 if __name__ == "__main__":
     url = "https://www.sohu.com/a/924444987_121991261"
@@ -101,5 +151,5 @@ if __name__ == "__main__":
     llm_api_interface = OpenAIInterface()
     llm_summarizer = LLMFilterSummary(llm_api_interface)
     tool = WebSearchTool(db_interface, llm_summarizer)
-    content = tool._trafilatura_extract(url)
+    content = tool._fetch_contents([url])[0]
     print(content)
\ No newline at end of file
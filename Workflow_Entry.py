@@ -42,31 +42,19 @@ class AgentWorkflow:
         # 工具已经在ToolRegistry中自动注册，无需额外注册
 
     def _find_next_command(self) -> Optional[ExecutableCommand]:
-        """查找下一个未执行的命令。"""
-        for command in self.mcp.executable_commands:
-            if not command.is_completed:
-                return command
-        return None
+        """
+        查找下一个依赖已全部完成的未执行命令，优先选择父战略计划优先级更高的命令，同优先级按列表顺序。
+        如果剩余命令都在等待依赖 (例如依赖成环)，则退回到第一个未执行的命令，避免工作流卡死。
+        """
+        return self.mcp.next_ready_command()
 
     def _update_completion_status(self, completed_command: ExecutableCommand):
-        """更新命令、子目标和战略计划的完成状态。"""
-        completed_command.is_completed = True
-
-        # 检查父子目标是否完成
-        sub_goal = next((sg for sg in self.mcp.sub_goals if sg.id == completed_command.parent_sub_goal_id), None)
+        """更新命令、子目标和战略计划的完成状态 (由 MCP 的索引完成 O(1) 的逐级传播)。"""
+        sub_goal, strategy_plan = self.mcp.mark_command_completed(completed_command)
         if sub_goal:
-            all_commands_for_sub_goal = [cmd for cmd in self.mcp.executable_commands if cmd.parent_sub_goal_id == sub_goal.id]
-            if all(cmd.is_completed for cmd in all_commands_for_sub_goal):
-                sub_goal.is_completed = True
-                print(f"--- Sub-goal '{sub_goal.description}' COMPLETED ---")
-
-                # 检查父战略计划是否完成
-                strategy_plan = next((sp for sp in self.mcp.strategy_plans if sp.id == sub_goal.parent_strategy_plan_id), None)
-                if strategy_plan:
-                    all_sub_goals_for_plan = [sg for sg in self.mcp.sub_goals if sg.parent_strategy_plan_id == strategy_plan.id]
-                    if all(sg.is_completed for sg in all_sub_goals_for_plan):
-                        strategy_plan.is_completed = True
-                        print(f"--- Strategy Plan '{strategy_plan.description}' COMPLETED ---")
+            print(f"--- Sub-goal '{sub_goal.description}' COMPLETED ---")
+        if strategy_plan:
+            print(f"--- Strategy Plan '{strategy_plan.description}' COMPLETED ---")
 
     def run(self):
         """
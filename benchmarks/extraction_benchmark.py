@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+正文提取吞吐量基准测试。
+对本地 HTML 语料 (默认自动生成) 分别用 1, 2, 4, ... 个工作进程运行 ContentExtractor，
+输出每秒提取的页面数以及相对单进程的加速比。
+
+用法:
+    python benchmarks/extraction_benchmark.py [--corpus DIR] [--pages N] [--rounds R]
+--corpus 指定一个包含 *.html 文件的目录；未指定时生成 N 个合成页面。
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Tools.utils.content_extractor import ContentExtractor
+
+WORDS = ("market investment strategy risk portfolio growth analysis data report policy "
+         "投资 策略 风险 市场 增长 分析 数据 报告 政策 收益").split()
+
+def synthetic_page(seed: int, paragraphs: int = 60) -> bytes:
+    """
+    生成一个带导航、侧栏和正文的合成新闻页面。
+    """
+    rng = random.Random(seed)
+    body = "".join(
+        f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 90)))}.</p>"
+        for _ in range(paragraphs)
+    )
+    nav = "".join(f"<li><a href='/s/{i}'>{rng.choice(WORDS)}</a></li>" for i in range(40))
+    return (
+        f"<html><head><title>Article {seed}</title></head><body>"
+        f"<nav><ul>{nav}</ul></nav><div class='sidebar'><ul>{nav}</ul></div>"
+        f"<article><h1>Article {seed}</h1>{body}</article>"
+        f"<footer>Copyright {seed}</footer></body></html>"
+    ).encode("utf-8")
+
+def load_corpus(corpus_dir: str, pages: int) -> list[bytes]:
+    if corpus_dir:
+        files = sorted(glob.glob(os.path.join(corpus_dir, "*.html")))
+        if not files:
+            raise SystemExit(f"No *.html files found in {corpus_dir}")
+        corpus = []
+        for path in files:
+            with open(path, "rb") as f:
+                corpus.append(f.read())
+        return corpus
+    return [synthetic_page(i) for i in range(pages)]
+
+def worker_counts() -> list[int]:
+    cores = os.cpu_count() or 1
+    counts, n = [], 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    counts.append(cores)
+    return counts
+
+def run(corpus: list[bytes], workers: int, rounds: int) -> float:
+    """
+    返回给定工作进程数下的吞吐量 (页/秒)，进程启动开销通过预热排除在计时之外。
+    """
+    extractor = ContentExtractor(max_workers=workers)
+    try:
+        extractor.extract_many(corpus[:workers])
+        start = time.perf_counter()
+        for _ in range(rounds):
+            extractor.extract_many(corpus)
+        elapsed = time.perf_counter() - start
+    finally:
+        extractor.shutdown()
+    return len(corpus) * rounds / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark process-pool content extraction")
+    parser.add_argument("--corpus", default="", help="directory with *.html files")
+    parser.add_argument("--pages", type=int, default=200, help="number of synthetic pages")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.pages)
+    size_mb = sum(len(page) for page in corpus) / 1024 / 1024
+    print(f"Corpus: {len(corpus)} pages, {size_mb:.1f} MB, {os.cpu_count()} cores")
+
+    baseline = None
+    for workers in worker_counts():
+        throughput = run(corpus, workers, args.rounds)
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {throughput:8.1f} pages/s  speedup x{throughput / baseline:.2f}")
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+LLMFilterSummary 测试：带查询的大输入经过相关性预筛选后仍然走 map-reduce，而不是被压缩到单个块。
+"""
+import json
+from typing import List
+
+from Entities.filter_summary import LLMFilterSummary
+from Interfaces.llm_api_interface import LLMAPIInterface
+
+class RecordingInterface(LLMAPIInterface):
+    """
+    记录每次调用的 prompt，返回固定的摘要。claude 前缀的模型名使 token 计数使用离线启发式估算。
+    """
+    provider = "fake"
+    model_env_var = None
+    default_model = "claude-test"
+
+    def __init__(self):
+        self.prompts: List[str] = []
+
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}"
+
+def relevant(i: int) -> str:
+    return f"Solar panel efficiency report {i}: perovskite solar cells reached a new efficiency record in field tests."
+
+def irrelevant(i: int) -> str:
+    return f"Unrelated paragraph {i} about cooking pasta, boiling water and adding salt before serving dinner."
+
+def documents(pages: int, paragraphs: int) -> str:
+    docs = []
+    for page in range(pages):
+        lines = [relevant(page * paragraphs + i) if i % 2 == 0 else irrelevant(page * paragraphs + i) for i in range(paragraphs)]
+        docs.append({"url": f"https://example.com/{page}", "content": "\n".join(lines)})
+    return json.dumps(docs, ensure_ascii=False, indent=2)
+
+def make_summarizer(monkeypatch, chunk_tokens=300, fan_out=2) -> LLMFilterSummary:
+    for name in ("SUMMARY_CHUNK_TOKENS", "SUMMARY_FAN_OUT", "SUMMARY_PASSAGE_TOKENS", "SUMMARY_PASSAGE_TOP_K"):
+        monkeypatch.delenv(name, raising=False)
+    return LLMFilterSummary(RecordingInterface(), chunk_tokens=chunk_tokens, fan_out=fan_out)
+
+def test_long_query_input_is_filtered_and_reaches_reduce(monkeypatch):
+    """
+    使用默认的块大小与并行度：相关内容多于一个块时，筛选结果必须被切块并经过 reduce。
+    """
+    summarizer = make_summarizer(monkeypatch, chunk_tokens=None, fan_out=None)
+    reduced = []
+    original_reduce = summarizer._reduce
+    monkeypatch.setattr(summarizer, "_reduce", lambda parts, budget: reduced.append(parts) or original_reduce(parts, budget))
+
+    raw_data = documents(pages=10, paragraphs=60)
+    budget = summarizer._prompt_budget()
+    capacity = summarizer.fan_out * summarizer._chunk_budget(budget)
+    assert budget.count(raw_data) > capacity
+
+    summary = summarizer.process(None, raw_data, query="solar efficiency")
+
+    assert reduced and len(reduced[0]) > 1
+    assert summary
+    map_prompts = summarizer.llm_interface.prompts[:len(reduced[0])]
+    assert all("cooking pasta" not in prompt for prompt in map_prompts)
+
+def test_pre_filter_keeps_up_to_map_reduce_capacity(monkeypatch):
+    summarizer = make_summarizer(monkeypatch)
+    budget = summarizer._prompt_budget()
+    filtered = summarizer._select_passages(documents(pages=4, paragraphs=30), "solar efficiency", budget)
+
+    assert budget.count(filtered) > summarizer._chunk_budget(budget)
+    assert budget.count(filtered) <= summarizer._passage_budget(budget) * 1.2
+    assert "cooking pasta" not in filtered
+
+def test_input_within_capacity_is_not_filtered(monkeypatch):
+    summarizer = make_summarizer(monkeypatch, chunk_tokens=3000, fan_out=4)
+    raw_data = documents(pages=2, paragraphs=6)
+    assert summarizer._select_passages(raw_data, "solar efficiency", summarizer._prompt_budget()) == raw_data
+
+def test_passage_tokens_env_caps_the_pre_filter(monkeypatch):
+    summarizer = make_summarizer(monkeypatch)
+    summarizer.passage_tokens = 200
+    budget = summarizer._prompt_budget()
+    filtered = summarizer._select_passages(documents(pages=4, paragraphs=30), "solar efficiency", budget)
+
+    assert summarizer._passage_budget(budget) == 200
+    assert budget.count("\n".join(doc["content"] for doc in json.loads(filtered))) <= 200
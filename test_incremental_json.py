@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+IncrementalJSONParser 测试：任意位置切分的文本增量 (字符串、转义序列、数字中间) 与一次性输入的结果一致。
+"""
+import json
+
+from Entities.utils.incremental_json import IncrementalJSONParser
+
+PLAN_PATHS = [
+    ("sub_goals", "*", "parent_strategy_plan_id"),
+    ("sub_goals", "*", "description"),
+    ("sub_goals", "*", "executable_commands", "*"),
+    ("sub_goals", "*"),
+]
+
+DOCUMENT = {
+    "sub_goals": [
+        {
+            "description": "引号 \" 反斜杠 \\ 换行 \n unicode é 😀",
+            "executable_commands": [
+                {"tool": "web_search", "params": {"keywords": ["a", "b"], "num_results": 12}, "depends_on": []},
+                {"tool": "web_search", "params": {"keywords": ["c"], "num_results": -3.5e2, "flag": True, "x": None}},
+            ],
+            # 父计划ID出现在命令之后
+            "parent_strategy_plan_id": "sp_1",
+        },
+        {"parent_strategy_plan_id": "sp_2", "description": "empty", "executable_commands": []},
+    ]
+}
+
+def feed_all(parser: IncrementalJSONParser, deltas):
+    events = []
+    for delta in deltas:
+        events.extend(parser.feed(delta))
+    return events
+
+def expected_events():
+    events = []
+    for i, sub_goal in enumerate(DOCUMENT["sub_goals"]):
+        for key, value in sub_goal.items():
+            if key == "executable_commands":
+                events.extend((("sub_goals", i, key, j), command) for j, command in enumerate(value))
+            else:
+                events.append((("sub_goals", i, key), value))
+        events.append((("sub_goals", i), sub_goal))
+    return events
+
+def test_single_feed_emits_watched_values_in_order():
+    text = json.dumps(DOCUMENT, ensure_ascii=False)
+    parser = IncrementalJSONParser(PLAN_PATHS)
+    assert parser.feed(text) == expected_events()
+    assert parser.is_complete
+
+def test_every_split_point_gives_same_events():
+    """
+    在每一个位置把文本切成两段，覆盖切在字符串、转义序列、\\u 转义和数字中间的情况。
+    """
+    text = json.dumps(DOCUMENT, ensure_ascii=True)
+    for split in range(1, len(text)):
+        parser = IncrementalJSONParser(PLAN_PATHS)
+        assert feed_all(parser, [text[:split], text[split:]]) == expected_events(), split
+
+def test_character_by_character_feed():
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=2)
+    parser = IncrementalJSONParser(PLAN_PATHS)
+    assert feed_all(parser, list(text)) == expected_events()
+
+def test_value_is_emitted_as_soon_as_it_closes():
+    parser = IncrementalJSONParser([("sub_goals", "*", "executable_commands", "*")])
+    assert parser.feed('{"sub_goals": [{"executable_commands": [{"tool": "web_se') == []
+    assert parser.feed('arch"}, {"tool"') == [(("sub_goals", 0, "executable_commands", 0), {"tool": "web_search"})]
+    assert not parser.is_complete
+
+def test_number_is_emitted_only_when_terminated():
+    parser = IncrementalJSONParser([("n",)])
+    assert parser.feed('{"n": 12') == []
+    assert parser.feed('34') == []
+    assert parser.feed('}') == [(("n",), 1234)]
+
+def test_escaped_quote_split_across_deltas():
+    parser = IncrementalJSONParser([("s",)])
+    assert parser.feed('{"s": "a\\') == []
+    assert parser.feed('"b"') == [(("s",), 'a"b')]
+
+def test_nested_and_unwatched_keys_are_ignored():
+    parser = IncrementalJSONParser([("a", "b")])
+    text = '{"x": {"b": 1}, "a": {"c": [1, {"b": 2}], "b": [3, 4]}}'
+    assert parser.feed(text) == [(("a", "b"), [3, 4])]
+
+def test_text_around_the_json_value_is_ignored():
+    parser = IncrementalJSONParser([("k",)])
+    events = feed_all(parser, ["```json\n{\"k\"", ": \"v\"}\n```", " trailing {\"k\": 2}"])
+    assert events == [(("k",), "v")]
+    assert parser.is_complete
+
+def test_truncated_input_emits_only_closed_values():
+    text = json.dumps(DOCUMENT, ensure_ascii=False)
+    cut = text.index('"num_results": -350')
+    parser = IncrementalJSONParser(PLAN_PATHS)
+    events = parser.feed(text[:cut])
+    assert [path for path, _ in events] == [("sub_goals", 0, "description"), ("sub_goals", 0, "executable_commands", 0)]
+    assert not parser.is_complete
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 调用弹性组件的确定性测试：熔断器 (注入时钟)、完全抖动退避 (注入随机数) 以及 AIMD 并发限制 (注入时钟)。
+"""
+import random
+
+import pytest
+
+from Interfaces.llm_api_interface import (
+    CircuitBreaker, RetryPolicy, LLMCircuitOpenError, LLMRateLimitError, LLMRequestError, LLMServerError
+)
+from Interfaces.llm_concurrency import AdaptiveConcurrencyLimiter
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+class BoundRandom:
+    """uniform(a, b) 总是返回区间的一端，用于检查退避的上下界。"""
+    def __init__(self, upper: bool):
+        self.upper = upper
+
+    def uniform(self, a: float, b: float) -> float:
+        return b if self.upper else a
+
+class Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+class Overloaded(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: str = None):
+        super().__init__("429 Too Many Requests")
+        self.response = Response({"retry-after": retry_after} if retry_after else {})
+
+def overload() -> LLMRateLimitError:
+    return LLMRateLimitError("rate limited", "fake", 429)
+
+# ----------------------------------------------------------------------
+# CircuitBreaker
+# ----------------------------------------------------------------------
+def make_breaker(threshold: int = 3, reset: float = 30.0):
+    clock = FakeClock(100.0)
+    return CircuitBreaker("fake", failure_threshold=threshold, reset_timeout=reset, clock=clock), clock
+
+def test_breaker_opens_after_consecutive_retryable_failures():
+    breaker, clock = make_breaker()
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure(overload())
+    assert breaker.state == "closed"
+
+    breaker.before_call()
+    breaker.record_failure(LLMServerError("boom", "fake", 500))
+    assert breaker.state == "open"
+
+    clock.advance(10)
+    with pytest.raises(LLMCircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(20)
+    assert breaker.stats()["rejected"] == 1
+
+def test_breaker_ignores_request_errors_and_resets_on_success():
+    breaker, _ = make_breaker()
+    breaker.record_failure(overload())
+    breaker.record_failure(overload())
+    breaker.record_failure(LLMRequestError("bad request", "fake", 400))
+    breaker.record_success()
+    breaker.record_failure(overload())
+    breaker.record_failure(overload())
+    assert breaker.state == "closed"
+    assert breaker.stats()["consecutive_failures"] == 2
+
+def open_breaker():
+    breaker, clock = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(overload())
+    assert breaker.state == "open"
+    clock.advance(30)
+    assert breaker.state == "half_open"
+    return breaker, clock
+
+def test_half_open_admits_a_single_probe_that_closes_on_success():
+    breaker, _ = open_breaker()
+    breaker.before_call()
+    for _ in range(5):
+        with pytest.raises(LLMCircuitOpenError):
+            breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.before_call()
+    assert breaker.stats()["probes"] == 1
+
+def test_failed_probe_reopens_the_circuit():
+    breaker, clock = open_breaker()
+    breaker.before_call()
+    breaker.record_failure(overload())
+    assert breaker.state == "open"
+    assert breaker.stats()["opened"] == 2
+
+    clock.advance(29)
+    with pytest.raises(LLMCircuitOpenError):
+        breaker.before_call()
+    clock.advance(1)
+    breaker.before_call()
+
+def test_request_error_ends_the_probe_without_reopening():
+    breaker, _ = open_breaker()
+    breaker.before_call()
+    breaker.record_failure(LLMRequestError("bad request", "fake", 400))
+    assert breaker.state == "half_open"
+    # 试探已结束，下一次调用可以成为新的试探
+    breaker.before_call()
+    assert breaker.stats()["probes"] == 2
+
+def test_stale_probe_is_replaced_after_reset_timeout():
+    breaker, clock = open_breaker()
+    breaker.before_call()
+    clock.advance(29)
+    with pytest.raises(LLMCircuitOpenError):
+        breaker.before_call()
+    clock.advance(1)
+    breaker.before_call()
+    assert breaker.stats()["probes"] == 2
+
+# ----------------------------------------------------------------------
+# RetryPolicy
+# ----------------------------------------------------------------------
+def test_full_jitter_bounds():
+    upper = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=10.0, rng=BoundRandom(upper=True))
+    lower = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=10.0, rng=BoundRandom(upper=False))
+    assert [upper.delay(attempt) for attempt in range(6)] == [1.0, 2.0, 4.0, 8.0, 10.0, 10.0]
+    assert all(lower.delay(attempt) == 0.0 for attempt in range(6))
+
+def test_full_jitter_samples_stay_within_the_cap():
+    policy = RetryPolicy(base_delay=0.5, max_delay=4.0, rng=random.Random(1234))
+    for attempt in range(8):
+        cap = min(4.0, 0.5 * 2 ** attempt)
+        samples = [policy.delay(attempt) for _ in range(200)]
+        assert all(0.0 <= delay <= cap for delay in samples)
+        assert max(samples) > cap * 0.8
+
+def test_retry_after_hint_is_a_floor_capped_by_max_delay():
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0, rng=BoundRandom(upper=False))
+    assert policy.delay(0, LLMRateLimitError("slow down", "fake", 429, retry_after=3.0)) == 3.0
+    assert policy.delay(0, LLMRateLimitError("slow down", "fake", 429, retry_after=60.0)) == 10.0
+
+def test_should_retry_only_retryable_errors_within_attempts():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(overload(), 0)
+    assert policy.should_retry(overload(), 1)
+    assert not policy.should_retry(overload(), 2)
+    assert not policy.should_retry(LLMRequestError("bad request", "fake", 400), 0)
+
+# ----------------------------------------------------------------------
+# AdaptiveConcurrencyLimiter
+# ----------------------------------------------------------------------
+def make_limiter(**kwargs):
+    clock = FakeClock(1000.0)
+    options = dict(initial_limit=4, min_limit=1, max_limit=8, latency_target=10.0, base_backoff=1.0, max_backoff=60.0)
+    options.update(kwargs)
+    return AdaptiveConcurrencyLimiter("fake", clock=clock, **options), clock
+
+def call(limiter, clock, latency: float = 1.0, error: Exception = None):
+    try:
+        with limiter.slot():
+            clock.advance(latency)
+            if error is not None:
+                raise error
+    except type(error) if error is not None else ():
+        pass
+
+def fail_together(limiter, errors):
+    """
+    同时占用多个槽后依次以 errors 失败，模拟同一波并发请求同时被限流 (退避期内不能再获取新槽)。
+    """
+    slots = [limiter.slot() for _ in errors]
+    for slot in slots:
+        slot.__enter__()
+    for slot, error in zip(slots, errors):
+        slot.__exit__(type(error), error, None)
+
+def test_additive_increase_of_about_one_per_round():
+    limiter, clock = make_limiter()
+    for _ in range(4):
+        call(limiter, clock)
+    assert limiter.limit == 4
+    call(limiter, clock)
+    assert limiter.limit == 5
+
+def test_increase_is_capped_at_max_limit():
+    limiter, clock = make_limiter()
+    for _ in range(100):
+        call(limiter, clock)
+    assert limiter.limit == 8
+
+def test_slow_calls_do_not_increase_the_limit():
+    limiter, clock = make_limiter()
+    for _ in range(10):
+        call(limiter, clock, latency=11.0)
+    assert limiter.limit == 4
+    assert limiter.stats()["slow"] == 10
+
+def test_overload_halves_the_limit_once_per_wave_and_pauses():
+    limiter, clock = make_limiter(initial_limit=8)
+    fail_together(limiter, [Overloaded(), Overloaded()])
+    assert limiter.limit == 4
+    assert limiter.stats()["throttled"] == 2
+    assert limiter.stats()["paused_seconds"] == pytest.approx(1.0)
+
+    # 退避期过后的下一波限流再次减半，退避时间指数增长
+    clock.advance(1.0)
+    call(limiter, clock, latency=0.0, error=Overloaded())
+    assert limiter.limit == 2
+    assert limiter.stats()["paused_seconds"] == pytest.approx(2.0)
+
+    clock.advance(2.0)
+    call(limiter, clock, latency=0.0, error=Overloaded())
+    clock.advance(4.0)
+    call(limiter, clock, latency=0.0, error=Overloaded())
+    assert limiter.limit == 1
+
+def test_overload_honours_retry_after_capped_by_max_backoff():
+    limiter, clock = make_limiter(max_backoff=20.0)
+    call(limiter, clock, latency=0.0, error=Overloaded(retry_after="7"))
+    assert limiter.stats()["paused_seconds"] == pytest.approx(7.0)
+    clock.advance(7.0)
+    call(limiter, clock, latency=0.0, error=Overloaded(retry_after="120"))
+    assert limiter.stats()["paused_seconds"] == pytest.approx(20.0)
+
+def test_other_errors_leave_the_limit_unchanged():
+    limiter, clock = make_limiter()
+    call(limiter, clock, error=ValueError("bad input"))
+    assert limiter.limit == 4
+    assert limiter.stats()["throttled"] == 0
+    assert limiter.stats()["in_flight"] == 0
+
+def test_success_after_overload_grows_the_limit_again():
+    limiter, clock = make_limiter(initial_limit=8)
+    call(limiter, clock, latency=0.0, error=Overloaded())
+    clock.advance(1.0)
+    for _ in range(5):
+        call(limiter, clock)
+    assert limiter.limit == 5
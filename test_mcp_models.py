@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+MCP 索引测试：查找、依赖就绪/等待 (DAG)、优先级以及子目标/战略计划的完成计数。
+"""
+from Data.mcp_models import MCP, StrategyPlan, SubGoal, ExecutableCommand
+
+def make_mcp(*priorities) -> MCP:
+    mcp = MCP(session_id="test", user_requirements="test")
+    for priority in priorities:
+        mcp.add_strategy_plan(StrategyPlan(description={"goal": priority, "priority": priority}))
+    return mcp
+
+def add_sub_goal(mcp: MCP, plan: StrategyPlan) -> SubGoal:
+    sub_goal = SubGoal(parent_strategy_plan_id=plan.id, description="sub goal")
+    mcp.add_sub_goal(sub_goal)
+    return sub_goal
+
+def add_command(mcp: MCP, sub_goal: SubGoal, depends_on=()) -> ExecutableCommand:
+    command = ExecutableCommand(parent_sub_goal_id=sub_goal.id, tool="web_search", depends_on=list(depends_on))
+    mcp.add_command(command)
+    return command
+
+def test_lookups_follow_add_and_direct_list_changes():
+    mcp = make_mcp("High")
+    plan = mcp.strategy_plans[0]
+    sub_goal = add_sub_goal(mcp, plan)
+    command = add_command(mcp, sub_goal)
+
+    assert mcp.get_strategy_plan(plan.id) is plan
+    assert mcp.get_sub_goal(sub_goal.id) is sub_goal
+    assert mcp.get_command(command.id) is command
+    assert mcp.sub_goals_for_plan(plan.id) == [sub_goal]
+    assert mcp.commands_for_sub_goal(sub_goal.id) == [command]
+
+    # 直接修改列表时，索引在下次访问时重建
+    extra = ExecutableCommand(parent_sub_goal_id=sub_goal.id, tool="web_search")
+    mcp.executable_commands.append(extra)
+    assert mcp.get_command(extra.id) is extra
+    assert mcp.pending_command_count() == 2
+
+def test_ready_commands_ordered_by_plan_priority():
+    mcp = make_mcp("Low", "High")
+    low, high = mcp.strategy_plans
+    low_command = add_command(mcp, add_sub_goal(mcp, low))
+    high_command = add_command(mcp, add_sub_goal(mcp, high))
+
+    assert mcp.command_priority_rank(high_command) < mcp.command_priority_rank(low_command)
+    assert mcp.next_ready_command() is high_command
+    mcp.mark_command_completed(high_command)
+    assert mcp.next_ready_command() is low_command
+
+def test_dependent_waits_until_dependency_completes():
+    mcp = make_mcp("Medium")
+    sub_goal = add_sub_goal(mcp, mcp.strategy_plans[0])
+    first = add_command(mcp, sub_goal)
+    second = add_command(mcp, sub_goal, depends_on=[first.id])
+    third = add_command(mcp, sub_goal)
+
+    assert mcp.next_ready_command() is first
+    mcp.mark_command_completed(first)
+    # second 在 first 完成后才就绪，并排在同优先级中先就绪的 third 之后
+    assert mcp.next_ready_command() is third
+    mcp.mark_command_completed(third)
+    assert mcp.next_ready_command() is second
+
+def test_cycle_does_not_stall_next_ready_command():
+    mcp = make_mcp("Medium")
+    sub_goal = add_sub_goal(mcp, mcp.strategy_plans[0])
+    first = ExecutableCommand(parent_sub_goal_id=sub_goal.id, tool="web_search")
+    second = ExecutableCommand(parent_sub_goal_id=sub_goal.id, tool="web_search", depends_on=[first.id])
+    first.depends_on = [second.id]
+    mcp.add_command(second)
+    mcp.add_command(first)
+
+    assert mcp.next_ready_command() is second
+
+def test_completion_propagates_to_sub_goal_and_plan():
+    mcp = make_mcp("High")
+    plan = mcp.strategy_plans[0]
+    sub_goal_a, sub_goal_b = add_sub_goal(mcp, plan), add_sub_goal(mcp, plan)
+    a1, a2 = add_command(mcp, sub_goal_a), add_command(mcp, sub_goal_a)
+    b1 = add_command(mcp, sub_goal_b)
+
+    assert mcp.mark_command_completed(a1) == (None, None)
+    assert mcp.mark_command_completed(a2) == (sub_goal_a, None)
+    assert mcp.mark_command_completed(b1) == (sub_goal_b, plan)
+    assert sub_goal_a.is_completed and sub_goal_b.is_completed and plan.is_completed
+    assert mcp.pending_command_count() == 0
+    # 重复标记不会再次传播
+    assert mcp.mark_command_completed(b1) == (None, None)
+
+def test_command_added_to_completed_sub_goal_reopens_it():
+    mcp = make_mcp("High")
+    plan = mcp.strategy_plans[0]
+    sub_goal = add_sub_goal(mcp, plan)
+    first = add_command(mcp, sub_goal)
+    assert mcp.mark_command_completed(first) == (sub_goal, plan)
+
+    # 流式规划在第一条命令完成后才产出同一子目标的下一条命令
+    second = add_command(mcp, sub_goal)
+    assert not sub_goal.is_completed and not plan.is_completed
+    assert mcp.mark_command_completed(second) == (sub_goal, plan)
+    assert sub_goal.is_completed and plan.is_completed
+
+def test_sealed_sub_goal_without_commands_completes():
+    mcp = make_mcp("High")
+    plan = mcp.strategy_plans[0]
+    empty = add_sub_goal(mcp, plan)
+    busy = add_sub_goal(mcp, plan)
+    command = add_command(mcp, busy)
+
+    assert mcp.seal_sub_goal(busy) == (None, None)
+    assert mcp.seal_sub_goal(empty) == (empty, None)
+    assert mcp.mark_command_completed(command) == (busy, plan)
+    assert plan.is_completed
+
+def test_rebuilt_index_keeps_completion_counters():
+    mcp = make_mcp("High")
+    plan = mcp.strategy_plans[0]
+    sub_goal = add_sub_goal(mcp, plan)
+    first = add_command(mcp, sub_goal)
+    mcp.mark_command_completed(first)
+
+    # 重新赋值列表会触发重建，已完成的子目标遇到未完成的新命令时重新打开
+    second = ExecutableCommand(parent_sub_goal_id=sub_goal.id, tool="web_search")
+    mcp.executable_commands = mcp.executable_commands + [second]
+    assert mcp.next_ready_command() is second
+    assert not sub_goal.is_completed
+    assert mcp.mark_command_completed(second) == (sub_goal, plan)
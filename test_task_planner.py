@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+LLMTaskPlanner 流式规划测试：用脚本化的假流模拟正常结束、截断、中途 LLMError 和非 JSON 输出。
+"""
+import json
+from typing import Iterator, List
+
+from Data.mcp_models import MCP, StrategyPlan
+from Entities.task_planner import LLMTaskPlanner
+from Interfaces.llm_api_interface import LLMAPIInterface, LLMError
+
+class ScriptedStreamInterface(LLMAPIInterface):
+    """
+    每次 get_completion_stream 调用依次使用一条脚本：字符串按原样产出，异常实例在该位置抛出。
+    """
+    provider = "fake"
+    model_env_var = None
+    default_model = "fake-model"
+
+    def __init__(self, scripts: List[list]):
+        self.scripts = list(scripts)
+        self.prompts: List[str] = []
+
+    def get_completion(self, prompt: str, model: str = None, **kwargs) -> str:
+        raise AssertionError("planning must be streamed")
+
+    def get_completion_stream(self, prompt: str, model: str = None, **kwargs) -> Iterator[str]:
+        self.prompts.append(prompt)
+        for item in self.scripts.pop(0) if self.scripts else []:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+def sub_goal_json(plan_id: str, keywords: List[str]) -> dict:
+    return {
+        "parent_strategy_plan_id": plan_id,
+        "description": f"research {plan_id}",
+        "executable_commands": [{"tool": "web_search", "params": {"keywords": [k]}} for k in keywords],
+    }
+
+def plan_json(*sub_goals) -> str:
+    return json.dumps({"sub_goals": list(sub_goals)})
+
+def run(scripts, plans=2):
+    mcp = MCP(session_id="test", user_requirements="test",
+              strategy_plans=[StrategyPlan(id=f"sp_{i}", description={"goal": str(i)}) for i in range(plans)])
+    interface = ScriptedStreamInterface(scripts)
+    planner = LLMTaskPlanner(interface)
+    emitted = []
+    planner._plan_streaming(lambda plans: ",".join(plan.id for plan in plans), mcp, emitted.append)
+    return mcp, interface, emitted
+
+def keywords(commands) -> List[str]:
+    return [command.params["keywords"][0] for command in commands]
+
+def test_complete_stream_is_planned_in_one_attempt():
+    text = plan_json(sub_goal_json("sp_0", ["a", "b"]), sub_goal_json("sp_1", ["c"]))
+    mcp, interface, emitted = run([[text[:40], text[40:]]])
+
+    assert len(interface.prompts) == 1
+    assert keywords(emitted) == ["a", "b", "c"]
+    assert emitted == mcp.executable_commands
+    assert [sg.parent_strategy_plan_id for sg in mcp.sub_goals] == ["sp_0", "sp_1"]
+
+def test_truncated_stream_replans_plans_without_complete_sub_goals():
+    full = plan_json(sub_goal_json("sp_0", ["a"]), sub_goal_json("sp_1", ["b", "c"]))
+    # 在 sp_1 唯一子目标的第二条命令中间截断 (例如达到 max_tokens)，流正常结束
+    truncated = full[:full.index('"c"')]
+    mcp, interface, emitted = run([[truncated], [plan_json(sub_goal_json("sp_1", ["b", "c"]))]])
+
+    assert interface.prompts == ["sp_0,sp_1", "sp_1"]
+    assert keywords(emitted) == ["a", "b", "b", "c"]
+    # 被截断的子目标已封闭，随其已交出的命令完成
+    truncated_sub_goal = mcp.sub_goals[1]
+    for command in mcp.commands_for_sub_goal(truncated_sub_goal.id):
+        mcp.mark_command_completed(command)
+    assert truncated_sub_goal.is_completed
+
+def test_llm_error_mid_stream_replans_missing_plans():
+    first = plan_json(sub_goal_json("sp_0", ["a"]), sub_goal_json("sp_1", ["b"]))
+    cut = first.index('{"parent_strategy_plan_id": "sp_1"')
+    mcp, interface, emitted = run([
+        [first[:cut], LLMError("connection reset", provider="fake")],
+        [plan_json(sub_goal_json("sp_1", ["b"]))],
+    ])
+
+    assert interface.prompts == ["sp_0,sp_1", "sp_1"]
+    assert keywords(emitted) == ["a", "b"]
+    assert {sg.parent_strategy_plan_id for sg in mcp.sub_goals} == {"sp_0", "sp_1"}
+
+def test_stream_cut_before_first_command_is_retried_not_parsed():
+    text = plan_json(sub_goal_json("sp_0", ["a"]))
+    mcp, interface, emitted = run([
+        [text[:25], RuntimeError("stream closed")],
+        [text],
+    ], plans=1)
+
+    assert len(interface.prompts) == 2
+    assert keywords(emitted) == ["a"]
+    assert len(mcp.sub_goals) == 1
+
+def test_llm_error_before_any_output_stops_retrying():
+    mcp, interface, emitted = run([[LLMError("unavailable", provider="fake")], [plan_json()]])
+
+    assert len(interface.prompts) == 1
+    assert emitted == [] and mcp.sub_goals == []
+
+def test_non_json_response_falls_back_to_whole_response_parsing():
+    mcp, interface, emitted = run([["Sorry, I cannot help with that."]])
+
+    assert len(interface.prompts) == 1
+    assert emitted == [] and mcp.sub_goals == []
+
+def test_parent_plan_id_after_commands_moves_sub_goal():
+    text = json.dumps({"sub_goals": [{
+        "description": "late parent",
+        "executable_commands": [{"tool": "web_search", "params": {"keywords": ["a"]}}],
+        "parent_strategy_plan_id": "sp_1",
+    }]})
+    mcp, interface, emitted = run([[text]])
+
+    sub_goal = mcp.sub_goals[0]
+    assert sub_goal.parent_strategy_plan_id == "sp_1"
+    assert mcp.sub_goals_for_plan("sp_0") == []
+    assert mcp.sub_goals_for_plan("sp_1") == [sub_goal]
+    # sp_0 没有任何子目标，是否完成不受影响；sp_1 随其命令完成
+    assert mcp.mark_command_completed(emitted[0]) == (sub_goal, mcp.get_strategy_plan("sp_1"))
+
+def test_sub_goal_without_commands_completes_its_plan():
+    text = plan_json(sub_goal_json("sp_0", []))
+    mcp, interface, emitted = run([[text]], plans=1)
+
+    assert emitted == []
+    assert mcp.sub_goals[0].is_completed and mcp.strategy_plans[0].is_completed